@@ -1,2 +1,3 @@
-from .tello import Tello, TelloException, BackgroundFrameRead
-from .swarm import TelloSwarm
\ No newline at end of file
+from .tello import Tello, TelloException, BackgroundFrameRead, TelloShard
+from .swarm import TelloSwarm, SwarmResult, SwarmState, SwarmReadiness
+from .async_tello import AsyncTello
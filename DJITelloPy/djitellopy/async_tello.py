@@ -0,0 +1,430 @@
+"""asyncio client for DJI Ryze Tello drones.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from . import metrics
+from .tello import Tello, TelloException
+from .enforce_types import enforce_types
+
+
+class _ControlProtocol(asyncio.DatagramProtocol):
+    """Receives the command responses of every drone of an event loop on the shared client socket
+    and routes them by sender ip.
+    """
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.drones: Dict[str, 'AsyncTello'] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        drone = self.drones.get(addr[0])
+        if drone is not None:
+            drone.response_received(data)
+
+    def error_received(self, exc):
+        Tello.LOGGER.error(exc)
+
+
+class _StateProtocol(_ControlProtocol):
+    """Receives the state packets of every drone of an event loop and routes them by sender ip.
+    """
+
+    def datagram_received(self, data, addr):
+        drone = self.drones.get(addr[0])
+        if drone is not None:
+            drone.state_received(data)
+
+
+# One pair of endpoints per event loop, shared by all the drones driven by this loop
+_endpoints: Dict[asyncio.AbstractEventLoop, List[_ControlProtocol]] = {}
+
+
+@enforce_types
+class AsyncTello:
+    """asyncio version of [Tello][tello]. Commands are coroutines resolved by the receive protocol
+    instead of polling, so a single event loop can drive many drones.
+
+    ```python
+    async def fly(ip):
+        tello = await AsyncTello.create(ip)
+        await tello.connect()
+        await tello.takeoff()
+        tello.start_rc()
+        tello.set_rc(0, 20, 0, 0)
+        async for state in tello.state_stream():
+            if state['h'] > 150:
+                break
+        tello.stop_rc()
+        await tello.land()
+        tello.close()
+
+    async def main():
+        await asyncio.gather(*[fly(ip) for ip in ips])
+
+    asyncio.run(main())
+    ```
+
+    All instances of an event loop share one client socket bound to `Tello.CONTROL_UDP_PORT_CLIENT`
+    and one state socket bound to `Tello.STATE_UDP_PORT`, so they cannot be used together with
+    synchronous [Tello][tello] instances in the same process.
+
+    Requires Python 3.7+ (asyncio.get_running_loop), the methods must be called from the event loop.
+    """
+    RC_INTERVAL = 0.05  # in seconds, period of the rc sending scheduled by start_rc()
+
+    def __init__(self,
+                 host=Tello.TELLO_IP,
+                 retry_count=Tello.RETRY_COUNT):
+        self.address = (host, Tello.CONTROL_UDP_PORT)
+        self.retry_count = retry_count
+        self.state: dict = {}
+        self.last_state_timestamp = 0.0
+        self.last_received_command_timestamp = time.time()
+        self.is_flying = False
+        self.stream_on = False
+        self.rc = (0, 0, 0, 0)
+
+        self._control: Optional[_ControlProtocol] = None
+        self._state: Optional[_StateProtocol] = None
+        self._command_lock: Optional[asyncio.Lock] = None
+        self._pending: Optional[asyncio.Future] = None
+        self._state_queues: List[asyncio.Queue] = []
+        self._rc_handle: Optional[asyncio.TimerHandle] = None
+
+    @staticmethod
+    async def create(host=Tello.TELLO_IP, retry_count=Tello.RETRY_COUNT) -> 'AsyncTello':
+        """Create an AsyncTello and register it on the endpoints of the running event loop
+        """
+        tello = AsyncTello(host, retry_count)
+        await tello.open()
+        return tello
+
+    async def open(self):
+        """Register the drone on the endpoints of the running event loop, creating them if needed.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in _endpoints:
+            _, control = await loop.create_datagram_endpoint(
+                _ControlProtocol, local_addr=('0.0.0.0', Tello.CONTROL_UDP_PORT_CLIENT))
+            _, state = await loop.create_datagram_endpoint(
+                _StateProtocol, local_addr=('0.0.0.0', Tello.STATE_UDP_PORT))
+            _endpoints[loop] = [control, state]
+
+        self._control, self._state = _endpoints[loop]
+        self._control.drones[self.address[0]] = self
+        self._state.drones[self.address[0]] = self
+        self._command_lock = asyncio.Lock()
+
+        Tello.LOGGER.info("AsyncTello instance was initialized. Host: '{}'. Port: '{}'.".format(
+            self.address[0], Tello.CONTROL_UDP_PORT))
+
+    def close(self):
+        """Stop the rc sending and unregister the drone from the endpoints
+        """
+        self.stop_rc()
+        host = self.address[0]
+        for protocol in (self._control, self._state):
+            if protocol is not None and protocol.drones.get(host) is self:
+                del protocol.drones[host]
+
+    @staticmethod
+    def close_endpoints():
+        """Close the sockets shared by the drones of the running event loop
+        """
+        protocols = _endpoints.pop(asyncio.get_running_loop(), [])
+        for protocol in protocols:
+            protocol.transport.close()
+
+    def response_received(self, data: bytes):
+        """Resolve the pending command. Called by the control protocol.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        if self._pending is None or self._pending.done():
+            Tello.LOGGER.debug('Dropping unexpected response from {}: {}'.format(self.address[0], data))
+            return
+        self._pending.set_result(data)
+
+    def state_received(self, data: bytes):
+        """Update the state and feed the state streams. Called by the state protocol.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        state = Tello.parse_state(data.decode('ASCII'))
+        if not state:
+            return
+        self.state = state
+        metrics.STATE_PACKETS.labels(self.address[0]).inc()
+        if 'bat' in state:
+            metrics.BATTERY.labels(self.address[0]).set(state['bat'])
+        self.last_state_timestamp = time.time()
+        for queue in self._state_queues:
+            if queue.full():  # slow consumers only get the latest state
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def state_stream(self):
+        """Asynchronous iterator over the state packets of the drone. A consumer that is slower
+        than the state rate skips the outdated packets.
+
+        ```python
+        async for state in tello.state_stream():
+            print(state['bat'])
+        ```
+        """
+        queue = asyncio.Queue(maxsize=1)
+        self._state_queues.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._state_queues.remove(queue)
+
+    def get_current_state(self) -> dict:
+        """Latest state of the drone, as a dict with all fields
+        """
+        return self.state
+
+    def get_state_field(self, key: str):
+        """Get a specific state field by name.
+        """
+        if key in self.state:
+            return self.state[key]
+        raise TelloException('Could not get state property: {}'.format(key))
+
+    def get_battery(self) -> int:
+        """Get current battery percentage
+        Returns:
+            int: 0-100
+        """
+        return self.get_state_field('bat')
+
+    def get_height(self) -> int:
+        """Get current height in cm
+        Returns:
+            int: height in cm
+        """
+        return self.get_state_field('h')
+
+    def send_command_without_return(self, command: str):
+        """Send command to Tello without expecting a response.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        Tello.LOGGER.debug("Send command (no response expected): '{}'".format(command))
+        self._control.transport.sendto(command.encode('utf-8'), self.address)
+
+    async def send_command_with_return(self, command: str, timeout: int = Tello.RESPONSE_TIMEOUT) -> str:
+        """Send command to Tello and wait for its response. Only one command is in flight per drone,
+        concurrent calls are queued.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        async with self._command_lock:
+            diff = time.time() - self.last_received_command_timestamp
+            if diff < Tello.TIME_BTW_COMMANDS:
+                await asyncio.sleep(Tello.TIME_BTW_COMMANDS - diff)
+
+            Tello.LOGGER.info("Send command: '{}' to {}".format(command, self.address[0]))
+            self._pending = asyncio.get_running_loop().create_future()
+            timestamp = time.time()
+            self._control.transport.sendto(command.encode('utf-8'), self.address)
+            try:
+                data = await asyncio.wait_for(self._pending, timeout)
+            except asyncio.TimeoutError:
+                message = "Aborting command '{}'. Did not receive a response after {} seconds".format(
+                    command, timeout)
+                Tello.LOGGER.warning(message)
+                metrics.COMMAND_TIMEOUTS.labels(self.address[0]).inc()
+                return message
+            finally:
+                self._pending = None
+
+            self.last_received_command_timestamp = time.time()
+            metrics.COMMAND_RTT.labels(self.address[0]).observe(self.last_received_command_timestamp - timestamp)
+
+        try:
+            response = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            Tello.LOGGER.error(e)
+            return "response decode error"
+        response = response.rstrip("\r\n")
+
+        Tello.LOGGER.info("Response {}: '{}'".format(command, response))
+        return response
+
+    async def send_control_command(self, command: str, timeout: int = Tello.RESPONSE_TIMEOUT) -> bool:
+        """Send control command to Tello and wait for its response.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        response = "max retries exceeded"
+        for i in range(0, self.retry_count):
+            response = await self.send_command_with_return(command, timeout=timeout)
+
+            if 'ok' in response.lower():
+                return True
+
+            Tello.LOGGER.debug("Command attempt #{} failed for command: '{}'".format(i, command))
+
+        self.raise_result_error(command, response)
+        return False  # never reached
+
+    async def send_read_command(self, command: str) -> str:
+        """Send given command to Tello and wait for its response.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        response = await self.send_command_with_return(command)
+
+        if any(word in response for word in ('error', 'ERROR', 'False')):
+            self.raise_result_error(command, response)
+            return "Error: this code should never be reached"
+
+        return response
+
+    def raise_result_error(self, command: str, response: str):
+        """Used to raise an error after an unsuccessful command
+        Internal method, you normally wouldn't call this yourself.
+        """
+        tries = 1 + self.retry_count
+        raise TelloException("Command '{}' was unsuccessful for {} tries. Latest response:\t'{}'"
+                             .format(command, tries, response))
+
+    async def connect(self, wait_for_state=True):
+        """Enter SDK mode. Call this before any of the control functions.
+        """
+        await self.send_control_command("command")
+
+        if wait_for_state and not self.state:
+            stream = self.state_stream()
+            try:
+                await asyncio.wait_for(stream.__anext__(), 1)
+            except asyncio.TimeoutError:
+                raise TelloException('Did not receive a state packet from the Tello')
+            finally:
+                await stream.aclose()
+
+    async def takeoff(self):
+        """Automatic takeoff.
+        """
+        await self.send_control_command("takeoff", timeout=Tello.TAKEOFF_TIMEOUT)
+        self.is_flying = True
+
+    async def land(self):
+        """Automatic landing.
+        """
+        await self.send_control_command("land")
+        self.is_flying = False
+
+    def emergency(self):
+        """Stop all motors immediately.
+        """
+        self.send_command_without_return("emergency")
+        self.is_flying = False
+
+    async def streamon(self):
+        """Turn on video streaming.
+        """
+        await self.send_control_command("streamon")
+        self.stream_on = True
+
+    async def streamoff(self):
+        """Turn off video streaming.
+        """
+        await self.send_control_command("streamoff")
+        self.stream_on = False
+
+    async def move(self, direction: str, x: int):
+        """Tello fly up, down, left, right, forward or back with distance x cm.
+        Arguments:
+            direction: up, down, left, right, forward or back
+            x: 20-500
+        """
+        await self.send_control_command("{} {}".format(direction, x))
+
+    async def rotate_clockwise(self, x: int):
+        """Rotate x degree clockwise.
+        Arguments:
+            x: 1-360
+        """
+        await self.send_control_command("cw {}".format(x))
+
+    async def rotate_counter_clockwise(self, x: int):
+        """Rotate x degree counter-clockwise.
+        Arguments:
+            x: 1-3600
+        """
+        await self.send_control_command("ccw {}".format(x))
+
+    async def set_speed(self, x: int):
+        """Set speed to x cm/s.
+        Arguments:
+            x: 10-100
+        """
+        await self.send_control_command("speed {}".format(x))
+
+    async def set_network_ports(self, state_packet_port: int, video_stream_port: int):
+        """Sets the ports for state packets and video streaming
+        """
+        await self.send_control_command('port {} {}'.format(state_packet_port, video_stream_port))
+
+    async def query_battery(self) -> int:
+        """Get current battery percentage via a query command
+        Returns:
+            int: 0-100 in %
+        """
+        return int(await self.send_read_command('battery?'))
+
+    async def query_sdk_version(self) -> str:
+        """Get SDK Version
+        Returns:
+            str: SDK Version
+        """
+        return await self.send_read_command('sdk?')
+
+    def send_rc_control(self, left_right_velocity: int, forward_backward_velocity: int, up_down_velocity: int,
+                        yaw_velocity: int):
+        """Send RC control via four channels immediately.
+        Arguments:
+            left_right_velocity: -100~100 (left/right)
+            forward_backward_velocity: -100~100 (forward/backward)
+            up_down_velocity: -100~100 (up/down)
+            yaw_velocity: -100~100 (yaw)
+        """
+        def clamp100(x: int) -> int:
+            return max(-100, min(100, x))
+
+        self.send_command_without_return('rc {} {} {} {}'.format(
+            clamp100(left_right_velocity),
+            clamp100(forward_backward_velocity),
+            clamp100(up_down_velocity),
+            clamp100(yaw_velocity)
+        ))
+        metrics.RC_DATAGRAMS.labels(self.address[0]).inc()
+
+    def set_rc(self, left_right_velocity: int, forward_backward_velocity: int, up_down_velocity: int,
+               yaw_velocity: int):
+        """Set the velocities sent at each period by start_rc()
+        """
+        self.rc = (left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity)
+
+    def start_rc(self, interval=RC_INTERVAL):
+        """Send the velocities of set_rc() every `interval` seconds, scheduled on the event loop
+        """
+        self.stop_rc()
+        loop = asyncio.get_running_loop()
+
+        def send():
+            self.send_rc_control(*self.rc)
+            self._rc_handle = loop.call_at(self._rc_handle.when() + interval, send)
+
+        self._rc_handle = loop.call_at(loop.time(), send)
+
+    def stop_rc(self):
+        """Stop the rc sending started by start_rc()
+        """
+        if self._rc_handle is not None:
+            self._rc_handle.cancel()
+            self._rc_handle = None
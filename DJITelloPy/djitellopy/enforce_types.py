@@ -34,7 +34,10 @@ def enforce_types(target):
                 if _is_unparameterized_special_typing(type_hint):
                     continue
 
-                if hasattr(type_hint, "__origin__") and type_hint.__origin__ is not None:
+                if getattr(type_hint, "__origin__", None) is typing.Union:
+                    # Optional[X] and Union[X, Y]: check against every member, List[int] as list
+                    actual_type = tuple(getattr(arg, "__origin__", None) or arg for arg in type_hint.__args__)
+                elif hasattr(type_hint, "__origin__") and type_hint.__origin__ is not None:
                     actual_type = type_hint.__origin__
                 elif hasattr(type_hint, "__args__") and type_hint.__args__ is not None:
                     actual_type = type_hint.__args__
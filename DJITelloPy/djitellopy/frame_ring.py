@@ -0,0 +1,166 @@
+"""Shared-memory ring of video frames, to pass decoded frames between processes without pickling.
+
+One process produces frames with `put`, any number of processes attach to the ring by name and read
+the latest frames in place. There is no lock: every slot carries a sequence number that is odd while
+the producer writes it, so readers can tell whether the frame they look at is complete and still current.
+
+```python
+# producer process
+ring = SharedFrameRing.create((720, 960, 3))
+frame_read = tello.get_frame_read(frame_ring=ring)
+
+# consumer process
+ring = SharedFrameRing.attach(name)
+seq, frame = ring.latest()            # zero-copy view on the slot
+corners = detect(frame)
+if not ring.is_valid(seq):            # the producer lapped the ring during processing
+    ...
+```
+
+Requires Python 3.8+ (multiprocessing.shared_memory).
+"""
+
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Tuple
+
+import numpy as np
+
+from .tello import TelloException
+
+# int64 header fields
+HEADER_WRITE_SEQ = 0  # sequence number of the latest complete frame, 0 before the first one
+HEADER_SLOTS = 1
+HEADER_HEIGHT = 2
+HEADER_WIDTH = 3
+HEADER_CHANNELS = 4
+HEADER_SIZE = 8
+
+# names of the rings created by this process (and inherited by forked processes), see attach
+_created_names: set = set()
+
+
+class SharedFrameRing:
+    """Ring of `slots` frame buffers of a fixed shape in shared memory, with a single producer.
+    Frame number `seq` (starting at 1) is written in slot `seq % slots`. A reader holding a view on
+    frame `seq` can use it until the producer has written `slots - 1` more frames.
+    """
+    DEFAULT_SLOTS = 4
+    WAIT_POLL_INTERVAL = 0.001  # in seconds
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        self.slots = int(self.header[HEADER_SLOTS])
+        self.shape = (int(self.header[HEADER_HEIGHT]), int(self.header[HEADER_WIDTH]),
+                      int(self.header[HEADER_CHANNELS]))
+        offset = self.header.nbytes
+        # per slot: 2 * seq once frame seq is complete, 2 * seq - 1 while it is being written
+        self.slot_seqs = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.slot_seqs.nbytes
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def create(shape: tuple, slots: int = DEFAULT_SLOTS, name: str = None) -> 'SharedFrameRing':
+        """Allocate a ring for frames of `shape` (height, width, channels), owned by the caller"""
+        if slots < 2:
+            raise TelloException('A frame ring needs at least 2 slots')
+        size = 8 * (HEADER_SIZE + slots) + slots * int(np.prod(shape))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_names.add(shm.name)
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[HEADER_SLOTS] = slots
+        header[HEADER_HEIGHT], header[HEADER_WIDTH], header[HEADER_CHANNELS] = shape
+        del header
+        ring = SharedFrameRing(shm, owner=True)
+        ring.slot_seqs[:] = 0
+        return ring
+
+    @staticmethod
+    def attach(name: str) -> 'SharedFrameRing':
+        """Attach to a ring created by another process"""
+        # Only the owner may unlink the shared memory: the resource tracker of a reader would unlink it when
+        # the reader exits. Python < 3.13 has no track=False, undo the registration (unless this process
+        # created the ring, the registration is then the owner's)
+        if sys.version_info >= (3, 13):
+            return SharedFrameRing(shared_memory.SharedMemory(name=name, track=False), owner=False)
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.name not in _created_names:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return SharedFrameRing(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        """Sequence number of the latest complete frame (0 if none)"""
+        return int(self.header[HEADER_WRITE_SEQ])
+
+    def put(self, frame: np.ndarray) -> int:
+        """Copy `frame` into the next slot and publish it. Producer side only. Returns its sequence number"""
+        if frame.shape != self.shape:
+            raise TelloException('Frame of shape {} does not fit a ring of shape {}'.format(frame.shape, self.shape))
+        seq = self.write_seq + 1
+        slot = seq % self.slots
+        self.slot_seqs[slot] = 2 * seq - 1
+        self.frames[slot] = frame
+        self.slot_seqs[slot] = 2 * seq
+        self.header[HEADER_WRITE_SEQ] = seq
+        return seq
+
+    def is_valid(self, seq: int) -> bool:
+        """True while frame `seq` is complete and not overwritten"""
+        return seq > 0 and int(self.slot_seqs[seq % self.slots]) == 2 * seq
+
+    def get(self, seq: int) -> np.ndarray:
+        """Zero-copy view on frame `seq`, or None if it is not available anymore"""
+        if not self.is_valid(seq):
+            return None
+        return self.frames[seq % self.slots]
+
+    def latest(self) -> Tuple[int, np.ndarray]:
+        """Sequence number and zero-copy view of the latest frame, (0, None) before the first frame.
+        Check `is_valid(seq)` after using the view to make sure it was not overwritten meanwhile.
+        """
+        while True:
+            seq = self.write_seq
+            if seq == 0:
+                return 0, None
+            frame = self.get(seq)
+            if frame is not None:
+                return seq, frame
+
+    def read(self, out: np.ndarray = None) -> Tuple[int, np.ndarray]:
+        """Copy the latest frame into `out` (allocated if None), (0, out) before the first frame"""
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        while True:
+            seq, frame = self.latest()
+            if seq == 0:
+                return 0, out
+            out[...] = frame
+            if self.is_valid(seq):
+                return seq, out
+
+    def wait(self, after_seq: int, timeout: float = None) -> int:
+        """Wait for a frame newer than `after_seq`, returns the latest sequence number
+        (which is still `after_seq` on timeout)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.write_seq <= after_seq:
+            if deadline is not None and time.time() > deadline:
+                break
+            time.sleep(self.WAIT_POLL_INTERVAL)
+        return self.write_seq
+
+    def close(self):
+        """Release this process' mapping, and the shared memory itself for the owner"""
+        del self.header, self.slot_seqs, self.frames
+        self.shm.close()
+        if self.owner:
+            _created_names.discard(self.shm.name)
+            self.shm.unlink()
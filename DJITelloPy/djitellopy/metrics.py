@@ -0,0 +1,274 @@
+"""Counters, gauges and histograms of the library, exported in the Prometheus text format over HTTP.
+
+The library always counts (an increment is a dictionary lookup and an addition under a lock), the
+HTTP endpoint is only served once started. Applications register their own metrics in the same registry,
+and update hooks to refresh values read from elsewhere (e.g. a frame rate) when the metrics are scraped.
+
+```python
+from djitellopy import metrics
+
+server = metrics.start_http_server(9100)  # http://127.0.0.1:9100/metrics
+loop_rate = metrics.Gauge('app_loop_rate_hz', 'Main loop iterations per second', ['drone'])
+metrics.REGISTRY.add_update_hook(lambda: loop_rate.labels('192.168.10.1').set(app.loop_rate))
+...
+server.stop()
+```
+
+Library metrics, labelled by drone ip (video metrics by stream address):
+
+| name | type | |
+|------|------|-|
+| tello_command_rtt_seconds | histogram | command round trip, `send_command_with_return` |
+| tello_command_timeouts_total | counter | commands without response |
+| tello_rc_datagrams_total | counter | rc commands sent |
+| tello_state_packets_total | counter | state packets received |
+| tello_battery_percent | gauge | battery of the last state packet |
+| tello_video_frames_decoded_total | counter | frames decoded by `BackgroundFrameRead` |
+| tello_video_decode_errors_total | counter | packets that could not be decoded |
+"""
+
+import bisect
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# in seconds, from a local network round trip to the takeoff timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class _Child:
+    """Value of a metric for one set of label values
+    Internal class, you normally wouldn't use this yourself.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value: float):
+        """Gauges, or counters mirroring a count kept elsewhere"""
+        self.value = value
+
+
+class _HistogramChild:
+    """Bucket counts of a histogram for one set of label values
+    Internal class, you normally wouldn't use this yourself.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.lock = Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """A named metric with optional labels. Use the Counter, Gauge and Histogram subclasses.
+    Values are set on the child of a set of label values: `metric.labels('192.168.10.1').inc()`,
+    or directly on the metric when it has no labels: `metric.inc()`.
+    """
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], _Child] = {}
+        self._lock = Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self):
+        return _Child()
+
+    def labels(self, *label_values: str) -> _Child:
+        """Child of the metric for these label values, in the order of label_names"""
+        child = self._children.get(label_values)
+        if child is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError('{} expects the labels {}'.format(self.name, self.label_names))
+            with self._lock:
+                child = self._children.setdefault(label_values, self._new_child())
+        return child
+
+    def remove(self, *label_values: str):
+        """Stop exporting the values of these labels, e.g. for a drone that left"""
+        with self._lock:
+            self._children.pop(label_values, None)
+
+    def _label_text(self, label_values: Tuple[str, ...], extra: str = '') -> str:
+        pairs = ['{}="{}"'.format(name, _escape(str(value)))
+                 for name, value in zip(self.label_names, label_values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def _sorted_children(self) -> List[tuple]:
+        with self._lock:
+            children = list(self._children.items())
+        return sorted(children, key=lambda item: tuple(map(str, item[0])))
+
+    def _samples(self) -> List[str]:
+        return ['{}{} {}'.format(self.name, self._label_text(labels), _format_value(child.value))
+                for labels, child in self._sorted_children()]
+
+    def exposition(self) -> str:
+        lines = ['# HELP {} {}'.format(self.name, self.documentation.replace('\n', ' ')),
+                 '# TYPE {} {}'.format(self.name, self.TYPE)]
+        return '\n'.join(lines + self._samples())
+
+    # shortcuts for metrics without labels
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Counter(Metric):
+    """Monotonic count, the name should end with _total"""
+    TYPE = 'counter'
+
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+    TYPE = 'gauge'
+
+
+class Histogram(Metric):
+    """Distribution of observed values (e.g. durations in seconds) in cumulative buckets"""
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), registry=None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, child in self._sorted_children():
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(self.name, self._label_text(labels, 'le="{}"'.format(
+                    _format_value(bound))), cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, self._label_text(labels), repr(total)))
+            lines.append('{}_count{} {}'.format(self.name, self._label_text(labels), cumulative))
+        return lines
+
+
+class Registry:
+    """Set of metrics exported together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._hooks: List[Callable[[], None]] = []
+        self._lock = Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError('Metric {} already registered'.format(metric.name))
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def add_update_hook(self, hook: Callable[[], None]):
+        """`hook()` is called before every export, to update metrics whose value is read from elsewhere"""
+        self._hooks.append(hook)
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text format"""
+        for hook in list(self._hooks):
+            try:
+                hook()
+            except Exception as e:  # a broken hook must not break the export of the other metrics
+                from .tello import Tello
+                Tello.LOGGER.error('Metrics update hook failed: {}'.format(e))
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.exposition() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMAND_RTT = Histogram('tello_command_rtt_seconds', 'Round trip time of the commands with a response', ['drone'])
+COMMAND_TIMEOUTS = Counter('tello_command_timeouts_total', 'Commands without response before the timeout',
+                           ['drone'])
+RC_DATAGRAMS = Counter('tello_rc_datagrams_total', 'rc commands sent', ['drone'])
+STATE_PACKETS = Counter('tello_state_packets_total', 'State packets received', ['drone'])
+BATTERY = Gauge('tello_battery_percent', 'Battery percentage of the last state packet', ['drone'])
+FRAMES_DECODED = Counter('tello_video_frames_decoded_total', 'Video frames decoded', ['stream'])
+DECODE_ERRORS = Counter('tello_video_decode_errors_total', 'Video packets that could not be decoded', ['stream'])
+
+
+class MetricsServer:
+    """HTTP server exporting a registry on /metrics, in a background thread"""
+
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY):
+        # imported here, most scripts never serve their metrics
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # one line per scrape would flood the logs
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+        self.thread = Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_http_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> MetricsServer:
+    """Serve the metrics on http://host:port/metrics, port 0 for any free port (see `server.address`).
+    Bound to the loopback by default, pass host='0.0.0.0' to let a remote Prometheus scrape it.
+    """
+    server = MetricsServer(port, host, registry)
+    server.start()
+    return server
@@ -0,0 +1,174 @@
+"""Concurrent decoding of the video streams of several Tello drones.
+
+Each stream is decoded by its own worker process, so decoding scales over CPU cores instead of
+competing for the GIL, and the decoded frames come back through a shared-memory
+[SharedFrameRing][frame_ring] instead of being pickled. Other processes can attach to the ring of a
+stream with `SharedFrameRing.attach(decoder.get_ring_name(name))`.
+
+```python
+from djitellopy.multistream import MultiStreamDecoder
+
+decoder = MultiStreamDecoder()
+for i, tello in enumerate(swarm):
+    tello.set_network_ports(Tello.STATE_UDP_PORT, Tello.VS_UDP_PORT + i)
+    tello.streamon()
+    decoder.add_stream(tello.address[0], tello.get_udp_video_address())
+decoder.start()
+
+seq, frame = decoder.get_frame(swarm.tellos[0].address[0])
+print(decoder.get_stats())
+```
+
+Requires Python 3.8+ (multiprocessing.shared_memory).
+"""
+
+import multiprocessing
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .frame_ring import SharedFrameRing
+from .tello import Tello, TelloException
+
+# Layout of the per-stream statistics shared with the worker process
+STAT_DECODED = 0
+STAT_ERRORS = 1
+STAT_FPS = 2
+STAT_LATENCY = 3  # in seconds, from packet demuxed to frame published
+STAT_LAST_FRAME_TIME = 4
+STAT_COUNT = 5
+
+STATS_SMOOTHING = 0.1  # weight of the newest sample in the latency moving average
+FPS_WINDOW = 1.0  # in seconds, the fps is measured over windows of this duration
+
+
+def _decode_worker(address: str, ring_name: str, stats, stop_event):
+    """Worker process decoding one stream into its shared frame ring
+    Internal function, you normally wouldn't call this yourself.
+    """
+    import av
+
+    ring = SharedFrameRing.attach(ring_name)
+    height, width = ring.shape[0], ring.shape[1]
+    try:
+        container = av.open(address, timeout=(Tello.FRAME_GRAB_TIMEOUT, None), options=Tello.get_video_options())
+    except av.error.ExitError as e:
+        Tello.LOGGER.error('Failed to open video stream {}: {}'.format(address, e))
+        ring.close()
+        return
+
+    window_start, window_frames = time.time(), 0
+    try:
+        for packet in container.demux(video=0):
+            if stop_event.is_set():
+                break
+            received_at = time.time()
+            try:
+                frames = packet.decode()
+            except av.error.InvalidDataError:
+                stats[STAT_ERRORS] += 1
+                continue
+
+            for frame in frames:
+                image = frame.to_ndarray(width=width, height=height, format='rgb24')
+                ring.put(image)
+                now = time.time()
+                window_frames += 1
+                if now - window_start >= FPS_WINDOW:
+                    stats[STAT_FPS] = window_frames / (now - window_start)
+                    window_start, window_frames = now, 0
+                stats[STAT_LATENCY] += STATS_SMOOTHING * (now - received_at - stats[STAT_LATENCY])
+                stats[STAT_LAST_FRAME_TIME] = now
+                stats[STAT_DECODED] += 1
+    finally:
+        container.close()
+        ring.close()
+
+
+class MultiStreamDecoder:
+    """Decodes several Tello video streams, each in its own worker process.
+    The latest frame of each stream is available through shared memory with `get_frame`.
+    Frames are converted to RGB and scaled to `frame_shape` by the worker.
+    """
+
+    def __init__(self, frame_shape: tuple = (720, 960, 3)):
+        self.frame_shape = frame_shape
+        self.names: List[str] = []
+        self.addresses: Dict[str, str] = {}
+        self.rings: Dict[str, SharedFrameRing] = {}
+        self.stats: Dict[str, multiprocessing.Array] = {}
+        self.workers: Dict[str, multiprocessing.Process] = {}
+        self.last_read_seq: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self.stop_event = multiprocessing.Event()
+
+    def add_stream(self, name: str, address: str):
+        """Register a stream, e.g. `add_stream(tello.address[0], tello.get_udp_video_address())`
+        """
+        if name in self.rings:
+            raise TelloException('Stream {} already registered'.format(name))
+        self.names.append(name)
+        self.addresses[name] = address
+        self.rings[name] = SharedFrameRing.create(self.frame_shape)
+        self.stats[name] = multiprocessing.Array('d', STAT_COUNT, lock=False)
+        self.last_read_seq[name] = 0
+        self.skipped[name] = 0
+
+    def start(self):
+        """Start one decoding process per registered stream"""
+        for name in self.names:
+            if name in self.workers:
+                continue
+            worker = multiprocessing.Process(
+                target=_decode_worker, daemon=True, name='decode-{}'.format(name),
+                args=(self.addresses[name], self.rings[name].name, self.stats[name], self.stop_event))
+            worker.start()
+            self.workers[name] = worker
+
+    def get_ring_name(self, name: str) -> str:
+        """Name of the shared memory ring of a stream, to attach to it from another process"""
+        return self.rings[name].name
+
+    def get_frame(self, name: str, out: np.ndarray = None) -> Tuple[int, np.ndarray]:
+        """Copy of the latest frame of a stream and its sequence number (0 before the first frame).
+        Pass `out` to copy into a preallocated array of shape `frame_shape`.
+        Use `self.rings[name].latest()` for a zero-copy view instead.
+        """
+        seq, out = self.rings[name].read(out)
+        if seq > self.last_read_seq[name] + 1:
+            self.skipped[name] += seq - self.last_read_seq[name] - 1
+        self.last_read_seq[name] = max(seq, self.last_read_seq[name])
+        return seq, out
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Per stream statistics:
+        decoded frames, decoding errors, frames never read by get_frame (dropped),
+        fps, latency (seconds between packet reception and frame availability),
+        and age of the latest frame in seconds
+        """
+        now = time.time()
+        report = {}
+        for name in self.names:
+            stats = self.stats[name]
+            last = stats[STAT_LAST_FRAME_TIME]
+            report[name] = {'decoded': int(stats[STAT_DECODED]),
+                            'errors': int(stats[STAT_ERRORS]),
+                            'dropped': self.skipped[name],
+                            'fps': round(stats[STAT_FPS], 1),
+                            'latency': stats[STAT_LATENCY],
+                            'age': now - last if last > 0 else float('inf'),
+                            'alive': name in self.workers and self.workers[name].is_alive()}
+        return report
+
+    def stop(self):
+        """Stop the decoding processes and release the shared memory"""
+        self.stop_event.set()
+        for worker in self.workers.values():
+            worker.join(timeout=Tello.FRAME_GRAB_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers.clear()
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
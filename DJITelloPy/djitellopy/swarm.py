@@ -1,14 +1,142 @@
 """Library for controlling multiple DJI Ryze Tello drones.
 """
 
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
 from threading import Thread, Barrier
 from queue import Queue
-from typing import List, Callable
+from typing import Any, Dict, List, Callable, Optional
 
+from . import metrics
 from .tello import Tello, TelloException
 from .enforce_types import enforce_types
 
 
+class SwarmState:
+    """Latest telemetry of all drones of a swarm as a drones x fields matrix, updated in place
+    by the state receiver. Fields that were never received are NaN.
+
+    ```python
+    heights = swarm.state.column('h')
+    print(heights.mean(), swarm.state.matrix[:, swarm.state.columns['bat']].min())
+    ```
+
+    Rows are written field by field from the receiver thread, a row read concurrently
+    may mix two consecutive packets of the same drone.
+    """
+    FIELDS = Tello.INT_STATE_FIELDS + Tello.FLOAT_STATE_FIELDS
+
+    def __init__(self, count: int):
+        import numpy as np
+
+        self.columns: Dict[str, int] = {field: j for j, field in enumerate(self.FIELDS)}
+        self.matrix = np.full((count, len(self.FIELDS)), np.nan)
+        self.timestamps = np.zeros(count)  # time.time() of the last state packet, 0 if none
+
+    def update(self, i: int, state: dict):
+        """Write a parsed state packet into row `i`. Called from the receiver thread.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        row = self.matrix[i]
+        columns = self.columns
+        for key, value in state.items():
+            j = columns.get(key)
+            if j is not None:
+                row[j] = value
+        self.timestamps[i] = time.time()
+
+    def column(self, field: str) -> 'np.ndarray':
+        """View on the values of `field` for all drones"""
+        return self.matrix[:, self.columns[field]]
+
+    def age(self) -> 'np.ndarray':
+        """Seconds since the last state packet of each drone (inf if none)"""
+        age = time.time() - self.timestamps
+        age[self.timestamps == 0] = float('inf')
+        return age
+
+
+class SwarmResult:
+    """Outcome of [TelloSwarm.run][swarm] for each targeted drone, indexed by drone index.
+
+    - `results`: return value of the drones that completed
+    - `failures`: exception raised for the drones that failed
+    - `stragglers`: drones that did not complete before the deadline, their
+      futures in `futures` can still be waited on
+    """
+
+    def __init__(self, futures: Dict[int, Future]):
+        self.futures = futures
+        self.results: Dict[int, Any] = {}
+        self.failures: Dict[int, BaseException] = {}
+        self.stragglers: List[int] = []
+
+        for i, future in futures.items():
+            if not future.done():
+                self.stragglers.append(i)
+            elif future.exception() is not None:
+                self.failures[i] = future.exception()
+            else:
+                self.results[i] = future.result()
+
+    @property
+    def ok(self) -> bool:
+        """True when every targeted drone completed without error"""
+        return not self.failures and not self.stragglers
+
+    def raise_for_failures(self):
+        """Raise a TelloException summarizing the failed and straggling drones, if any"""
+        if self.ok:
+            return
+        details = ['drone {}: {}'.format(i, e) for i, e in sorted(self.failures.items())]
+        details += ['drone {}: no result before deadline'.format(i) for i in self.stragglers]
+        raise TelloException('Swarm command failed for {} drone(s): {}'.format(len(details), '; '.join(details)))
+
+    def __repr__(self):
+        return 'SwarmResult(results={}, failures={}, stragglers={})'.format(
+            sorted(self.results), sorted(self.failures), self.stragglers)
+
+
+class DroneReadiness:
+    """Bring-up outcome of one drone of [TelloSwarm.bootstrap][swarm]
+    """
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.ready = False
+        self.error: str = ''
+        self.elapsed: float = 0.0  # in seconds, time spent bringing up the drone (or until the deadline)
+        self.battery: int = -1
+        self.sdk_version: str = ''
+
+    def __repr__(self):
+        if self.ready:
+            return '{}: ready in {:.2f}s, battery {}%, sdk {}'.format(
+                self.ip, self.elapsed, self.battery, self.sdk_version or '?')
+        return '{}: not ready after {:.2f}s ({})'.format(self.ip, self.elapsed, self.error)
+
+
+class SwarmReadiness:
+    """Readiness report returned by [TelloSwarm.bootstrap][swarm], one DroneReadiness per drone index
+    """
+
+    def __init__(self, drones: List[DroneReadiness]):
+        self.drones = drones
+
+    @property
+    def ready(self) -> List[int]:
+        return [i for i, drone in enumerate(self.drones) if drone.ready]
+
+    @property
+    def failed(self) -> List[int]:
+        return [i for i, drone in enumerate(self.drones) if not drone.ready]
+
+    def __repr__(self):
+        return '\n'.join(['{}/{} drones ready'.format(len(self.ready), len(self.drones))] +
+                         [repr(drone) for drone in self.drones])
+
+
 @enforce_types
 class TelloSwarm:
     """Swarm library for controlling multiple Tellos simultaneously
@@ -19,35 +147,106 @@ class TelloSwarm:
     funcBarier: Barrier
     funcQueues: List[Queue]
     threads: List[Thread]
+    executor: ThreadPoolExecutor
+    pending: Dict[int, Future]
+    state: SwarmState
+
+    STALE_STATE_AGE = 0.5  # in seconds, the Tello sends about 10 state packets per second
+    RC_SPIN_WAIT = 0.002  # in seconds, busy-wait this long before a scheduled rc dispatch instead of sleeping
 
     @staticmethod
-    def fromFile(path: str):
+    def fromFile(path: str, shards: Optional[list] = None):
         """Create TelloSwarm from file. The file should contain one IP address per line.
 
         Arguments:
             path: path to the file
+            shards: optional list of [TelloShard][tello], see `fromIps`
         """
         with open(path, 'r') as fd:
             ips = fd.readlines()
 
-        return TelloSwarm.fromIps(ips)
+        return TelloSwarm.fromIps(ips, shards)
 
     @staticmethod
-    def fromIps(ips: list):
+    def fromIps(ips: list, shards: Optional[list] = None):
         """Create TelloSwarm from a list of IP addresses.
 
         Arguments:
             ips: list of IP Addresses
+            shards: optional list of [TelloShard][tello], drone i uses shards[i % len(shards)]
         """
         if not ips:
             raise TelloException("No ips provided")
 
         tellos = []
-        for ip in ips:
-            tellos.append(Tello(ip.strip()))
+        for i, ip in enumerate(ips):
+            shard = shards[i % len(shards)] if shards else None
+            tellos.append(Tello(ip.strip(), shard=shard))
 
         return TelloSwarm(tellos)
 
+    @staticmethod
+    def bootstrap(ips: list, timeout=10, min_battery=0, min_sdk_version=None, network_ports=None,
+                  shards: Optional[list] = None):
+        """Create a TelloSwarm and bring all drones up concurrently, within a single deadline
+        of `timeout` seconds: enter SDK mode, wait for the first state packet, check the battery
+        and the SDK version and optionally set the state and video ports.
+        Returns the swarm (with all drones) and a [SwarmReadiness][swarm] report telling which
+        drones are ready, which failed, why, and how long each took.
+
+        ```python
+        swarm, report = TelloSwarm.bootstrap(ips, timeout=5, min_battery=30)
+        print(report)
+        ready = TelloSwarm([swarm.tellos[i] for i in report.ready])
+        ```
+
+        Arguments:
+            ips: list of IP Addresses
+            timeout: deadline in seconds for the whole bring-up
+            min_battery: drones below this battery percentage are reported as failed
+            min_sdk_version: drones reporting a lower SDK version (e.g. 20 for SDK 2.0) are reported as failed
+            network_ports: optional list of (state_port, video_port) per drone, sent with `set_network_ports`
+            shards: optional list of [TelloShard][tello], see `fromIps`
+        """
+        swarm = TelloSwarm.fromIps(ips, shards)
+        report = SwarmReadiness([DroneReadiness(tello.address[0]) for tello in swarm.tellos])
+        start_time = time.time()
+
+        def bring_up(i: int, tello: Tello):
+            readiness = report.drones[i]
+            try:
+                tello.connect()
+                readiness.battery = tello.get_battery()
+                if readiness.battery < min_battery:
+                    raise TelloException('Battery too low: {}%'.format(readiness.battery))
+
+                readiness.sdk_version = tello.query_sdk_version()
+                if min_sdk_version is not None and readiness.sdk_version.isdigit() \
+                        and int(readiness.sdk_version) < min_sdk_version:
+                    raise TelloException('SDK version too old: {}'.format(readiness.sdk_version))
+
+                if network_ports is not None:
+                    tello.set_network_ports(*network_ports[i])
+            finally:
+                elapsed = time.time() - start_time
+                if elapsed <= timeout:  # stragglers must not alter the report once returned
+                    readiness.elapsed = elapsed
+
+        result = swarm.run(bring_up, timeout=timeout)
+
+        for i, drone in enumerate(report.drones):
+            if i in result.results:
+                drone.ready = True
+            elif i in result.failures:
+                drone.error = str(result.failures[i])
+            else:
+                drone.error = 'no answer before the {}s deadline'.format(timeout)
+                drone.elapsed = time.time() - start_time
+
+        Tello.LOGGER.info('Swarm bring-up: {}/{} drones ready in {:.2f}s'.format(
+            len(report.ready), len(report.drones), time.time() - start_time))
+        return swarm, report
+
     def __init__(self, tellos: List[Tello]):
         """Initialize a TelloSwarm instance
 
@@ -65,6 +264,8 @@ class TelloSwarm:
 
             while True:
                 func = queue.get()
+                if func is None:  # see end()
+                    return
                 self.funcBarrier.wait()
                 func(i, tello)
                 self.funcBarrier.wait()
@@ -75,6 +276,18 @@ class TelloSwarm:
             thread.start()
             self.threads.append(thread)
 
+        # One worker per drone for submit() and run(): a hung drone only holds its own worker
+        self.executor = ThreadPoolExecutor(max_workers=len(tellos), thread_name_prefix='TelloSwarm')
+        self.pending = {}
+
+        self.rc_targets = [(tello.control_socket, tello.address) for tello in tellos]
+        self.last_rc_dispatch_skew = 0.0
+
+        self.state = SwarmState(len(tellos))
+        self.state_listeners = [partial(self.state.update, i) for i in range(len(tellos))]
+        for tello, listener in zip(tellos, self.state_listeners):
+            tello.add_state_listener(listener)
+
     def sequential(self, func: Callable[[int, Tello], None]):
         """Call `func` for each tello sequentially. The function retrieves
         two arguments: The index `i` of the current drone and `tello` the
@@ -106,6 +319,114 @@ class TelloSwarm:
         self.funcBarrier.wait()
         self.funcBarrier.wait()
 
+    def submit(self, func: Callable[[int, Tello], Any], indices=None) -> Dict[int, Future]:
+        """Call `func` for each tello in parallel without waiting, and return a
+        [Future](https://docs.python.org/3/library/concurrent.futures.html#future-objects)
+        per drone index. `indices` restricts the call to a subset of the drones.
+
+        A drone that is still running a previous submission is not called again:
+        its future fails immediately with a TelloException.
+
+        ```python
+        futures = swarm.submit(lambda i, tello: tello.query_battery())
+        print(futures[0].result(timeout=5))
+        ```
+        """
+        if indices is None:
+            indices = range(len(self.tellos))
+
+        futures = {}
+        for i in indices:
+            previous = self.pending.get(i)
+            if previous is not None and not previous.done():
+                future = Future()
+                future.set_exception(TelloException('Drone {} is still busy with a previous call'.format(i)))
+            else:
+                future = self.executor.submit(func, i, self.tellos[i])
+                self.pending[i] = future
+            futures[i] = future
+        return futures
+
+    def run(self, func: Callable[[int, Tello], Any], timeout=None, indices=None) -> SwarmResult:
+        """Call `func` for each tello in parallel and wait at most `timeout` seconds
+        for all of them. Unlike `parallel`, an exception or a hung drone only affects
+        that drone: the returned [SwarmResult][swarm] reports the results, failures
+        and stragglers individually. `indices` restricts the call to a subset of the drones.
+
+        ```python
+        result = swarm.run(lambda i, tello: tello.takeoff(), timeout=10)
+        for i in result.stragglers + list(result.failures):
+            swarm.tellos[i].emergency()
+        ```
+        """
+        futures = self.submit(func, indices)
+        wait(list(futures.values()), timeout=timeout)
+        return SwarmResult(futures)
+
+    def broadcast_rc_control(self, velocities, send_at=None) -> float:
+        """Send an rc command to every drone from one tight loop, bypassing the worker threads.
+        `velocities` is an (N, 4) array of left_right, forward_backward, up_down and yaw velocities
+        (-100~100), one row per drone. When `send_at` (a time.time() timestamp) is given, the
+        datagrams are sent at that time. Returns the dispatch skew in seconds between the first
+        and the last datagram, also kept in `swarm.last_rc_dispatch_skew`.
+
+        ```python
+        velocities = np.zeros((len(swarm), 4), dtype=int)
+        velocities[:, 1] = 30
+        skew = swarm.broadcast_rc_control(velocities, send_at=time.time() + 0.01)
+        ```
+        """
+        import numpy as np
+
+        velocities = np.clip(np.asarray(velocities), -100, 100).astype(int)
+        if velocities.shape != (len(self.tellos), 4):
+            raise TelloException('Expected rc velocities of shape ({}, 4), got {}'
+                                 .format(len(self.tellos), velocities.shape))
+        # format everything first so that the send loop only does syscalls
+        datagrams = [b'rc %d %d %d %d' % tuple(row) for row in velocities.tolist()]
+
+        if send_at is not None:
+            delay = send_at - time.time() - self.RC_SPIN_WAIT
+            if delay > 0:
+                time.sleep(delay)
+            while time.time() < send_at:
+                pass
+
+        first = time.perf_counter()
+        for (sock, address), datagram in zip(self.rc_targets, datagrams):
+            sock.sendto(datagram, address)
+        self.last_rc_dispatch_skew = time.perf_counter() - first
+
+        for _, address in self.rc_targets:
+            metrics.RC_DATAGRAMS.labels(address[0]).inc()
+
+        return self.last_rc_dispatch_skew
+
+    def get_min_battery(self) -> float:
+        """Lowest battery percentage of the swarm, NaN drones (no state yet) are ignored
+        """
+        import numpy as np
+
+        battery = self.state.column('bat')
+        if np.isnan(battery).all():
+            return float('nan')
+        return float(np.nanmin(battery))
+
+    def get_heights(self) -> 'np.ndarray':
+        """Height in cm of every drone, as a vector indexed by drone index
+        """
+        return self.state.column('h')
+
+    def get_stale_drones(self, max_age=STALE_STATE_AGE) -> 'np.ndarray':
+        """Indices of the drones without a state packet during the last `max_age` seconds
+
+        ```python
+        for i in swarm.get_stale_drones():
+            print('lost telemetry of', swarm.tellos[i].address[0])
+        ```
+        """
+        return (self.state.age() > max_age).nonzero()[0]
+
     def sync(self, timeout: float = None):
         """Sync parallel tello threads. The code continues when all threads
         have called `swarm.sync`.
@@ -125,6 +446,26 @@ class TelloSwarm:
         """
         return self.barrier.wait(timeout)
 
+    def end(self):
+        """Call `end` on all tellos and stop the worker threads of the swarm.
+        Submitted functions that did not start yet are cancelled.
+        """
+        # by hand: shutdown(cancel_futures=True) needs Python 3.9
+        for future in self.pending.values():
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        for tello, listener in zip(self.tellos, self.state_listeners):
+            tello.remove_state_listener(listener)
+        self.parallel(lambda i, tello: tello.end())
+        for queue in self.funcQueues:
+            queue.put(None)
+
+    def __del__(self):
+        # __getattr__ would forward a missing attribute to the tellos, e.g. if __init__ failed
+        executor = self.__dict__.get('executor')
+        if executor is not None:
+            executor.shutdown(wait=False)
+
     def __getattr__(self, attr):
         """Call a standard tello function in parallel on all tellos.
 
@@ -3,20 +3,26 @@
 
 # coding=utf-8
 import logging
+import selectors
 import socket
 import time
+import warnings
+from functools import partial
 from threading import Thread
 from typing import Optional, Union, Type, Dict
 
+from . import metrics
 from .enforce_types import enforce_types
 
-import av
-import numpy as np
+# av (PyAV) and numpy are only needed for the video stream: they are imported by BackgroundFrameRead,
+# so that scripts that only send commands do not pay their import time
 
 
 threads_initialized = False
 drones: Optional[dict] = {}
 client_socket: socket.socket
+receiver: Optional['UdpReceiver'] = None
+default_shard: Optional['TelloShard'] = None
 
 
 class TelloException(Exception):
@@ -42,6 +48,11 @@ class Tello:
     # Video stream, server socket
     VS_UDP_IP = '0.0.0.0'
     VS_UDP_PORT = 11111
+    # Stream probe when opening the video: the Tello always sends H.264, so a short probe is enough and
+    # brings the time to the first frame from about 2 seconds down to a few hundred milliseconds.
+    # Set them to None to use the FFmpeg defaults.
+    VIDEO_PROBE_SIZE = 32768  # in bytes
+    VIDEO_ANALYZE_DURATION = 0  # in microseconds
 
     CONTROL_UDP_PORT = 8889
     CONTROL_UDP_PORT_CLIENT = CONTROL_UDP_PORT
@@ -100,98 +111,119 @@ class Tello:
     def __init__(self,
                  host=TELLO_IP,
                  retry_count=RETRY_COUNT,
-                 image_received_method=None):
+                 image_received_method=None,
+                 shard=None):
 
-        global threads_initialized, client_socket, drones
 
         self.address = (host, Tello.CONTROL_UDP_PORT)
         self.stream_on = False
         self.retry_count = retry_count
+        self.vs_udp_port = Tello.VS_UDP_PORT
         self.last_received_command_timestamp = time.time()
         self.last_rc_control_timestamp = time.time()
         self.update_frame_method = image_received_method
 
-        if not threads_initialized:
-            # Run Tello command responses UDP receiver on background
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            client_socket.bind(('', Tello.CONTROL_UDP_PORT_CLIENT))
-            response_receiver_thread = Thread(
-                target=Tello.udp_response_receiver)
-            response_receiver_thread.daemon = True
-            response_receiver_thread.start()
-
-            # Run state UDP receiver on background
-            state_receiver_thread = Thread(target=Tello.udp_state_receiver)
-            state_receiver_thread.daemon = True
-            state_receiver_thread.start()
-
-            threads_initialized = True
+        if shard is None:
+            shard = Tello.get_default_shard()
 
-        drones[host] = {'responses': [], 'state': {}}
+        self.shard = shard
+        self.control_socket = shard.control_socket
+        shard.drones[host] = {'responses': [], 'state': {}, 'state_listeners': ()}
 
         self.LOGGER.info("Tello instance was initialized. Host: '{}'. Port: '{}'.".format(
             host, Tello.CONTROL_UDP_PORT))
 
     def get_own_udp_object(self):
-        """Get own object from the global drones dict. This object is filled
-        with responses and state information by the receiver threads.
+        """Get own object from the drones dict of the shard (the global drones dict by default).
+        This object is filled with responses and state information by the background receiver.
         Internal method, you normally wouldn't call this yourself.
         """
-        global drones
-
         host = self.address[0]
-        return drones[host]
+        return self.shard.drones[host]
+
+    @staticmethod
+    def get_default_shard() -> 'TelloShard':
+        """Get the shard of the drones created without one, created on first use.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        global threads_initialized, client_socket, receiver, default_shard
+        if not threads_initialized:
+            # Run Tello command responses and state UDP receivers on background.
+            # Drones created without a shard share these sockets and the global drones dict
+            default_shard = TelloShard(control_port=Tello.CONTROL_UDP_PORT_CLIENT, state_port=Tello.STATE_UDP_PORT,
+                                       drones_dict=drones)
+            client_socket = default_shard.control_socket
+            receiver = default_shard.receiver
+            threads_initialized = True
+        return default_shard
 
     @staticmethod
     def udp_response_receiver():
-        """Setup drone UDP receiver. This method listens for responses of Tello.
-        Must be run from a background thread in order to not block the main thread.
+        """Deprecated: the responses are received by the background receiver of the default shard,
+        started with the first Tello. Starts it if needed and blocks while it runs, like the former receiver loop.
         Internal method, you normally wouldn't call this yourself.
         """
-        while True:
-            try:
-                data, address = client_socket.recvfrom(1024)
+        warnings.warn('Tello.udp_response_receiver is deprecated, the receiver runs in the background',
+                      DeprecationWarning, stacklevel=2)
+        Tello.get_default_shard().receiver.worker.join()
 
-                address = address[0]
-                Tello.LOGGER.debug(
-                    'Data received from {} at client_socket'.format(address))
+    @staticmethod
+    def udp_state_receiver():
+        """Deprecated: the state packets are received by the background receiver of the default shard,
+        started with the first Tello. Starts it if needed and blocks while it runs, like the former receiver loop.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        warnings.warn('Tello.udp_state_receiver is deprecated, the receiver runs in the background',
+                      DeprecationWarning, stacklevel=2)
+        Tello.get_default_shard().receiver.worker.join()
 
-                if address not in drones:
-                    continue
+    @staticmethod
+    def udp_response_handler(drones, data, address):
+        """Handle a response of a Tello received on the client socket.
+        Called from the receiver I/O loop with a view on its receive buffer.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        Tello.LOGGER.debug(
+            'Data received from {} at client_socket'.format(address))
 
-                drones[address]['responses'].append(data)
+        if address not in drones:
+            return
 
-            except Exception as e:
-                Tello.LOGGER.error(e)
-                break
+        # the receive buffer is reused for the next datagram, keep a copy
+        drones[address]['responses'].append(bytes(data))
 
     @staticmethod
-    def udp_state_receiver():
-        """Setup state UDP receiver. This method listens for state information from
-        Tello. Must be run from a background thread in order to not block
-        the main thread.
+    def udp_state_handler(drones, data, address):
+        """Handle a state packet of a Tello received on the state socket.
+        Called from the receiver I/O loop with a view on its receive buffer.
         Internal method, you normally wouldn't call this yourself.
         """
-        state_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        state_socket.bind(("", Tello.STATE_UDP_PORT))
+        Tello.LOGGER.debug(
+            'Data received from {} at state_socket'.format(address))
 
-        while True:
-            try:
-                data, address = state_socket.recvfrom(1024)
+        if address not in drones:
+            return
 
-                address = address[0]
-                Tello.LOGGER.debug(
-                    'Data received from {} at state_socket'.format(address))
+        drone = drones[address]
+        drone['state'] = Tello.parse_state(str(data, 'ASCII'))
+        metrics.STATE_PACKETS.labels(address).inc()
+        if 'bat' in drone['state']:
+            metrics.BATTERY.labels(address).set(drone['state']['bat'])
+        for listener in drone['state_listeners']:
+            listener(drone['state'])
 
-                if address not in drones:
-                    continue
-
-                data = data.decode('ASCII')
-                drones[address]['state'] = Tello.parse_state(data)
-
-            except Exception as e:
-                Tello.LOGGER.error(e)
-                break
+    @staticmethod
+    def get_receiver_stats() -> dict:
+        """Get the packet and error counters of the default background receiver, per socket.
+        Drones created with their own [TelloShard][tello] report through `tello.shard.get_stats()`.
+        ```python
+        {'control': {'packets': 12, 'bytes': 36, 'errors': 0},
+         'state': {'packets': 250, 'bytes': 32000, 'errors': 0}}
+        ```
+        """
+        if receiver is None:
+            return {}
+        return receiver.get_stats()
 
     @staticmethod
     def parse_state(state: str) -> Dict[str, Union[int, float, str]]:
@@ -234,6 +266,25 @@ class Tello:
         """
         return self.get_own_udp_object()['state']
 
+    def add_state_listener(self, listener):
+        """Call `listener(state)` from the receiver thread with every parsed state packet of this drone.
+        The listener must be fast, it runs on the receive path. Several listeners (e.g. of several swarms)
+        are called in the order they were added.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        drone = self.get_own_udp_object()
+        # replaced, not modified in place: the receiver thread may be iterating over the previous tuple
+        drone['state_listeners'] = drone['state_listeners'] + (listener,)
+
+    def remove_state_listener(self, listener):
+        """Stop calling a listener added with `add_state_listener`.
+        Internal method, you normally wouldn't call this yourself.
+        """
+        drone = self.shard.drones.get(self.address[0])
+        if drone is None:  # the tello was ended
+            return
+        drone['state_listeners'] = tuple(other for other in drone['state_listeners'] if other is not listener)
+
     def get_state_field(self, key: str):
         """Get a specific sate field by name.
         Internal method, you normally wouldn't call this yourself.
@@ -406,18 +457,33 @@ class Tello:
         """
         address_schema = 'udp://{ip}:{port}'  # + '?overrun_nonfatal=1&fifo_size=5000'
         address = address_schema.format(
-            ip=self.VS_UDP_IP, port=self.VS_UDP_PORT)
+            ip=self.VS_UDP_IP, port=self.vs_udp_port)
         return address
 
-    def get_frame_read(self) -> 'BackgroundFrameRead':
+    @staticmethod
+    def get_video_options() -> Dict[str, str]:
+        """Options passed to av.open for the video stream, see VIDEO_PROBE_SIZE and VIDEO_ANALYZE_DURATION
+        Internal method, you normally wouldn't call this yourself.
+        """
+        options = {}
+        if Tello.VIDEO_PROBE_SIZE is not None:
+            options['probesize'] = str(Tello.VIDEO_PROBE_SIZE)
+        if Tello.VIDEO_ANALYZE_DURATION is not None:
+            options['analyzeduration'] = str(Tello.VIDEO_ANALYZE_DURATION)
+        return options
+
+    def get_frame_read(self, frame_ring=None) -> 'BackgroundFrameRead':
         """Get the BackgroundFrameRead object from the camera drone. Then, you just need to call
         backgroundFrameRead.frame to get the actual frame received by the drone.
+        Arguments:
+            frame_ring: optional [SharedFrameRing][frame_ring] that every decoded frame is also
+                published to (scaled to the ring frame shape), for consumers in other processes
         Returns:
             BackgroundFrameRead
         """
         if self.background_frame_read is None:
             address = self.get_udp_video_address()
-            self.background_frame_read = BackgroundFrameRead(address, self.update_frame_method)
+            self.background_frame_read = BackgroundFrameRead(address, self.update_frame_method, frame_ring)
             self.background_frame_read.start()
         return self.background_frame_read
 
@@ -438,7 +504,7 @@ class Tello:
         self.LOGGER.info("Send command: '{}'".format(command))
         timestamp = time.time()
 
-        client_socket.sendto(command.encode('utf-8'), self.address)
+        self.control_socket.sendto(command.encode('utf-8'), self.address)
 
         responses = self.get_own_udp_object()['responses']
 
@@ -447,10 +513,12 @@ class Tello:
                 message = "Aborting command '{}'. Did not receive a response after {} seconds".format(
                     command, timeout)
                 self.LOGGER.warning(message)
+                metrics.COMMAND_TIMEOUTS.labels(self.address[0]).inc()
                 return message
             time.sleep(0.1)  # Sleep during send command
 
         self.last_received_command_timestamp = time.time()
+        metrics.COMMAND_RTT.labels(self.address[0]).observe(self.last_received_command_timestamp - timestamp)
 
         first_response = responses.pop(0)  # first datum from socket
         try:
@@ -471,7 +539,7 @@ class Tello:
 
         self.LOGGER.info(
             "Send command (no response expected): '{}'".format(command))
-        client_socket.sendto(command.encode('utf-8'), self.address)
+        self.control_socket.sendto(command.encode('utf-8'), self.address)
 
     def send_control_command(self, command: str, timeout: int = RESPONSE_TIMEOUT) -> bool:
         """Send control command to Tello and wait for its response.
@@ -837,6 +905,7 @@ class Tello:
                 clamp100(yaw_velocity)
             )
             self.send_command_without_return(cmd)
+            metrics.RC_DATAGRAMS.labels(self.address[0]).inc()
 
     def set_wifi_credentials(self, ssid: str, password: str):
         """Set the Wi-Fi SSID and password. The Tello will reboot afterwords.
@@ -853,12 +922,15 @@ class Tello:
         self.send_control_command(cmd)
 
     def set_network_ports(self, state_packet_port: int, video_stream_port: int):
-        """Sets the ports for state packets and video streaming
-        While you can use this command to reconfigure the Tello this library currently does not support
-        non-default ports (TODO!)
+        """Sets the ports for state packets and video streaming.
+        The video stream is then read from `video_stream_port` by `get_frame_read`, which
+        allows to decode the streams of several drones on one host (see `djitellopy.multistream`).
+        State packets are only received if the drone shard listens on `state_packet_port`,
+        see [TelloShard][tello].
         """
         cmd = 'port {} {}'.format(state_packet_port, video_stream_port)
         self.send_control_command(cmd)
+        self.vs_udp_port = video_stream_port
 
     def reboot(self):
         """Reboots the drone
@@ -1025,13 +1097,140 @@ class Tello:
             self.background_frame_read.stop()
 
         host = self.address[0]
-        if host in drones:
-            del drones[host]
+        if host in self.shard.drones:
+            del self.shard.drones[host]
 
     def __del__(self):
         self.end()
 
 
+class TelloShard:
+    """
+    Control and state sockets bound to a local address, with their own receiver thread.
+    By default all drones share one shard bound to all interfaces. Giving each drone, or each
+    group of drones, its own shard spreads the receive processing over several threads and allows
+    to bind each group to a specific local interface, e.g. one USB Wi-Fi adapter per group:
+
+    ```python
+    shard_a = TelloShard(local_ip='192.168.10.2')
+    shard_b = TelloShard(local_ip='192.168.10.3', device='wlan2')
+    tellos = [Tello('192.168.10.1', shard=shard_a), Tello('192.168.10.1', shard=shard_b)]
+    ```
+
+    Responses are routed by sender ip within a shard, so drones with the same ip (Tellos in AP mode)
+    can be used together as long as they are in different shards. Drones sharing a local ip in different
+    shards must be told another state port with `tello.set_network_ports`. On Linux, a shard bound to a
+    specific local ip cannot share its state port with a shard bound to all interfaces, such as the default one.
+
+    Arguments:
+        local_ip: local address to bind to, '' for all interfaces
+        control_port: local port of the command socket, 0 for any free port
+        state_port: local port of the state socket
+        device: network interface name to bind to (SO_BINDTODEVICE, Linux only, needs privileges)
+        drones_dict: routing dict to use, internal argument
+    """
+
+    def __init__(self, local_ip: str = '', control_port: int = 0, state_port: int = Tello.STATE_UDP_PORT,
+                 device: str = None, drones_dict: dict = None):
+        self.drones: dict = {} if drones_dict is None else drones_dict
+        self.control_socket = self._bind(local_ip, control_port, device)
+        self.state_socket = self._bind(local_ip, state_port, device)
+
+        self.receiver = UdpReceiver()
+        self.receiver.register('control', self.control_socket, partial(Tello.udp_response_handler, self.drones))
+        self.receiver.register('state', self.state_socket, partial(Tello.udp_state_handler, self.drones))
+        self.receiver.start()
+
+    @staticmethod
+    def _bind(local_ip: str, port: int, device: str = None) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if device is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, device.encode())
+        sock.bind((local_ip, port))
+        return sock
+
+    def get_stats(self) -> dict:
+        """Packet and error counters of the shard receiver, per socket"""
+        return self.receiver.get_stats()
+
+    def close(self):
+        """Stop the receiver thread and close the sockets"""
+        self.receiver.stop()
+        self.receiver.worker.join()
+        self.control_socket.close()
+        self.state_socket.close()
+
+
+class UdpReceiver:
+    """
+    Background I/O loop receiving the datagrams of several UDP sockets with a single thread.
+    Sockets are multiplexed with a selector (epoll on Linux) and read with recvfrom_into
+    into a buffer preallocated per socket. Errors are counted and logged, the loop keeps running.
+    Internal class, you normally wouldn't use this yourself.
+    """
+    BUFFER_SIZE = 1024
+    SELECT_TIMEOUT = 0.5  # in seconds, only bounds the time needed to notice stop()
+    MAX_READS_PER_WAKEUP = 64  # drain queued datagrams before going back to select
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.stopped = False
+        self.worker = Thread(target=self.run, daemon=True)
+
+    def register(self, name: str, sock: socket.socket, handler):
+        """Serve `sock` in the I/O loop. `handler(data, address)` is called for each datagram,
+        with `data` a memoryview on the receive buffer (only valid during the call) and `address` the sender ip.
+        """
+        sock.setblocking(False)
+        buffer = bytearray(self.BUFFER_SIZE)
+        self.stats[name] = {'packets': 0, 'bytes': 0, 'errors': 0}
+        self.selector.register(sock, selectors.EVENT_READ, (name, handler, buffer, memoryview(buffer)))
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        self.stopped = True
+
+    def get_stats(self) -> dict:
+        return {name: dict(counters) for name, counters in self.stats.items()}
+
+    def run(self):
+        while not self.stopped:
+            try:
+                events = self.selector.select(self.SELECT_TIMEOUT)
+            except OSError as e:  # e.g. a registered socket was closed
+                Tello.LOGGER.error(e)
+                time.sleep(self.SELECT_TIMEOUT)
+                continue
+
+            for key, _ in events:
+                self._read(key.fileobj, *key.data)
+
+    def _read(self, sock: socket.socket, name: str, handler, buffer: bytearray, view: memoryview):
+        counters = self.stats[name]
+        for _ in range(self.MAX_READS_PER_WAKEUP):
+            try:
+                size, address = sock.recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # Transient errors (e.g. ICMP port unreachable reported as ConnectionResetError on Windows)
+                # must not kill the receiver
+                counters['errors'] += 1
+                Tello.LOGGER.error('{} socket: {}'.format(name, e))
+                return
+
+            counters['packets'] += 1
+            counters['bytes'] += size
+            try:
+                handler(view[:size], address[0])
+            except Exception as e:
+                counters['errors'] += 1
+                Tello.LOGGER.error('{} socket: {}'.format(name, e))
+
+
 # noinspection PyUnresolvedReferences
 class BackgroundFrameRead:
     """
@@ -1039,18 +1238,24 @@ class BackgroundFrameRead:
     backgroundFrameRead.frame to get the current frame.
     """
 
-    def __init__(self, address, frame_update_callback=None):
+    def __init__(self, address, frame_update_callback=None, frame_ring=None):
+        import av
+        import numpy as np
+
         self.address = address
         self.frame = np.zeros([300, 400, 3], dtype=np.uint8)
         self.frame_update_callback = frame_update_callback
+        self.frame_ring = frame_ring
+        self.frames_decoded = metrics.FRAMES_DECODED.labels(address)
+        self.decode_errors = metrics.DECODE_ERRORS.labels(address)
 
         # Try grabbing frame with PyAV
         # According to issue #90 the decoder might need some time
         # https://github.com/damiafuentes/DJITelloPy/issues/90#issuecomment-855458905
         try:
             Tello.LOGGER.debug('trying to grab video frames...')
-            self.container = av.open(self.address, timeout=(
-                Tello.FRAME_GRAB_TIMEOUT, None))
+            self.container = av.open(self.address, timeout=(Tello.FRAME_GRAB_TIMEOUT, None),
+                                     options=Tello.get_video_options())
         except av.error.ExitError:
             raise TelloException(
                 'Failed to grab video frames from video stream')
@@ -1068,15 +1273,32 @@ class BackgroundFrameRead:
         """Thread worker function to retrieve frames using PyAV
         Internal method, you normally wouldn't call this yourself.
         """
+        import av
+        import numpy as np
 
         try:
-            for frame in self.container.decode(video=0):
-                self.frame = np.array(frame.to_image())
+            for packet in self.container.demux(video=0):
+                try:
+                    frames = packet.decode()
+                except av.error.InvalidDataError:
+                    # with a short probe, the stream may start before a key frame
+                    self.decode_errors.inc()
+                    continue
+                for frame in frames:
+                    self.frames_decoded.inc()
+                    if self.frame_ring is None:
+                        self.frame = np.array(frame.to_image())
+                    else:
+                        height, width = self.frame_ring.shape[:2]
+                        self.frame = frame.to_ndarray(width=width, height=height, format='rgb24')
+                        self.frame_ring.put(self.frame)
+                    if self.stopped:
+                        break
+                    if self.frame_update_callback is not None:
+                        self.frame_update_callback()
                 if self.stopped:
                     self.container.close()
                     break
-                if self.frame_update_callback is not None:
-                    self.frame_update_callback()
         except av.error.ExitError:
             raise TelloException('Do not have enough frames for decoding, please try again or increase video'
                                  ' fps before get_frame_read()')
@@ -0,0 +1,85 @@
+"""
+Per-frame cost of drawing a camera frame on the pygame screen, before and after the zero-copy blit path.
+
+    legacy      numpy.rot90 + numpy.flipud + surfarray.make_surface + blit (new Surface every frame)
+    blit_array  surfarray.blit_array of a transposed view into a persistent subsurface of the screen
+    frombuffer  Display.blit_frame: pygame.image.frombuffer on the frame buffer + blit
+
+All methods must produce the same pixels, this is checked before timing.
+Runs without a window (SDL dummy video driver).
+
+Example (from the repository root):
+    python -m benchmarks.bench_display_blit --frames 300
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy
+import pygame
+
+from benchmarks.synthetic_video import RESOLUTIONS
+from subsys_display_view import Display
+
+PANEL_WIDTH: int = 160  # width of the information panel left of the image, as in the application
+
+
+def legacy(screen: pygame.Surface, frame: numpy.ndarray, position: tuple):
+    surface = pygame.surfarray.make_surface(numpy.flipud(numpy.rot90(frame)))
+    screen.blit(surface, position)
+
+
+def blit_array(image_area: pygame.Surface, frame: numpy.ndarray):
+    pygame.surfarray.blit_array(image_area, frame.swapaxes(0, 1))
+
+
+def measure(function, frames: int, warmup: int = 10) -> float:
+    """ Average duration of one call, in milliseconds """
+    for _ in range(warmup):
+        function()
+    start = time.perf_counter()
+    for _ in range(frames):
+        function()
+    return 1000 * (time.perf_counter() - start) / frames
+
+
+def run(resolution: str, frames: int, seed: int) -> dict:
+    width, height = RESOLUTIONS[resolution]
+    position = (PANEL_WIDTH, 0)
+    screen = pygame.display.set_mode((PANEL_WIDTH + width, height))
+    image_area = screen.subsurface(pygame.Rect(position, (width, height)))
+    frame = numpy.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=numpy.uint8)
+
+    legacy(screen, frame, position)
+    reference = pygame.surfarray.array3d(image_area)
+    blit_array(image_area, frame)
+    assert numpy.array_equal(pygame.surfarray.array3d(image_area), reference), 'blit_array differs from legacy'
+    Display.blit_frame(screen, frame, position)
+    assert numpy.array_equal(pygame.surfarray.array3d(image_area), reference), 'frombuffer differs from legacy'
+
+    return {'legacy': measure(lambda: legacy(screen, frame, position), frames),
+            'blit_array': measure(lambda: blit_array(image_area, frame), frames),
+            'frombuffer': measure(lambda: Display.blit_frame(screen, frame, position), frames)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the frame blit path of the pygame display')
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), action='append',
+                        help='resolution to benchmark, can be repeated (default: all)')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    pygame.init()
+    for resolution in args.resolution or sorted(RESOLUTIONS):
+        results = run(resolution, args.frames, args.seed)
+        speedup = results['legacy'] / results['frombuffer']
+        print(f"{resolution}: " + ', '.join(f"{name} {duration:.3f} ms" for name, duration in results.items())
+              + f" | frombuffer speedup x{speedup:.1f}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Startup cost of importing the library and the application modules, measured with "python -X importtime"
+in a fresh interpreter for every target, and check that the heavy dependencies are only loaded on first use.
+
+    library     from DJITelloPy.djitellopy import Tello     must not load av, cv2, pygame nor numpy
+    headless    import subsys_command_input                  must not load av, cv2 nor pygame
+    app         import main                                  must not load av, cv2 nor pygame
+
+With --check, exits with status 1 when a target loads a forbidden module or takes longer than --max-ms,
+so that it can guard against an import added back at module level.
+
+Example (from the repository root):
+    python -m benchmarks.bench_import_time --repeat 5 --check
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+HEAVY_MODULES: tuple = ('av', 'cv2', 'pygame', 'numpy')
+REPOSITORY_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# "import time: self [us] | cumulative | imported package", the package name is indented by its nesting level
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+
+class Target(NamedTuple):
+    statement: str
+    forbidden: tuple
+
+
+TARGETS: Dict[str, Target] = {
+    'library': Target('from DJITelloPy.djitellopy import Tello', ('av', 'cv2', 'pygame', 'numpy')),
+    'headless': Target('import subsys_command_input', ('av', 'cv2', 'pygame')),
+    'app': Target('import main', ('av', 'cv2', 'pygame')),
+}
+
+
+def measure(statement: str) -> (float, Dict[str, float]):
+    """ Total import time of statement in milliseconds, and cumulative time of every imported module """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=REPOSITORY_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr}")
+    modules = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        cumulative = int(match.group(2)) / 1000
+        modules[match.group(4)] = cumulative
+        if len(match.group(3)) == 1:  # top level import
+            total += cumulative
+    return total, modules
+
+
+def run(name: str, repeat: int) -> dict:
+    target = TARGETS[name]
+    totals: List[float] = []
+    modules: Dict[str, float] = {}
+    for _ in range(repeat):
+        total, modules = measure(target.statement)
+        totals.append(total)
+    heavy = {module: modules[module] for module in HEAVY_MODULES if module in modules}
+    return {'total_ms': min(totals),
+            'heavy': heavy,
+            'violations': [module for module in target.forbidden if module in modules]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the library and the application')
+    parser.add_argument('--target', choices=sorted(TARGETS), action='append',
+                        help='target to measure, can be repeated (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per target, the fastest one is reported')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if a forbidden module is loaded')
+    parser.add_argument('--max-ms', type=float, default=None, help='with --check, maximum import time per target')
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.target or sorted(TARGETS):
+        results = run(name, args.repeat)
+        heavy = ', '.join(f"{module} {duration:.0f} ms" for module, duration in results['heavy'].items()) or 'none'
+        print(f"{name}: {results['total_ms']:.0f} ms ({TARGETS[name].statement}) | heavy modules: {heavy}")
+        if results['violations']:
+            print(f"{name}: FAILED, loads {', '.join(results['violations'])} at import time")
+            failed = True
+        if args.max_ms is not None and results['total_ms'] > args.max_ms:
+            print(f"{name}: FAILED, {results['total_ms']:.0f} ms > {args.max_ms:.0f} ms")
+            failed = True
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Microbenchmarks of the hot paths of the Tello library, offline: the drones are local UDP responders on 127.0.0.x.
+
+    parse_state     Tello.parse_state on a Tello state line and on a Tello EDU line (mission pads enabled)
+    enforce_types   cost of the type checks added by @enforce_types, decorated call minus undecorated call
+    rc              send_rc_control to a local UDP sink: call duration, datagrams sent and received
+    rtt             send_command_with_return round trips against a local responder answering 'ok'
+    swarm           TelloSwarm.parallel and TelloSwarm.run dispatch of a no-op, with N = 1 to 32 dummy drones
+
+The drones use their own TelloShard bound to 127.0.0.1 on free ports, so the benchmark does not need the
+Tello ports 8889 / 8890 and does not disturb a running application.
+The results can be written to JSON (--output) and compared with a previous run (--compare), e.g. between commits:
+    python -m benchmarks.bench_tello --output before.json
+    python -m benchmarks.bench_tello --compare before.json
+"""
+import argparse
+import json
+import logging
+import platform
+import socket
+import subprocess
+import sys
+import time
+from threading import Thread
+from typing import Callable, Dict, List
+
+from DJITelloPy.djitellopy.swarm import TelloSwarm
+from DJITelloPy.djitellopy.tello import Tello, TelloShard
+
+STATE_LINES: Dict[str, str] = {
+    'tello': 'pitch:-2;roll:1;yaw:-87;vgx:0;vgy:0;vgz:0;templ:63;temph:66;tof:10;h:0;bat:87;baro:-62.05;time:0;'
+             'agx:-32.00;agy:-12.00;agz:-999.00;\r\n',
+    'tello_edu': 'mid:3;x:-45;y:12;z:98;mpry:0,-1,-87;pitch:-2;roll:1;yaw:-87;vgx:5;vgy:-1;vgz:0;templ:63;temph:66;'
+                 'tof:102;h:90;bat:87;baro:-61.33;time:42;agx:-32.00;agy:-12.00;agz:-999.00;\r\n',
+}
+SWARM_SIZES: tuple = (1, 2, 4, 8, 16, 32)
+LOCAL_NETWORK: str = '127.0.0.'
+RESPONDER_IP: str = LOCAL_NETWORK + '2'
+SWARM_FIRST_HOST: int = 10  # dummy swarm drones are 127.0.0.10, 127.0.0.11...
+
+
+class Responder:
+    """
+    Stands for a drone: receives the datagrams sent to (ip, Tello.CONTROL_UDP_PORT) and counts them.
+    The 'rc' commands get no answer, like on the Tello, the other commands are answered 'ok'
+    """
+
+    def __init__(self, ip: str):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.socket.bind((ip, Tello.CONTROL_UDP_PORT))
+        self.socket.settimeout(0.1)
+        self.received: int = 0
+        self.stop_request = False
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_request:
+            try:
+                data, address = self.socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            self.received += 1
+            if not data.startswith(b'rc '):
+                self.socket.sendto(b'ok', address)
+
+    def wait_idle(self, timeout: float = 1.0):
+        """ Waits until no datagram was received for 50 ms """
+        deadline = time.perf_counter() + timeout
+        last = -1
+        while self.received != last and time.perf_counter() < deadline:
+            last = self.received
+            time.sleep(0.05)
+
+    def close(self):
+        self.stop_request = True
+        self.thread.join()
+        self.socket.close()
+
+
+def per_call(function: Callable, calls: int, repeat: int = 5) -> float:
+    """ Duration of one call in microseconds: best of repeat batches of calls, so that timer overhead
+    and scheduling noise do not count """
+    function()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return 1e6 * best / calls
+
+
+def distribution(samples: List[float]) -> dict:
+    """ p50 / p95 / p99 / max of samples given in seconds, in milliseconds """
+    samples = sorted(samples)
+
+    def rank(p: int) -> float:
+        return round(1000 * samples[max(0, -(-len(samples) * p // 100) - 1)], 3)
+    return {'p50_ms': rank(50), 'p95_ms': rank(95), 'p99_ms': rank(99), 'max_ms': round(1000 * samples[-1], 3)}
+
+
+def bench_parse_state(calls: int) -> dict:
+    parse_state = Tello.parse_state.__wrapped__  # without the @enforce_types checks, see bench_enforce_types
+    return {name: {'fields': len(parse_state(line)), 'us': round(per_call(lambda: parse_state(line), calls), 3)}
+            for name, line in STATE_LINES.items()}
+
+
+def bench_enforce_types(tello: Tello, calls: int) -> dict:
+    """ Overhead of the checks for a static method, a getter and an rc command """
+    tello.get_own_udp_object()['state'] = Tello.parse_state(STATE_LINES['tello'])
+    tello.TIME_BTW_RC_CONTROL_COMMANDS = float('inf')  # measure the checks, not the sendto
+    line = STATE_LINES['tello']
+    cases = {'parse_state': (lambda: Tello.parse_state(line),
+                             lambda: Tello.parse_state.__wrapped__(line)),
+             'get_battery': (lambda: tello.get_battery(),
+                             lambda: Tello.get_battery.__wrapped__(tello)),
+             'send_rc_control': (lambda: tello.send_rc_control(10, 20, 30, 40),
+                                 lambda: Tello.send_rc_control.__wrapped__(tello, 10, 20, 30, 40))}
+    results = {}
+    for name, (decorated, undecorated) in cases.items():
+        checked, unchecked = per_call(decorated, calls), per_call(undecorated, calls)
+        results[name] = {'us': round(checked, 3), 'unchecked_us': round(unchecked, 3),
+                         'overhead_us': round(checked - unchecked, 3)}
+    del tello.TIME_BTW_RC_CONTROL_COMMANDS
+    return results
+
+
+def bench_rc(tello: Tello, responder: Responder, calls: int) -> dict:
+    """ send_rc_control as fast as possible, then with the throttle disabled: the throttle drops the
+    calls made less than TIME_BTW_RC_CONTROL_COMMANDS after the previous datagram """
+    results = {}
+    for name, interval in (('throttled', Tello.TIME_BTW_RC_CONTROL_COMMANDS), ('unthrottled', -1.0)):
+        tello.TIME_BTW_RC_CONTROL_COMMANDS = interval
+        responder.wait_idle()
+        received = responder.received
+        start = time.perf_counter()
+        for i in range(calls):
+            tello.send_rc_control(i % 100, 0, 0, 0)
+        duration = time.perf_counter() - start
+        responder.wait_idle()
+        results[name] = {'us': round(1e6 * duration / calls, 3),
+                         'calls_per_s': round(calls / duration),
+                         'datagrams': responder.received - received}
+    del tello.TIME_BTW_RC_CONTROL_COMMANDS
+    return results
+
+
+def bench_rtt(tello: Tello, calls: int) -> dict:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = tello.send_command_with_return('command', timeout=1)
+        samples.append(time.perf_counter() - start)
+        if response != 'ok':
+            raise RuntimeError('Unexpected response: ' + response)
+    return dict(distribution(samples), calls=calls)
+
+
+def bench_swarm(shard: TelloShard, sizes: tuple, calls: int) -> dict:
+    results = {}
+    for size in sizes:
+        swarm = TelloSwarm([Tello(LOCAL_NETWORK + str(SWARM_FIRST_HOST + i), shard=shard) for i in range(size)])
+        parallel, run = [], []
+        for _ in range(calls):
+            start = time.perf_counter()
+            swarm.parallel(lambda i, tello: None)
+            parallel.append(time.perf_counter() - start)
+        for _ in range(calls):
+            start = time.perf_counter()
+            swarm.run(lambda i, tello: None)
+            run.append(time.perf_counter() - start)
+        results[str(size)] = {'parallel': distribution(parallel), 'run': distribution(run)}
+        swarm.end()  # also removes the drones from the shard
+        for thread in swarm.threads:
+            thread.join()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def flatten(results: dict, prefix: str = '') -> Dict[str, float]:
+    """ {'rc': {'throttled': {'us': 1.2}}} -> {'rc.throttled.us': 1.2}, timings only """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif key.endswith(('_us', '_ms')) or key == 'us':
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path, 'r') as fd:
+        baseline = json.load(fd)
+    print(f"Compared with {baseline_path} ({baseline['meta']['revision']}), ratio > 1 is slower:")
+    current, previous = flatten(results), flatten(baseline['results'])
+    for key, value in current.items():
+        if previous.get(key):
+            print(f"  {key}: {previous[key]} -> {value} (x{value / previous[key]:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the Tello library hot paths')
+    parser.add_argument('--calls', type=int, default=10000, help='calls per batch of the microbenchmarks')
+    parser.add_argument('--rtt-calls', type=int, default=20,
+                        help='command round trips (each one may take up to the 0.1 s response polling period)')
+    parser.add_argument('--swarm-calls', type=int, default=50, help='dispatches per swarm size')
+    parser.add_argument('--swarm-size', type=int, action='append', default=None,
+                        help='swarm size to benchmark, can be repeated (default: {})'.format(SWARM_SIZES))
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    parser.add_argument('--compare', default=None, help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    # the library logs every command at INFO level: that would measure the terminal
+    Tello.LOGGER.setLevel(logging.WARNING)
+    shard = TelloShard(local_ip='127.0.0.1', control_port=0, state_port=0)
+    responder = Responder(RESPONDER_IP)
+    tello = Tello(RESPONDER_IP, shard=shard)
+
+    results = {}
+    try:
+        results['parse_state'] = bench_parse_state(args.calls)
+        results['enforce_types'] = bench_enforce_types(tello, args.calls)
+        results['rc'] = bench_rc(tello, responder, args.calls)
+        results['rtt'] = bench_rtt(tello, args.rtt_calls)
+        results['swarm'] = bench_swarm(shard, tuple(args.swarm_size or SWARM_SIZES), args.swarm_calls)
+    finally:
+        responder.close()
+        shard.close()
+
+    report = {'meta': {'revision': git_revision(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': sys.version.split()[0],
+                       'platform': platform.platform(),
+                       'calls': args.calls},
+              'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output is not None:
+        with open(args.output, 'w') as fd:
+            json.dump(report, fd, indent=2)
+        print('Results written to', args.output)
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
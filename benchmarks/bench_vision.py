@@ -0,0 +1,237 @@
+"""
+Benchmark of the vision pipeline over a fixed corpus of frames, without drone nor window.
+
+Runs MarkersDetector.run, SelectTargetMarker.run and Display.run (+ Display.present, SDL dummy video driver)
+on every frame, for several detector settings, and reports:
+    fps             frames processed per second by the three steps in sequence, on one thread
+    latency         p50 / p95 / p99 of every step and of the whole frame, in milliseconds
+    recall          share of the markers fully in the frame that were detected with the right id and corners
+    false_pos       detections matching no marker of the ground truth
+    corner_err_px   mean distance between the detected and the true corners of the detected markers
+
+The corpus is made of synthetic scenes rendered from the markers of the images folder (benchmarks.synthetic_video,
+at every --resolution) and of recorded frame sets (--recording, repeatable):
+    - a video file (e.g. the .h264 written by synthetic_video --output), ground truth read from <name>.gt.jsonl
+    - a folder of images (png / jpg, in name order), ground truth read from ground_truth.jsonl in the folder
+Without ground truth file, recall and corner errors are not reported.
+
+Examples (from the repository root):
+    python -m benchmarks.bench_vision --frames 150
+    python -m benchmarks.bench_vision --resolution 720p --setting default --setting half_scale --no-display
+    python -m benchmarks.bench_vision --recording flight_01/ --output vision.json
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy
+
+from benchmarks.synthetic_video import RESOLUTIONS, SceneRenderer, ground_truth_path, read_ground_truth
+from parameters import merge_dicts
+from pipeline import Profiler
+from subsys_display_view import Display
+from subsys_markers_detected import MarkersDetector
+from subsys_select_target_marker import SelectTargetMarker
+
+IMAGE_EXTENSIONS: tuple = ('.png', '.jpg', '.jpeg', '.bmp')
+RECORDING_GROUND_TRUTH: str = 'ground_truth.jsonl'  # ground truth file of a folder of images
+MATCH_TOLERANCE: float = 0.1  # a detection matches a marker if its corners are within this share of the marker side
+MIN_MATCH_TOLERANCE: float = 3.0  # in pixels
+STEPS: tuple = ('detect', 'select', 'render', 'present', 'total')
+
+
+class DetectorSetting(NamedTuple):
+    """ Arguments of MarkersDetector.configure() """
+    scale: float = 1.0
+    parameters: dict = {}
+
+
+SETTINGS: Dict[str, DetectorSetting] = {
+    'default': DetectorSetting(),
+    # fewer adaptive threshold passes (3 to 13 px windows by steps of 10 instead of 3 to 23 by steps of 10)
+    'fast_threshold': DetectorSetting(parameters={'adaptiveThreshWinSizeMax': 13}),
+    'subpixel': DetectorSetting(parameters={'cornerRefinementMethod': 1}),  # cv2.aruco.CORNER_REFINE_SUBPIX
+    'half_scale': DetectorSetting(scale=0.5),
+}
+
+Corpus = Tuple[str, str, Iterator[Tuple[numpy.ndarray, List[dict]]]]  # name, resolution, (frame, ground truth)
+
+
+def synthetic_corpus(resolution: str, frames: int, seed: int) -> Corpus:
+    renderer = SceneRenderer(RESOLUTIONS[resolution], seed=seed)
+    items = ((frame, [placement.__get_dict__() for placement in placements])
+             for _, frame, placements in renderer.frames(frames))
+    return f"synthetic_{resolution}", resolution, items
+
+
+def recording_corpus(path: str, frames: int) -> Corpus:
+    """ Frames of a video file or of a folder of images, in RGB like the frames decoded from the Tello """
+    if os.path.isdir(path):
+        files = sorted(f for f in glob.glob(os.path.join(path, '*')) if f.lower().endswith(IMAGE_EXTENSIONS))
+        ground_truth_file = os.path.join(path, RECORDING_GROUND_TRUTH)
+        frame_iterator = read_images(files)
+    else:
+        ground_truth_file = ground_truth_path(path)
+        frame_iterator = read_video(path)
+    ground_truth = read_ground_truth(ground_truth_file) if os.path.exists(ground_truth_file) else []
+    first_frame = next(frame_iterator, None)
+    if first_frame is None:
+        raise FileNotFoundError('No frame found in ' + path)
+    resolution = f"{first_frame.shape[1]}x{first_frame.shape[0]}"
+
+    def items() -> Iterator[Tuple[numpy.ndarray, List[dict]]]:
+        for index, frame in enumerate(_chain(first_frame, frame_iterator)):
+            if index >= frames:
+                return
+            yield frame, ground_truth[index] if index < len(ground_truth) else None
+    return os.path.basename(os.path.normpath(path)), resolution, items()
+
+
+def _chain(first: numpy.ndarray, rest: Iterator[numpy.ndarray]) -> Iterator[numpy.ndarray]:
+    yield first
+    yield from rest
+
+
+def read_images(files: List[str]) -> Iterator[numpy.ndarray]:
+    import cv2
+    for file in files:
+        yield cv2.cvtColor(cv2.imread(file, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def read_video(path: str) -> Iterator[numpy.ndarray]:
+    import av
+    with av.open(path) as container:
+        for frame in container.decode(video=0):
+            yield frame.to_ndarray(format='rgb24')
+
+
+def match_markers(ground_truth: List[dict], corners: tuple, ids: numpy.ndarray) -> dict:
+    """ Matches the detections to the ground truth markers by id and corner distance """
+    detections = [] if ids is None else [(int(marker_id), marker_corners.reshape(4, 2))
+                                         for marker_id, marker_corners in zip(ids.flatten(), corners)]
+    expected = found = 0
+    errors = []
+    for marker in ground_truth:
+        true_corners = numpy.array(marker['corners'])
+        side = numpy.linalg.norm(true_corners - numpy.roll(true_corners, 1, axis=0), axis=1).mean()
+        tolerance = max(MIN_MATCH_TOLERANCE, MATCH_TOLERANCE * side)
+        best, best_error = None, tolerance
+        for detection in detections:
+            if detection[0] == marker['id']:
+                error = numpy.linalg.norm(detection[1] - true_corners, axis=1).mean()
+                if error <= best_error:
+                    best, best_error = detection, error
+        if best is not None:
+            detections.remove(best)  # a marker partially out of the frame can be matched, it is not counted
+        if marker['in_frame']:
+            expected += 1
+            if best is not None:
+                found += 1
+                errors.append(best_error)
+    return {'expected': expected, 'found': found, 'false_positives': len(detections), 'errors': errors}
+
+
+def run(corpus: Corpus, settings: List[str], display: bool) -> List[dict]:
+    """ Processes every frame of the corpus with every setting, returns one result per setting """
+    name, resolution, items = corpus
+    profilers = {setting: Profiler(window_size=1_000_000) for setting in settings}
+    totals = {setting: 0.0 for setting in settings}
+    counts = {setting: {'frames': 0, 'expected': 0, 'found': 0, 'false_positives': 0, 'errors': []}
+              for setting in settings}
+    has_ground_truth = False
+    for frame, ground_truth in items:
+        for setting in settings:
+            MarkersDetector.configure(scale=SETTINGS[setting].scale, parameters=SETTINGS[setting].parameters)
+            profiler = profilers[setting]
+            start_time = time.perf_counter()
+            markers = profiler.call('detect', MarkersDetector.run, frame)
+            marker_status = profiler.call('select', SelectTargetMarker.run, markers.frame, markers, offset=(-4, 0))
+            if display:
+                profiler.call('render', Display.run, markers.frame, merge_dicts([marker_status.__get_dict__()]))
+                profiler.call('present', Display.present)
+            duration = time.perf_counter() - start_time
+            profiler.record('total', duration)
+            totals[setting] += duration
+            if display:
+                import pygame
+                pygame.event.clear()  # Display.run() posts an event for every frame
+            count = counts[setting]
+            count['frames'] += 1
+            if ground_truth is not None:
+                has_ground_truth = True
+                for key, value in match_markers(ground_truth, markers.corners, markers.ids).items():
+                    count[key] += value
+
+    results = []
+    for setting in settings:
+        count = counts[setting]
+        result = {'corpus': name, 'resolution': resolution, 'setting': setting,
+                  'frames': count['frames'],
+                  'fps': round(count['frames'] / totals[setting], 1) if totals[setting] else 0.0}
+        result.update(profilers[setting].__get_dict__())
+        if has_ground_truth:
+            result['recall'] = round(count['found'] / count['expected'], 4) if count['expected'] else None
+            result['false_positives'] = count['false_positives']
+            result['corner_err_px'] = round(float(numpy.mean(count['errors'])), 3) if count['errors'] else None
+        results.append(result)
+    return results
+
+
+def summary(result: dict) -> str:
+    latency = '  '.join(f"{step} {result[step]['p50']:.2f}/{result[step]['p95']:.2f}"
+                        for step in STEPS if step in result)
+    line = f"{result['corpus']:<16}{result['setting']:<16}{result['fps']:>7.1f} fps  p50/p95 ms: {latency}"
+    if 'recall' in result:
+        line += f"  recall {result['recall']}  false_pos {result['false_positives']}" \
+                f"  corner_err {result['corner_err_px']} px"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the marker detection, selection and display')
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), action='append',
+                        help='resolution of the synthetic scenes, can be repeated (default: all)')
+    parser.add_argument('--frames', type=int, default=300, help='frames per corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-synthetic', action='store_true', help='only benchmark the recordings')
+    parser.add_argument('--recording', action='append', default=[],
+                        help='video file or folder of images, can be repeated')
+    parser.add_argument('--setting', choices=sorted(SETTINGS), action='append',
+                        help='detector setting, can be repeated (default: all)')
+    parser.add_argument('--no-display', action='store_true',
+                        help='only detect and select, nothing drawn on the frames (like the headless mode)')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    display = not args.no_display
+    if display:
+        Display.setup()
+    else:
+        MarkersDetector.PARAM_DRAW_MARKERS = False
+        SelectTargetMarker.PARAM_DRAW_TARGET = False
+
+    corpora = [] if args.no_synthetic else [synthetic_corpus(resolution, args.frames, args.seed)
+                                            for resolution in args.resolution or sorted(RESOLUTIONS)]
+    corpora += [recording_corpus(path, args.frames) for path in args.recording]
+    settings = args.setting or list(SETTINGS)
+
+    results = []
+    for corpus in corpora:
+        for result in run(corpus, settings, display):
+            print(summary(result))
+            results.append(result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as fd:
+            json.dump({'frames': args.frames, 'seed': args.seed, 'display': display, 'results': results}, fd,
+                      indent=2)
+        print('Results written to', args.output)
+
+
+if __name__ == '__main__':
+    main()
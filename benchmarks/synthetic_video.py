@@ -0,0 +1,261 @@
+"""
+Synthetic Tello-like video source with ground-truth ArUco placement.
+
+Renders scenes from the marker images in images/ARUCO_ID_*.png along a scripted camera trajectory
+(perspective warp, roll, approach, blur, noise and lighting changes), encodes them to H.264 and either
+writes a raw .h264 file or serves the stream over UDP like the Tello does on port 11111.
+The ground-truth corners of every marker are written next to the video, one JSON line per frame,
+in the same corner order as cv2.aruco.detectMarkers (top-left, top-right, bottom-right, bottom-left).
+
+The same seed always produces the same frames and ground truth, so runs can be compared.
+
+Examples (from the repository root):
+    python -m benchmarks.synthetic_video --resolution 480p --frames 300 --output synthetic_480p.h264
+    python -m benchmarks.synthetic_video --resolution 720p --udp 127.0.0.1:11111 --loop
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import time
+from typing import Iterator, List, Tuple
+
+import cv2
+import numpy
+
+IMAGES_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'images')
+MARKER_FILE_PATTERN = re.compile(r'ARUCO_ID_(\d+)\.png$')
+
+RESOLUTIONS: dict = {'480p': (640, 480),
+                     '720p': (1280, 720)}
+MARKER_TEXTURE_SIZE: int = 256  # markers are downscaled once, warping the 1564px originals every frame is wasteful
+
+
+class SyntheticMarker:
+    """
+    A marker texture and the position of its black square (the part ArUco detects) inside the texture
+    """
+
+    def __init__(self, marker_id: int, texture: numpy.ndarray, square: numpy.ndarray):
+        self.id = marker_id
+        self.texture = texture
+        self.square = square  # 4x2 float32, tl / tr / br / bl
+
+
+class MarkerPlacement:
+    """
+    Ground truth of one marker in one frame
+    """
+
+    def __init__(self, marker_id: int, corners: numpy.ndarray, in_frame: bool):
+        self.id = marker_id
+        self.corners = corners
+        self.in_frame = in_frame
+
+    def __get_dict__(self) -> dict:
+        return {'id': self.id,
+                'corners': [[round(float(x), 2), round(float(y), 2)] for x, y in self.corners],
+                'in_frame': self.in_frame}
+
+
+def load_markers(images_dir: str = IMAGES_DIR) -> List[SyntheticMarker]:
+    markers = []
+    for path in sorted(glob.glob(os.path.join(images_dir, 'ARUCO_ID_*.png'))):
+        match = MARKER_FILE_PATTERN.search(os.path.basename(path))
+        if match is None:  # e.g. ARUCO_ID_1_20.png is a sheet with several markers
+            continue
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        scale = MARKER_TEXTURE_SIZE / gray.shape[0]
+        texture = cv2.resize(gray, (MARKER_TEXTURE_SIZE, MARKER_TEXTURE_SIZE), interpolation=cv2.INTER_AREA)
+        rows, cols = numpy.nonzero(gray < 128)
+        left, right = cols.min() * scale, (cols.max() + 1) * scale
+        top, bottom = rows.min() * scale, (rows.max() + 1) * scale
+        square = numpy.float32([[left, top], [right, top], [right, bottom], [left, bottom]])
+        markers.append(SyntheticMarker(int(match.group(1)), texture, square))
+    if not markers:
+        raise FileNotFoundError('No ARUCO_ID_<id>.png marker image found in ' + images_dir)
+    return markers
+
+
+class SceneRenderer:
+    """
+    Renders the frames of a scripted flight through a course of markers.
+    The camera sways along a Lissajous path, rolls, and approaches each marker in turn, which changes
+    the apparent size and the perspective of the markers.
+    Lighting, blur and sensor noise vary over time with fixed, seeded, parameters.
+    """
+    MARKERS_PER_FRAME: int = 2
+    FRAMES_PER_MARKER: int = 90  # number of frames needed to fly through a marker
+
+    def __init__(self, resolution: tuple, seed: int = 0, markers: List[SyntheticMarker] = None,
+                 blur: bool = True, noise: bool = True, lighting: bool = True):
+        self.width, self.height = resolution
+        self.rng = numpy.random.default_rng(seed)
+        self.markers = markers if markers is not None else load_markers()
+        self.course = self.rng.permutation(len(self.markers))
+        self.blur = blur
+        self.noise = noise
+        self.lighting = lighting
+        self.background = self._make_background()
+        # per frame noise is drawn from its own seeded generator to keep frames reproducible on their own
+        self.seed = seed
+
+    def _make_background(self) -> numpy.ndarray:
+        small = self.rng.integers(60, 200, size=(self.height // 16 + 1, self.width // 16 + 1, 3), dtype=numpy.uint8)
+        background = cv2.resize(small, (self.width, self.height), interpolation=cv2.INTER_CUBIC)
+        return cv2.GaussianBlur(background, (0, 0), 3)
+
+    def _marker_quad(self, marker: SyntheticMarker, progress: float, lateral: float, t: float) -> numpy.ndarray:
+        """ Destination of the 4 texture corners for a marker seen at 'progress' (0: far away, 1: passing through) """
+        size = self.height * (0.12 + 0.55 * progress ** 2)
+        cx = self.width * (0.5 + lateral * (0.35 - 0.2 * progress) + 0.08 * math.sin(1.3 * t))
+        cy = self.height * (0.45 + 0.06 * math.sin(0.9 * t + 1.0))
+        roll = 0.25 * math.sin(0.7 * t)
+        yaw = 0.6 * math.sin(0.5 * t + lateral)  # horizontal foreshortening of the marker plane
+        half = size / 2
+        # square in the marker plane, the far edge is shrunk to emulate perspective
+        near, far = 1 + 0.25 * yaw, 1 - 0.25 * yaw
+        quad = numpy.float32([[-half * abs(math.cos(yaw)), -half * near],
+                              [half * abs(math.cos(yaw)), -half * far],
+                              [half * abs(math.cos(yaw)), half * far],
+                              [-half * abs(math.cos(yaw)), half * near]])
+        rotation = numpy.float32([[math.cos(roll), -math.sin(roll)], [math.sin(roll), math.cos(roll)]])
+        quad = quad @ rotation.T + numpy.float32([cx, cy])
+        texture_size = marker.texture.shape[0]
+        texture_corners = numpy.float32([[0, 0], [texture_size, 0], [texture_size, texture_size], [0, texture_size]])
+        return cv2.getPerspectiveTransform(texture_corners, quad)
+
+    def render(self, index: int, fps: float = 30.0) -> Tuple[numpy.ndarray, List[MarkerPlacement]]:
+        """ Returns the RGB frame number 'index' and the ground truth of the markers it shows """
+        t = index / fps
+        frame = self.background.copy()
+        placements = []
+        leg, step = divmod(index, self.FRAMES_PER_MARKER)
+        for k in reversed(range(self.MARKERS_PER_FRAME)):  # farthest marker drawn first
+            marker = self.markers[self.course[(leg + k) % len(self.course)]]
+            progress = (step / self.FRAMES_PER_MARKER + k) / self.MARKERS_PER_FRAME
+            lateral = -1.0 if (leg + k) % 2 else 1.0
+            homography = self._marker_quad(marker, progress, lateral, t)
+            warped = cv2.warpPerspective(marker.texture, homography, (self.width, self.height),
+                                         flags=cv2.INTER_LINEAR, borderValue=0)
+            mask = cv2.warpPerspective(numpy.full_like(marker.texture, 255), homography, (self.width, self.height),
+                                       flags=cv2.INTER_NEAREST, borderValue=0)
+            frame[mask > 0] = warped[mask > 0, None]
+            corners = cv2.perspectiveTransform(marker.square[None], homography)[0]
+            in_frame = bool(numpy.all((corners >= 0) & (corners < (self.width, self.height))))
+            placements.append(MarkerPlacement(marker.id, corners, in_frame))
+        placements.reverse()
+        return self._degrade(frame, index, t), placements
+
+    def _degrade(self, frame: numpy.ndarray, index: int, t: float) -> numpy.ndarray:
+        rng = numpy.random.default_rng((self.seed, index))
+        if self.blur:
+            sigma = 0.3 + 1.2 * (0.5 + 0.5 * math.sin(2.1 * t))
+            frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+        if self.lighting:
+            gain = 0.6 + 0.5 * (0.5 + 0.5 * math.sin(0.4 * t))
+            frame = cv2.convertScaleAbs(frame, alpha=gain, beta=10 * math.sin(0.25 * t))
+        if self.noise:
+            noise = rng.normal(0, 6, frame.shape)
+            frame = numpy.clip(frame + noise, 0, 255).astype(numpy.uint8)
+        return frame
+
+    def frames(self, count: int, fps: float = 30.0) -> Iterator[Tuple[int, numpy.ndarray, List[MarkerPlacement]]]:
+        for index in range(count):
+            frame, placements = self.render(index, fps)
+            yield index, frame, placements
+
+
+def ground_truth_path(video_path: str) -> str:
+    return os.path.splitext(video_path)[0] + '.gt.jsonl'
+
+
+def read_ground_truth(path: str) -> List[List[dict]]:
+    """ Returns, for every frame index, the list of marker placements written by encode() """
+    with open(path, 'r') as fd:
+        return [json.loads(line)['markers'] for line in fd if line.strip()]
+
+
+def encode(renderer: SceneRenderer, count: int, target: str, ground_truth: str, fps: int = 30,
+           bitrate: int = 2_000_000, realtime: bool = False, loop: bool = False):
+    """
+    Encodes 'count' frames to raw H.264 (Annex B, like the Tello stream) into 'target', which is either a
+    file path or an url such as udp://127.0.0.1:11111.
+    With 'realtime', frames are paced at 'fps', which is required when serving a live decoder.
+    """
+    import av  # only needed when encoding, rendering for the benchmarks works without PyAV
+
+    container = av.open(target, mode='w', format='h264')
+    stream = container.add_stream('libx264', rate=fps)
+    stream.width, stream.height = renderer.width, renderer.height
+    stream.pix_fmt = 'yuv420p'
+    stream.bit_rate = bitrate
+    stream.options = {'preset': 'ultrafast', 'tune': 'zerolatency', 'g': str(fps)}
+
+    with open(ground_truth, 'w') as gt_fd:
+        start_time = time.perf_counter()
+        sent = 0
+        while True:
+            for index, frame, placements in renderer.frames(count, fps):
+                if realtime:
+                    delay = start_time + sent / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                video_frame = av.VideoFrame.from_ndarray(frame, format='rgb24')
+                video_frame.pts = sent
+                for packet in stream.encode(video_frame):
+                    container.mux(packet)
+                if sent < count:  # the ground truth of a looped sequence is the one of the first pass
+                    gt_fd.write(json.dumps({'frame': index,
+                                            'markers': [p.__get_dict__() for p in placements]}) + '\n')
+                sent += 1
+            if not loop:
+                break
+            gt_fd.flush()
+
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic H.264 ArUco video with ground truth')
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), default='480p')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bitrate', type=int, default=2_000_000)
+    parser.add_argument('--output', default=None, help='raw .h264 file to write')
+    parser.add_argument('--udp', default=None, help='host:port to stream to, e.g. 127.0.0.1:11111')
+    parser.add_argument('--ground-truth', default=None, help='defaults to <output>.gt.jsonl')
+    parser.add_argument('--loop', action='store_true', help='replay the sequence until interrupted (udp only)')
+    parser.add_argument('--no-blur', action='store_true')
+    parser.add_argument('--no-noise', action='store_true')
+    parser.add_argument('--no-lighting', action='store_true')
+    args = parser.parse_args()
+
+    if (args.output is None) == (args.udp is None):
+        parser.error('exactly one of --output and --udp is required')
+
+    renderer = SceneRenderer(RESOLUTIONS[args.resolution], seed=args.seed, blur=not args.no_blur,
+                             noise=not args.no_noise, lighting=not args.no_lighting)
+    if args.output is not None:
+        target = args.output
+        ground_truth = args.ground_truth or ground_truth_path(args.output)
+    else:
+        target = 'udp://' + args.udp
+        ground_truth = args.ground_truth or 'synthetic_{}_seed{}.gt.jsonl'.format(args.resolution, args.seed)
+
+    print('SyntheticVideo | Writing', args.frames, 'frames at', args.resolution, 'to', target)
+    print('SyntheticVideo | Ground truth in', ground_truth)
+    try:
+        encode(renderer, args.frames, target, ground_truth, fps=args.fps, bitrate=args.bitrate,
+               realtime=args.udp is not None, loop=args.loop and args.udp is not None)
+    except KeyboardInterrupt:
+        print('SyntheticVideo | Interrupted')
+
+
+if __name__ == "__main__":
+    main()
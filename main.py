@@ -1,135 +1,309 @@
+import argparse
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple
+
+import numpy
 
 import parameters
-from DJITelloPy.djitellopy.tello import Tello, BackgroundFrameRead
+from DJITelloPy.djitellopy.tello import Tello
 from subsys_display_view import Display
-from subsys_read_user_input import ReadUserInput, ModeStatus, RCStatus
+from subsys_read_user_input import ModeStatus, ReadUserInput, RCStatus, rc_command
+from subsys_command_input import CommandInput
 from subsys_markers_detected import MarkersDetector, DetectedMarkersStatus
-from subsys_select_target_marker import SelectTargetMarker
+from subsys_metrics import MetricsExport
+from subsys_select_target_marker import SelectTargetMarker, MarkerStatus
 from subsys_tello_sensors import TelloSensors, FrameReader
 from subsys_tello_actuators import TelloActuators
 from subsys_visual_control import VisualControl
-from threading import Thread
+from pipeline import LatestValue, Pipeline, Profiler, Stage, WorkerPool
+
+
+# One RacingPipeline per drone, all sharing the detector_pool
+pipelines: List['RacingPipeline'] = []
+detector_pool: WorkerPool = None
+launch_time: float = time.perf_counter()
 
 
-def setup():
-    Display.setup()
-    ReadUserInput.setup()
-    SelectTargetMarker.setup()
-    tello, frame_reader = init_env()
-    tello.LOGGER.setLevel(logging.INFO)
+def setup(script_path: str = None, command_port: int = None, drone_ips: List[str] = None,
+          detector_workers: int = None, metrics_port: int = None, metrics_host: str = '127.0.0.1'):
+    global detector_pool, launch_time
+    launch_time = time.perf_counter()
+    Tello.LOGGER.setLevel(logging.INFO)
     fh = logging.FileHandler(filename='Tello.log')
     fileLogFormat = '%(asctime)s - %(levelname)s - %(message)s'
     fileFormatter = logging.Formatter(fileLogFormat)
     Tello.LOGGER.addHandler(fh)
-    FrameReader.setup(frame_reader)
-    TelloActuators.setup(tello)
-    VisualControl.setup(tello)
-    TelloSensors.setup(tello)
-    frame_reception_check = ImageProcess.setup(timeout=2)
+
+    if drone_ips is None:
+        drone_ips = ["127.0.0.1"] if parameters.ENV.status == parameters.ENV.SIMULATION else ["192.168.10.1"]
+    detector_pool = WorkerPool(detector_workers)
+    detector_pool.start()
+    if metrics_port is not None:
+        MetricsExport.setup(metrics_port, metrics_host, pipelines, detector_pool)
+    drones = [init_env(ip) for ip in drone_ips]
+    # The drones are started in background threads while the main thread sets up the user interface
+    # (pygame must stay in the main thread): the network round trips and the video probes of all the drones
+    # and the pygame initialisation overlap instead of adding up
+    with ThreadPoolExecutor(max_workers=len(drones) + 1, thread_name_prefix='startup') as executor:
+        futures = [executor.submit(start_drone, ip, tello, frame_source, index)
+                   for index, (ip, (tello, frame_source)) in enumerate(zip(drone_ips, drones))]
+        # OpenCV is only imported on first use: load it and build the marker detector meanwhile,
+        # so that the first frame does not wait for them
+        executor.submit(MarkersDetector.configure)
+        phase_time = time.perf_counter()
+        if parameters.UI.status == parameters.UI.HEADLESS:
+            CommandInput.setup(script_path, command_port)
+            # nothing is displayed, do not draw on the frames
+            MarkersDetector.PARAM_DRAW_MARKERS = False
+            SelectTargetMarker.PARAM_DRAW_TARGET = False
+        else:
+            Display.setup()
+            ReadUserInput.setup()
+        log_startup('main', 'user interface', phase_time)
+        drones_started = True
+        for ip, (tello, _), future in zip(drone_ips, drones, futures):
+            try:
+                pipelines.append(future.result())
+            except Exception as exc:
+                # e.g. connection timeout or no video: the drones that did start are stopped by stop()
+                print(ip, '| Startup failed:', repr(exc))
+                tello.end()
+                drones_started = False
+    if not drones_started:
+        return False
+    frame_reception_check = all([pipeline.setup(timeout=2) for pipeline in pipelines])
+    log_startup('main', 'total', launch_time)
     return frame_reception_check
 
 
-def init_env() -> (Tello, BackgroundFrameRead):
+def log_startup(name: str, phase: str, start_time: float) -> float:
+    # Prints the duration of a startup phase, returns the current time (the start of the next phase)
+    now = time.perf_counter()
+    print(f"{name} | Startup {phase}: {now - start_time:.2f} s")
+    return now
+
+
+def init_env(host: str) -> (Tello, FrameReader):
     # Init Tello python object that interacts with the Tello UAV
-    tello = None
     if parameters.ENV.status == parameters.ENV.SIMULATION:
         Tello.CONTROL_UDP_PORT_CLIENT = 9000
-        tello = Tello("127.0.0.1", image_received_method=FrameReader.update_frame)
     elif parameters.ENV.status == parameters.ENV.REAL:
         Tello.CONTROL_UDP_PORT_CLIENT = Tello.CONTROL_UDP_PORT
-        tello = Tello("192.168.10.1", image_received_method=FrameReader.update_frame)
+    frame_source = FrameReader()
+    tello = Tello(host, image_received_method=frame_source.update_frame)
+    return tello, frame_source
+
+
+def start_drone(name: str, tello: Tello, frame_source: FrameReader, index: int) -> 'RacingPipeline':
+    # Connects a drone, starts its video stream and creates its pipeline. Runs in a startup thread
+    # index: position of the drone in the race, each drone streams its video to its own port
+    phase_time = time.perf_counter()
     tello.connect()
+    # set once: it is a blocking command, it used to be sent before every rc change
+    tello.set_speed(TelloActuators.SPEED)
+    phase_time = log_startup(name, 'connect', phase_time)
+    if index > 0:
+        tello.set_network_ports(Tello.STATE_UDP_PORT, Tello.VS_UDP_PORT + index)
     tello.streamoff()
     tello.streamon()
+    phase_time = log_startup(name, 'stream on', phase_time)
     try:
-        frame_reader = tello.get_frame_read()
+        frame_source.setup(tello.get_frame_read())
         parameters.RUN.status = parameters.RUN.START
     except Exception as exc:
         parameters.RUN.status = parameters.RUN.STOP
         raise exc
-    return tello, frame_reader
+    phase_time = log_startup(name, 'video open', phase_time)
+    # the user inputs (rc_command) control the first drone, the one that is displayed
+    pipeline = RacingPipeline(name, tello, frame_source, detector_pool,
+                              rc_command if index == 0 else LatestValue(RCStatus()),
+                              display=index == 0 and parameters.UI.status != parameters.UI.HEADLESS)
+    log_startup(name, 'pipeline', phase_time)
+    return pipeline
+
 
+class TargetMarker(NamedTuple):
+    """ Output of the target selection stage """
+    frame: numpy.ndarray
+    marker: MarkerStatus
+    variables: dict
 
-class ImageProcess:
-    # The image processing features are run in a separate thread in order to allow the pygame window update
-    # and the Tello frames reception at a high rate, even during time-expensive image processing computations.
-    # Then, the processed frame is always the most recent one, and the not-processed outdated frames are dismissed.
-    stop_request = False
-    image_processing_thread: Thread = None
 
-    @classmethod
-    def setup(cls, timeout: int = 2):
-        # Warning : Blocking code in the main thread !!!
+class RacingPipeline:
+    # The image processing features are split into stages, each one running in its own thread, in order to allow
+    # the pygame window update and the Tello frames reception at a high rate, even during time-expensive
+    # image processing computations. Each stage only processes the most recent output of the previous one:
+    # the outdated frames are dismissed, and a slow stage (e.g. the display) does not slow down the control.
+    #   ingest -> detect -> select -> control -> actuate
+    #                              \-> render
+    # One instance per drone, with its own frame source, controller and actuator. The marker detection, the
+    # expensive stage, runs on the worker pool shared by all the drones, which apportions the CPU between them.
+    # Every processing call is timed by the profiler of the pipeline (see get_profiles() and the P key overlay).
+
+    def __init__(self, name: str, tello: Tello, frame_source: FrameReader, pool: WorkerPool,
+                 commands: LatestValue, display: bool = False):
+        self.name = name
+        self.tello = tello
+        self.frame_source = frame_source
+        self.sensors = TelloSensors(tello)
+        self.controller = VisualControl(tello)
+        self.actuator = TelloActuators(tello)
+        self.pool = pool
+        self.rc_command = commands  # current RCStatus of this drone
+        self.display = display
+        self.pipeline: Pipeline = None
+        self.profiler = Profiler()
+        self.first_frame_processed = False
+        pool.register(name)
+
+    def setup(self, timeout: int = 2) -> bool:
         # Since the program cannot perform any image process before having received a frame from the Tello,
-        # this part of the program waits for the first frame to be available before finishing the setup.
-        start_time = time.time()
-        print('ImageProcess | Attempting to get frame...')
-        while True:
-            if not FrameReader.frames_queue.empty():
-                frame_received = True
-                print('ImageProcess | Frame received')
-                break
-            if time.time() - start_time > timeout:
-                print('ImageProcess | Timeout reached, no frame received')
-                frame_received = False
-                stop()
-                break
+        # this part of the program waits (sleeping, until the first_frame event) for the first frame to be available
+        # before finishing the setup.
+        start_time = time.perf_counter()
+        print(self.name, '| Attempting to get frame...')
+        frame_received = self.frame_source.first_frame.wait(timeout)
+        if frame_received:
+            log_startup(self.name, 'first frame', start_time)
+        else:
+            print(self.name, '| Timeout reached, no frame received')
         if frame_received:
-            cls.image_processing_thread = Thread(target=cls.run)
-            cls.image_processing_thread.start()
+            self.pipeline = Pipeline()
+            ingest = self.pipeline.add_stage('ingest', self.ingest)
+            detect = self.pipeline.add_stage('detect', self.detect, source=ingest)
+            select = self.pipeline.add_stage('select', self.select, source=detect)
+            control = self.pipeline.add_stage('control', self.control, source=select)
+            self.pipeline.add_stage('actuate', self.actuate, source=control)
+            if self.display:
+                self.pipeline.add_stage('render', self.render, source=select)
+            self.pipeline.start()
+            print(self.name, '| Image processing pipeline started')
         return frame_received
 
-    @classmethod
-    def run(cls):
-        print('Image processing thread started')
-        while True:
-            if cls.stop_request:
-                break
-            # Retrieve UAV internal variables
-            TelloSensors.run()
-            # Retrieve most recent frame from the Tello
-            frame = FrameReader.get_most_recent_frame()
-
-            # Search for all ARUCO markers in the frame
-            frame_with_markers = MarkersDetector.run(frame)
-            # Select the ARUCO marker to reach first
-            marker_status = SelectTargetMarker.run(frame_with_markers,
-                                                   DetectedMarkersStatus,
-                                                   offset=(-4, 0))
-            # Get the velocity commands from the automatic control module
-            if ModeStatus.value == parameters.MODE.AUTO_FLIGHT:
-                VisualControl.run(marker_status)
-            # Send the commands to the UAV
-            TelloActuators.run(RCStatus)
-            # Update pygame display window
-            variables_to_print = parameters.merge_dicts([TelloSensors.__get_dict__(),
-                                                         ModeStatus.__get_dict__(),
-                                                         RCStatus.__get_dict__(),
-                                                         marker_status.__get_dict__()])
-            Display.run(frame_with_markers, variables_to_print)
-        print('Image processing thread stopped')
-
-    @classmethod
-    def stop(cls):
-        cls.stop_request = True
-        cls.image_processing_thread.join()
+    def ingest(self) -> numpy.ndarray:
+        # Retrieve most recent frame from the Tello
+        start_time = time.perf_counter()
+        frame = self.frame_source.get_most_recent_frame(timeout=Stage.WAIT_TIMEOUT)
+        if frame is not None:
+            # includes the wait for the frame: about the video frame interval, unless the pipeline lags behind
+            self.profiler.record('frame', time.perf_counter() - start_time)
+        return frame
+
+    def detect(self, frame: numpy.ndarray) -> DetectedMarkersStatus:
+        # Search for all ARUCO markers in the frame
+        # timed on the worker by the profiler, and with the wait for a worker in the exported detection latency
+        start_time = time.perf_counter()
+        markers = self.pool.run(self.name, self.profiler.call, 'detector', MarkersDetector.run, frame)
+        MetricsExport.observe_detection(self.name, time.perf_counter() - start_time)
+        return markers
+
+    def select(self, markers: DetectedMarkersStatus) -> TargetMarker:
+        # Select the ARUCO marker to reach first
+        marker_status = self.profiler.call('select', SelectTargetMarker.run, markers.frame, markers, offset=(-4, 0))
+        # the display variables are only needed by the render stage
+        variables = marker_status.__get_dict__() if self.display else None
+        return TargetMarker(markers.frame, marker_status, variables)
+
+    def control(self, target: TargetMarker) -> TargetMarker:
+        # Get the velocity commands from the automatic control module
+        if self.sensors.mode == parameters.MODE.AUTO_FLIGHT:
+            seq, rc_status = self.rc_command.seq, self.rc_command.value
+            mode_seq = ModeStatus.seq
+            rc_status = self.profiler.call('control', self.controller.run, target.marker, rc_status)
+
+            def publish(current: RCStatus) -> RCStatus:
+                # the controller can take up to 0.5 s: keep the rc command written meanwhile by the user input or
+                # the flight script, and do not write anymore once a new flight mode was commanded
+                if self.rc_command.seq != seq or ModeStatus.seq != mode_seq \
+                        or self.sensors.mode != parameters.MODE.AUTO_FLIGHT:
+                    return current
+                return rc_status
+            self.rc_command.update(publish)
+        return target
+
+    def actuate(self, target: TargetMarker) -> TargetMarker:
+        # Retrieve UAV internal variables and handle takeoff / landing / emergency
+        self.profiler.call('sensors', self.sensors.run)
+        # Send the commands to the UAV
+        self.profiler.call('actuator', self.actuator.run, self.rc_command.value)
+        if not self.first_frame_processed:
+            self.first_frame_processed = True
+            log_startup(self.name, 'launch to first processed frame', launch_time)
+        return target
+
+    def render(self, target: TargetMarker) -> TargetMarker:
+        # Update pygame display window
+        variables_to_print = parameters.merge_dicts([self.sensors.__get_dict__(),
+                                                     self.rc_command.value.__get_dict__(),
+                                                     target.variables])
+        self.profiler.call('display', Display.run, target.frame, variables_to_print, self.profiler)
+        return target
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            print(self.name, '| Image processing pipeline stopped', self.pipeline.__get_dict__())
+            print(self.name, '| Profile (ms)', self.profiler.__get_dict__())
+
+
+def get_profiles() -> dict:
+    # p50 / p95 / p99 durations (in ms) of every processing call, by drone
+    return {pipeline.name: pipeline.profiler.__get_dict__() for pipeline in pipelines}
 
 
 def stop():
-    # Important : first stop ImageProcess, then stop TelloActuator or pygame will crash
-    ImageProcess.stop()
-    TelloActuators.stop()
+    # Important : first stop the pipelines, then stop the actuators or pygame will crash
+    for pipeline in pipelines:
+        pipeline.stop()
+    if detector_pool is not None:
+        detector_pool.stop()
+        print('Detector pool stopped', detector_pool.__get_dict__())
+    for pipeline in pipelines:
+        pipeline.actuator.stop()
+    MetricsExport.stop()
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Tello drone racing')
+    parser.add_argument('--simulation', action='store_true', help='connect to the simulator instead of the Tello')
+    parser.add_argument('--headless', action='store_true',
+                        help='no pygame window, commands come from --script and/or --command-port')
+    parser.add_argument('--script', default=None, help='headless mode: file with one command per line')
+    parser.add_argument('--command-port', type=int, default=None,
+                        help='headless mode: local UDP port receiving commands')
+    parser.add_argument('--drone', action='append', default=None, dest='drones', metavar='IP',
+                        help='IP address of a drone, repeat it to race several drones (the first one is displayed '
+                             'and manually controlled, the video of the i-th drone is received on port 11111+i)')
+    parser.add_argument('--detector-workers', type=int, default=None,
+                        help='threads shared by the drones for the marker detection (default: number of CPUs)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve the metrics in the Prometheus text format on http://127.0.0.1:<port>/metrics')
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help='address of the metrics endpoint, 0.0.0.0 to let a remote Prometheus scrape it')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    setup_ok = setup()
+    args = parse_arguments()
+    if args.simulation:
+        parameters.ENV.status = parameters.ENV.SIMULATION
+    if args.headless:
+        parameters.UI.status = parameters.UI.HEADLESS
+        if args.script is None and args.command_port is None:
+            raise SystemExit('Headless mode needs a --script and/or a --command-port')
+
+    setup_ok = setup(args.script, args.command_port, args.drones, args.detector_workers,
+                     args.metrics_port, args.metrics_host)
     if setup_ok:
-        # The run_pygame_loop() is a while loop that breaks only when the flight is finished
-        # This loop constantly checks for new user inputs, and updates the
+        # The run_pygame_loop() / run_command_loop() is a while loop that breaks only when the flight is finished
+        # This loop constantly checks for new user inputs, and (with a window) updates the
         # pygame window with the latest available frame
-        flight_finished = ReadUserInput.run_pygame_loop()
+        if parameters.UI.status == parameters.UI.HEADLESS:
+            flight_finished = CommandInput.run_command_loop()
+        else:
+            flight_finished = ReadUserInput.run_pygame_loop()
         stop()
     else:
         stop()
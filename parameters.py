@@ -16,6 +16,8 @@ FPS: int = 120
 IMG_SIZE: tuple = (640, 480)
 DRONE_POS: ScreenPosition = ScreenPosition((IMG_SIZE[0]//2, 480))
 SCREEN_SIZE: tuple = (800, 480)
+JOYSTICK_DEADBAND: float = 0.1  # joystick axis values below this magnitude are read as 0
+INPUT_SAMPLE_RATE: int = 30  # Hz, rate at which the joystick axes are applied to the rc commands
 
 
 class ENV:
@@ -24,6 +26,12 @@ class ENV:
     status: int = REAL
     
 
+class UI:
+    WINDOW: int = 0     # pygame window, user inputs from keyboard / gamepads
+    HEADLESS: int = 1   # no window nor rendering, commands from a script or a local socket
+    status: int = WINDOW
+
+
 class RUN:
     STOP: bool = False
     START: bool = True
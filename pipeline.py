@@ -0,0 +1,385 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from contextlib import contextmanager
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+LOGGER = logging.getLogger('pipeline')
+
+
+class LatestValue:
+    """
+    Single-slot handoff between pipeline stages: the producer always overwrites the previous value,
+    so a slow consumer only ever gets the most recent one and never delays the producer.
+    Several consumers can read the same LatestValue, each one keeping track of the last sequence number it read.
+    It is also used as an atomic reference to an immutable record (e.g. the current RCStatus): readers simply take
+    `value` without lock, writers replace the whole record with put() or update().
+    """
+
+    def __init__(self, value: Any = None):
+        self._condition = Condition()
+        self._value: Any = value
+        self.seq: int = 0
+
+    @property
+    def value(self) -> Any:
+        """ Latest value, without waiting """
+        return self._value
+
+    def put(self, value: Any):
+        with self._condition:
+            self._value = value
+            self.seq += 1
+            self._condition.notify_all()
+
+    def update(self, function: Callable[[Any], Any]):
+        """ Replaces the value by function(value), atomically with respect to the other writers """
+        with self._condition:
+            self._value = function(self._value)
+            self.seq += 1
+            self._condition.notify_all()
+
+    def get(self, last_seq: int, timeout: float) -> (int, Any):
+        """ Waits for a value newer than last_seq. Returns (last_seq, None) on timeout """
+        with self._condition:
+            if self.seq <= last_seq:
+                self._condition.wait(timeout)
+            if self.seq <= last_seq:
+                return last_seq, None
+            return self.seq, self._value
+
+
+class Profiler:
+    """
+    Timings of named sections of code (e.g. one per processing call), kept in rolling windows of the last
+    WINDOW_SIZE calls, to find which step causes a slowdown. Sections are recorded from any thread:
+        with profiler.section('select'):
+            ...
+        result = profiler.call('detector', MarkersDetector.run, frame)
+    __get_dict__() gives the p50 / p95 / p99 durations of every section, in milliseconds.
+    """
+    WINDOW_SIZE: int = 256  # calls per section
+    PERCENTILES: tuple = (50, 95, 99)
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self._lock = Lock()
+        self._windows: Dict[str, Deque[float]] = {}  # durations in seconds, the newest on the right
+        self._counts: Dict[str, int] = {}
+
+    def record(self, name: str, duration: float):
+        """ Adds the duration (in seconds) of one call of the section """
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None:
+                window = self._windows[name] = deque(maxlen=self.window_size)
+            window.append(duration)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    @contextmanager
+    def section(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_time)
+
+    def call(self, name: str, function: Callable, *args, **kwargs) -> Any:
+        """ Returns function(*args, **kwargs), recording its duration in the section """
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start_time)
+
+    def percentiles(self, name: str) -> Dict[str, float]:
+        """ Durations of the section at PERCENTILES (nearest rank) over its window, in milliseconds """
+        with self._lock:
+            durations = list(self._windows.get(name, ()))
+        durations.sort()
+        if not durations:
+            return {}
+        # nearest rank: the smallest duration greater than or equal to p % of the window
+        return {f"p{p}": round(1000 * durations[max(0, -(-len(durations) * p // 100) - 1)], 2)
+                for p in self.PERCENTILES}
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+            self._counts.clear()
+
+    def __get_dict__(self) -> dict:
+        with self._lock:
+            names = list(self._windows)
+        return {name: dict(self.percentiles(name), calls=self._counts.get(name, 0)) for name in names}
+
+
+class Stage:
+    """
+    Runs one step of the pipeline in its own thread.
+    The stage waits for a new value of its source, processes it and publishes the result in its output.
+    A stage without source (the ingest stage) is expected to block in its function until new data is available,
+    and returns None when there is nothing to publish.
+    Values of the source that were overwritten before the stage could process them are counted as dropped.
+    An exception raised by the function is logged and counted, the stage goes on with the next item after
+    ERROR_BACKOFF (e.g. a dead video reader would otherwise make the ingest stage spin).
+    """
+    WAIT_TIMEOUT: float = 0.1  # in seconds, bounds the time needed to notice a stop request
+    STATS_WINDOW: float = 1.0  # in seconds, the rate is measured over windows of this duration
+    LATENCY_SMOOTHING: float = 0.1
+    ERROR_BACKOFF: float = 0.1  # in seconds, pause after an exception
+    ERROR_LOG_PERIOD: float = 5.0  # in seconds, at most one error logged per period
+
+    def __init__(self, name: str, function: Callable, source: Optional[LatestValue] = None):
+        self.name = name
+        self.function = function
+        self.source = source
+        self.output = LatestValue()
+        self.stop_request = False
+        self.thread: Thread = None
+
+        self.last_seq: int = 0
+        self.processed: int = 0
+        self.dropped: int = 0
+        self.errors: int = 0
+        self._errors_logged: int = 0
+        self._error_log_time: float = -float('inf')
+        self.rate: float = 0.0  # processed items per second
+        self.latency: float = 0.0  # in seconds, smoothed processing time of one item
+        self._window_start: float = 0.0
+        self._window_count: int = 0
+
+    def start(self):
+        self.stop_request = False
+        self._window_start = time.perf_counter()
+        self.thread = Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_request = True
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_request:
+            if self.source is None:
+                item = None
+            else:
+                seq, item = self.source.get(self.last_seq, self.WAIT_TIMEOUT)
+                if seq == self.last_seq:
+                    continue
+                self.dropped += seq - self.last_seq - 1
+                self.last_seq = seq
+
+            start_time = time.perf_counter()
+            try:
+                result = self.function() if self.source is None else self.function(item)
+            except Exception as exc:
+                self._log_error(exc)
+                time.sleep(self.ERROR_BACKOFF)
+                continue
+            end_time = time.perf_counter()
+            if result is None:
+                continue
+            self.output.put(result)
+            self._update_stats(end_time - start_time, end_time)
+
+    def _log_error(self, exc: Exception):
+        # the same error is likely raised again on every item: full traceback the first time, then rate limited
+        self.errors += 1
+        now = time.perf_counter()
+        if now - self._error_log_time < self.ERROR_LOG_PERIOD:
+            return
+        self._error_log_time = now
+        LOGGER.error('%s | Error: %r (%d errors, %d since the last report)', self.name, exc, self.errors,
+                     self.errors - self._errors_logged, exc_info=exc if self.errors == 1 else None)
+        self._errors_logged = self.errors
+
+    def _update_stats(self, duration: float, now: float):
+        self.processed += 1
+        self.latency += self.LATENCY_SMOOTHING * (duration - self.latency)
+        self._window_count += 1
+        if now - self._window_start >= self.STATS_WINDOW:
+            self.rate = self._window_count / (now - self._window_start)
+            self._window_start, self._window_count = now, 0
+
+    def __get_dict__(self) -> dict:
+        return {'rate': round(self.rate, 1),
+                'latency_ms': round(1000 * self.latency, 1),
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors}
+
+
+class Pipeline:
+    """
+    Chain of stages, each one in its own thread, connected by LatestValue handoffs.
+    """
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+
+    def add_stage(self, name: str, function: Callable, source: Optional[Stage] = None) -> Stage:
+        stage = Stage(name, function, None if source is None else source.output)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for stage in self.stages:
+            stage.join()
+
+    def __get_dict__(self) -> dict:
+        return {stage.name: stage.__get_dict__() for stage in self.stages}
+
+
+class WorkerPool:
+    """
+    Worker threads shared by the pipelines of several drones for their expensive step (the marker detection),
+    so that N drones do not need N times the cores. OpenCV releases the GIL, the workers do run in parallel.
+    When there are more active clients than workers, the CPU is apportioned by weighted fair queuing: a free worker
+    serves the client that used the least CPU time relative to its weight, and waits for an active client that is
+    behind its share rather than serving one that is ahead (each pipeline only has one request at a time).
+    A client with weight 2 gets twice the CPU of a client with weight 1, and idle clients do not accumulate credit.
+    """
+    STATS_WINDOW: float = 1.0  # in seconds, the CPU shares are measured over windows of this duration
+    ACTIVE_TIMEOUT: float = 0.5  # in seconds, a client without request for this long is not waited for
+    FAIRNESS_SLACK: float = 0.005  # in seconds of weighted CPU time, lead allowed over a waiting client
+    HOLD_TIMEOUT: float = 0.005  # in seconds, bounds the time a worker waits for a client behind its share
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._condition = Condition()
+        self._pending: Dict[str, Deque[tuple]] = {}
+        self._weights: Dict[str, float] = {}
+        self._virtual_time: Dict[str, float] = {}  # CPU time used / weight
+        self._last_request: Dict[str, float] = {}
+        self._served: Dict[str, int] = {}
+        self._cpu_time: Dict[str, float] = {}
+        self._window_cpu_time: Dict[str, float] = {}
+        self._window_start: float = 0.0
+        self.shares: Dict[str, float] = {}  # share of the pool CPU time used by each client in the last window
+        self.stop_request = False
+        self.threads: List[Thread] = []
+
+    def register(self, client: str, weight: float = 1.0):
+        with self._condition:
+            self._pending[client] = deque()
+            self._weights[client] = weight
+            self._virtual_time[client] = min(self._virtual_time.values(), default=0.0)
+            self._last_request[client] = 0.0
+            self._served[client] = 0
+            self._cpu_time[client] = 0.0
+            self._window_cpu_time[client] = 0.0
+            self.shares[client] = 0.0
+
+    def set_weight(self, client: str, weight: float):
+        with self._condition:
+            self._weights[client] = weight
+
+    def start(self):
+        self.stop_request = False
+        self._window_start = time.perf_counter()
+        self.threads = [Thread(target=self._work, name=f"pool-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        with self._condition:
+            self.stop_request = True
+            self._condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        # unblock the callers still waiting
+        for requests in self._pending.values():
+            while requests:
+                requests.popleft()[2].cancel()
+
+    def run(self, client: str, function: Callable, *args) -> Any:
+        """ Runs function(*args) on a worker, blocks until it is done and returns its result.
+        Returns None if the pool is stopped meanwhile """
+        future = Future()
+        with self._condition:
+            if self.stop_request:
+                return None
+            now = time.perf_counter()
+            if now - self._last_request[client] >= self.ACTIVE_TIMEOUT:
+                # a client coming back from idle starts at the current virtual time of the active ones
+                active = [self._virtual_time[c] for c in self._pending
+                          if c != client and now - self._last_request[c] < self.ACTIVE_TIMEOUT]
+                if active:
+                    self._virtual_time[client] = max(self._virtual_time[client], min(active))
+            self._pending[client].append((function, args, future))
+            self._last_request[client] = now
+            self._condition.notify_all()
+        try:
+            return future.result()
+        except CancelledError:
+            return None
+
+    def _next_request(self) -> Optional[tuple]:
+        """ Client with work waiting and the lowest virtual time and its oldest request,
+        None if nothing should be served now. Call with the lock held """
+        waiting = [c for c, requests in self._pending.items() if requests]
+        if not waiting:
+            return None
+        client = min(waiting, key=self._virtual_time.get)
+        now = time.perf_counter()
+        active = [c for c in self._pending if now - self._last_request[c] < self.ACTIVE_TIMEOUT]
+        if len(active) > self.workers:
+            # an active client behind its share will send its next request soon: keep the worker for it
+            lead = self._virtual_time[client] - self.FAIRNESS_SLACK
+            if any(self._virtual_time[c] < lead for c in active if not self._pending[c]):
+                return None
+        return client, self._pending[client].popleft()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                request = None
+                while not self.stop_request:
+                    request = self._next_request()
+                    if request is not None:
+                        break
+                    self._condition.wait(self.HOLD_TIMEOUT if any(self._pending.values()) else None)
+                if self.stop_request:
+                    return
+                client, (function, args, future) = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            start_time = time.thread_time()
+            try:
+                future.set_result(function(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            self._account(client, time.thread_time() - start_time)
+
+    def _account(self, client: str, cpu_time: float):
+        with self._condition:
+            self._served[client] += 1
+            self._cpu_time[client] += cpu_time
+            self._window_cpu_time[client] += cpu_time
+            self._virtual_time[client] += cpu_time / self._weights[client]
+            now = time.perf_counter()
+            if now - self._window_start >= self.STATS_WINDOW:
+                total = sum(self._window_cpu_time.values()) or 1.0
+                self.shares = {c: round(t / total, 3) for c, t in self._window_cpu_time.items()}
+                self._window_cpu_time = {c: 0.0 for c in self._window_cpu_time}
+                self._window_start = now
+
+    def __get_dict__(self) -> dict:
+        return {client: {'weight': self._weights[client],
+                         'served': self._served[client],
+                         'cpu_s': round(self._cpu_time[client], 2),
+                         'share': self.shares.get(client, 0.0)}
+                for client in self._weights}
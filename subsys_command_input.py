@@ -0,0 +1,104 @@
+import select
+import socket
+import time
+from typing import List
+
+from parameters import RunStatus, RUN, MODE
+from subsys_read_user_input import RCStatus, ModeStatus, rc_command
+
+
+class CommandInput:
+    """
+    Handles the commands of the headless mode, in place of the pygame user inputs.
+    The commands come from a script file (one command per line) and/or from a local UDP socket:
+        takeoff | land | emergency | manual | auto | stop
+        rc <a> <b> <c> <d>      velocity commands, see RCStatus
+        wait <seconds>          (script only) waits before the next command
+    Lines starting with # are ignored. Each command received on the socket is answered with 'ok' or 'error ...'.
+    Example: echo "takeoff" | nc -u -w1 127.0.0.1 8999
+    """
+    POLL_PERIOD: float = 0.05  # in seconds
+
+    script: List[str] = []
+    script_line: int = 0
+    wait_until: float = 0
+    command_socket: socket.socket = None
+
+    @classmethod
+    def setup(cls, script_path: str = None, command_port: int = None):
+        RunStatus.value = RUN.START
+        ModeStatus.value = -1
+        if script_path is not None:
+            with open(script_path, 'r') as fd:
+                cls.script = [line.strip() for line in fd]
+            print('CommandInput | Script loaded:', script_path)
+        if command_port is not None:
+            cls.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            cls.command_socket.bind(('127.0.0.1', command_port))
+            print('CommandInput | Listening for commands on 127.0.0.1 port', command_port)
+
+    @classmethod
+    def run_command_loop(cls):
+        # Headless counterpart of ReadUserInput.run_pygame_loop(): breaks only when the flight is finished
+        while RunStatus.value != RUN.STOP:
+            cls.run_script()
+            if cls.command_socket is not None:
+                ready, _, _ = select.select([cls.command_socket], [], [], cls.POLL_PERIOD)
+                if ready:
+                    data, address = cls.command_socket.recvfrom(1024)
+                    reply = cls.run(data.decode('utf-8', errors='replace'))
+                    cls.command_socket.sendto(reply.encode('utf-8'), address)
+            elif cls.script_line >= len(cls.script) and RunStatus.value != RUN.STOP:
+                print('CommandInput | End of script reached')
+                RunStatus.value = RUN.STOP
+            else:
+                time.sleep(cls.POLL_PERIOD)
+        if cls.command_socket is not None:
+            cls.command_socket.close()
+        return 1
+
+    @classmethod
+    def run_script(cls):
+        while cls.script_line < len(cls.script) and time.time() >= cls.wait_until:
+            line = cls.script[cls.script_line]
+            cls.script_line += 1
+            words = line.split()
+            if words and words[0] == 'wait' and len(words) == 2:
+                try:
+                    cls.wait_until = time.time() + float(words[1])
+                except ValueError:
+                    print('CommandInput | Invalid wait duration, line skipped:', line)
+            else:
+                cls.run(line)
+
+    @classmethod
+    def run(cls, line: str) -> str:
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            return 'ok'
+        command = words[0].lower()
+        if command == 'stop':
+            rc_command.put(RCStatus())
+            RunStatus.value = RUN.STOP
+        elif command == 'takeoff':
+            ModeStatus.command(MODE.TAKEOFF)
+        elif command == 'land':
+            ModeStatus.command(MODE.LAND)
+        elif command == 'emergency':
+            ModeStatus.command(MODE.EMERGENCY)
+        elif command == 'auto':
+            ModeStatus.command(MODE.AUTO_FLIGHT)
+        elif command == 'manual':
+            ModeStatus.command(MODE.MANUAL_FLIGHT)
+        elif command == 'rc' and len(words) == 5:
+            try:
+                rc_command.put(RCStatus(*[int(word) for word in words[1:]]))
+            except ValueError:
+                return 'error invalid rc values'
+            if ModeStatus.value == MODE.AUTO_FLIGHT:
+                ModeStatus.command(MODE.MANUAL_FLIGHT)
+        else:
+            print('CommandInput | Unknown command:', line)
+            return 'error unknown command'
+        print('CommandInput |', line)
+        return 'ok'
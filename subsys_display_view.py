@@ -1,65 +1,208 @@
+import numbers
+import time
+from threading import Lock
+
 import numpy
-import pygame
 from parameters import RED, IMG_SIZE, SCREEN_SIZE
-from typing import Any
+from typing import Any, Dict
 
 
 class Display:
     """
     Displays the frame acquired by the Tello camera and the marker detection results
     on a pygame window
+
+    Double buffered: run() draws in the back buffer from the image processing thread and publishes it by swapping
+    the buffers, present() copies the published (front) buffer to the screen from the main thread.
+    Only the swap and the copy to the screen hold buffer_lock, so drawing and presenting never wait for each other.
     """
     # Parameters
-    SCREEN: pygame.Surface = None
+    SCREEN: 'pygame.Surface' = None
+    # Posted to the main thread when a new frame has been drawn, see ReadUserInput.run_pygame_loop()
+    NEW_FRAME_EVENT: int = None  # pygame.USEREVENT + 1, set by setup()
 
     LEFT_MARGIN: int = 5
     TOP_MARGIN: int = 0
     INTER_LINE: int = 20
 
-    FONT_PANEL_INFO: pygame.font.Font = None
+    FONT_PANEL_INFO: 'pygame.font.Font' = None
+    VALUE_DECIMALS: int = 1  # floats are displayed rounded, so that small variations do not re-render the line
+    MAX_CACHED_VALUES: int = 1024  # the cache of rendered values is cleared when it grows bigger
+    FONT_PROFILE: 'pygame.font.Font' = None
+    PROFILE_REFRESH_PERIOD: float = 0.5  # in seconds
+    PROFILE_COLUMNS: tuple = (0, 80, 130, 180)  # x of the section name and of the p50, p95, p99 columns
 
     # global Variables
     pos_img_in_screen: tuple = (0, 0)
     current_line: int = TOP_MARGIN
     log_dict: dict = {}
+    # HUD: every line is rendered once per (label, value) and drawn on a persistent panel surface
+    panel: 'pygame.Surface' = None
+    panel_changed: bool = True
+    label_cache: Dict[str, 'pygame.Surface'] = {}
+    value_cache: Dict[Any, 'pygame.Surface'] = {}
+    panel_rect: 'pygame.Rect' = None
+    image_rect: 'pygame.Rect' = None
+    dirty_rects: list = []
+    back_buffer: 'pygame.Surface' = None
+    front_buffer: 'pygame.Surface' = None
+    buffer_ready: bool = False  # True when front_buffer holds a frame not presented yet
+    buffer_lock: Lock = Lock()
+    # Performance overlay drawn on the image, toggled with the P key: p50 / p95 / p99 of the profiled sections.
+    # Rendered again every PROFILE_REFRESH_PERIOD only, blitted on every frame
+    show_profile: bool = False
+    profile_overlay: 'pygame.Surface' = None
+    profile_time: float = 0.0
 
     @classmethod
     def setup(cls):
-        # Init pygame
+        # Init pygame, imported here so that the headless mode does not load it
+        import pygame
         pygame.init()
         pygame.font.init()
         cls.FONT_PANEL_INFO = pygame.font.Font('freesansbold.ttf', 18)
+        cls.FONT_PROFILE = pygame.font.Font('freesansbold.ttf', 14)
+        cls.NEW_FRAME_EVENT = pygame.USEREVENT + 1
 
         # create pygame screen
         shift_left = SCREEN_SIZE[0] - IMG_SIZE[0]
         cls.pos_img_in_screen = (shift_left, 0)
+        cls.panel_rect = pygame.Rect(0, 0, shift_left, SCREEN_SIZE[1])
+        cls.image_rect = pygame.Rect(cls.pos_img_in_screen, IMG_SIZE)
+        cls.panel = pygame.Surface(cls.panel_rect.size)
+        cls.panel.fill([0, 0, 0])
         cls.SCREEN = pygame.display.set_mode(SCREEN_SIZE)
+        cls.back_buffer = pygame.Surface(SCREEN_SIZE).convert()
+        cls.front_buffer = pygame.Surface(SCREEN_SIZE).convert()
 
     @classmethod
-    def run(cls, frame: numpy.ndarray, variables_dict: dict):
-        cls.SCREEN.fill([0, 0, 0])
-        for key in variables_dict:
-            cls._log(f"{key}: ", f"{variables_dict[key]}")
-        frame = numpy.rot90(frame)
-        frame = numpy.flipud(frame)
-        frame = pygame.surfarray.make_surface(frame)
+    def run(cls, frame: numpy.ndarray, variables_dict: dict, profiler=None):
+        # profiler: pipeline.Profiler of the displayed drone, shown by the performance overlay
+        import pygame
+        for key, value in variables_dict.items():
+            cls._log(key, value)
         cls._update_log()
-        cls.SCREEN.blit(frame, cls.pos_img_in_screen)
+        # the back buffer is one frame behind: the panel is always copied, it may have changed in the previous frame
+        cls.back_buffer.blit(cls.panel, cls.panel_rect)
+        cls.blit_frame(cls.back_buffer, frame, cls.pos_img_in_screen)
+        if cls.show_profile and profiler is not None:
+            now = time.perf_counter()
+            if cls.profile_overlay is None or now - cls.profile_time >= cls.PROFILE_REFRESH_PERIOD:
+                cls.profile_overlay = cls._render_profile(profiler.__get_dict__())
+                cls.profile_time = now
+            cls.back_buffer.blit(cls.profile_overlay, cls.pos_img_in_screen)
+
+        with cls.buffer_lock:
+            cls.back_buffer, cls.front_buffer = cls.front_buffer, cls.back_buffer
+            # only the screen areas listed in dirty_rects need to be presented
+            # (accumulated until presented, in case the main thread skipped a frame)
+            if cls.panel_changed and cls.panel_rect not in cls.dirty_rects:
+                cls.dirty_rects.append(cls.panel_rect)
+            if cls.image_rect not in cls.dirty_rects:
+                cls.dirty_rects.append(cls.image_rect)
+            cls.buffer_ready = True
+        cls.panel_changed = False
+        pygame.event.post(pygame.event.Event(cls.NEW_FRAME_EVENT))
 
     @classmethod
-    def _log(cls, title: str, value: Any):
-        """ We use the title argument as key in dictionary to save the position of the log in screen"""
-        if title in cls.log_dict:
-            cls.log_dict[title]['value'] = value
+    def present(cls) -> bool:
+        """ Main thread only: copies the latest published frame to the screen and updates the window.
+        Returns False if no new frame was published since the last call """
+        import pygame
+        with cls.buffer_lock:
+            if not cls.buffer_ready:
+                return False
+            rects, cls.dirty_rects = cls.dirty_rects, []
+            for rect in rects:
+                cls.SCREEN.blit(cls.front_buffer, rect, rect)
+            cls.buffer_ready = False
+        pygame.display.update(rects)
+        return True
+
+    @staticmethod
+    def blit_frame(surface: 'pygame.Surface', frame: numpy.ndarray, position: tuple):
+        """ Draws an RGB frame (height, width, 3) on surface.
+        The frame buffer is wrapped in a Surface without copy (pygame.image.frombuffer reads it row by row,
+        which is the transpose surfarray expects), so the only copy is the blit itself.
+        Frames of another layout go through surfarray, which handles the transpose as a view """
+        import pygame
+        if frame.dtype == numpy.uint8 and frame.ndim == 3 and frame.shape[2] == 3:
+            frame = numpy.ascontiguousarray(frame)  # no-op for decoded frames
+            surface.blit(pygame.image.frombuffer(frame, (frame.shape[1], frame.shape[0]), 'RGB'), position)
         else:
+            surface.blit(pygame.surfarray.make_surface(frame.swapaxes(0, 1)), position)
+
+    @classmethod
+    def _log(cls, title: str, value: Any):
+        """ We use the title argument as key in dictionary to save the position of the log in screen.
+        The line is only redrawn when the displayed value changes """
+        value = cls._value_key(value)
+        item = cls.log_dict.get(title)
+        if item is None:
             next_line = cls.current_line + cls.INTER_LINE
             position = (cls.LEFT_MARGIN, next_line)
-            cls.log_dict[title] = {"pos": position, 'value': value}
+            item = {"pos": position, 'value': value, 'changed': True}
+            cls.log_dict[title] = item
             cls.current_line = next_line
+        elif item['value'] != value or type(item['value']) is not type(value):
+            item['value'] = value
+            item['changed'] = True
+
+    @staticmethod
+    def _value_key(value: Any) -> Any:
+        """ Value as displayed, used as key of the value cache: numbers stay numbers (no string formatting
+        on every frame), floats are rounded to VALUE_DECIMALS """
+        if isinstance(value, (bool, numpy.bool_)):
+            return bool(value)
+        if isinstance(value, numbers.Integral):
+            return int(value)
+        if isinstance(value, numbers.Real):
+            value = float(value)
+            # nan != nan, it would be redrawn on every frame
+            return round(value, Display.VALUE_DECIMALS) if value == value else 'nan'
+        if value is None or isinstance(value, str):
+            return value
+        return str(value)
+
+    @classmethod
+    def _render_value(cls, value: Any) -> 'pygame.Surface':
+        surface = cls.value_cache.get((type(value), value))
+        if surface is None:
+            if len(cls.value_cache) >= cls.MAX_CACHED_VALUES:
+                cls.value_cache.clear()
+            surface = cls.FONT_PANEL_INFO.render(f" {value}", True, RED)
+            cls.value_cache[(type(value), value)] = surface
+        return surface
+
+    @classmethod
+    def _render_profile(cls, profile: dict) -> 'pygame.Surface':
+        """ Table of the section percentiles in milliseconds, on a translucent background """
+        import pygame
+        rows = [('ms', 'p50', 'p95', 'p99')]
+        rows += [(name, *(f"{stats[p]:.1f}" for p in ('p50', 'p95', 'p99'))) for name, stats in profile.items()]
+        line_height = cls.FONT_PROFILE.get_linesize()
+        overlay = pygame.Surface((cls.PROFILE_COLUMNS[-1] + 60, len(rows) * line_height + 2 * cls.LEFT_MARGIN),
+                                 pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        for row_index, row in enumerate(rows):
+            y = cls.LEFT_MARGIN + row_index * line_height
+            for x, text in zip(cls.PROFILE_COLUMNS, row):
+                overlay.blit(cls.FONT_PROFILE.render(text, True, (255, 255, 255)), (cls.LEFT_MARGIN + x, y))
+        return overlay
 
     @classmethod
     def _update_log(cls):
         for title, item in cls.log_dict.items():
-            text = f"{title} {item['value']}"
-            panel_info = cls.FONT_PANEL_INFO.render(text, True, RED)
-            cls.SCREEN.blit(panel_info, item['pos'])
+            if not item['changed']:
+                continue
+            label = cls.label_cache.get(title)
+            if label is None:
+                label = cls.FONT_PANEL_INFO.render(f"{title}: ", True, RED)
+                cls.label_cache[title] = label
+            value = cls._render_value(item['value'])
+            x, y = item['pos']
+            cls.panel.fill([0, 0, 0], (x, y, cls.panel_rect.width - x, cls.INTER_LINE))
+            cls.panel.blit(label, (x, y))
+            cls.panel.blit(value, (x + label.get_width(), y))
+            item['changed'] = False
+            cls.panel_changed = True
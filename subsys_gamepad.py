@@ -1,24 +1,8 @@
-import pygame
 from typing import List
 
 
 class Gamepad:
-    keyboard_map: dict = dict(name='Keyboard',
-                              axes={},
-                              buttons={pygame.K_ESCAPE: 'Stop',
-                                       pygame.K_SPACE: 'Emergency',
-                                       pygame.K_t: 'Takeoff',
-                                       pygame.K_l: 'Land',
-                                       pygame.K_LEFT: 'Left',
-                                       pygame.K_RIGHT: 'Right',
-                                       pygame.K_UP: 'Forward',
-                                       pygame.K_DOWN: 'Backward',
-                                       pygame.K_z: 'Up',
-                                       pygame.K_s: 'Down',
-                                       pygame.K_d: 'Yaw+',
-                                       pygame.K_q: 'Yaw-',
-                                       pygame.K_a: 'Automatic flight'}
-                              )
+    keyboard_map: dict = None  # built by get_keyboard_map(): the key codes come from pygame, imported on first use
     map_list: List[dict] = [dict(name='Logitech Extreme 3D',
                                  axes={0: 'Roll',
                                        1: 'Pitch',
@@ -61,3 +45,26 @@ class Gamepad:
                                           4: 'Automatic flight'     # RX
                                           })
                             ]
+
+    @classmethod
+    def get_keyboard_map(cls) -> dict:
+        if cls.keyboard_map is None:
+            import pygame
+            cls.keyboard_map = dict(name='Keyboard',
+                                    axes={},
+                                    buttons={pygame.K_ESCAPE: 'Stop',
+                                             pygame.K_SPACE: 'Emergency',
+                                             pygame.K_t: 'Takeoff',
+                                             pygame.K_l: 'Land',
+                                             pygame.K_LEFT: 'Left',
+                                             pygame.K_RIGHT: 'Right',
+                                             pygame.K_UP: 'Forward',
+                                             pygame.K_DOWN: 'Backward',
+                                             pygame.K_z: 'Up',
+                                             pygame.K_s: 'Down',
+                                             pygame.K_d: 'Yaw+',
+                                             pygame.K_q: 'Yaw-',
+                                             pygame.K_a: 'Automatic flight',
+                                             pygame.K_p: 'Performance overlay'}
+                                    )
+        return cls.keyboard_map
@@ -1,46 +1,79 @@
-import cv2
 import numpy
 from parameters import ScreenPosition
-from typing import List
+from typing import Any, Dict, List, NamedTuple
 
 
-class DetectedMarkersStatus:
+class DetectedMarkersStatus(NamedTuple):
     """
-    Contains data to describe a list of several markers
+    Contains data to describe a list of several markers, and the frame they were detected in
+    Immutable: MarkersDetector.run() returns a new record for every frame
     """
+    frame: numpy.ndarray
     corners: List[ScreenPosition] = []
-    ids: List = []
-    noMarker: bool = False
+    ids: List = None
+
+    @property
+    def noMarker(self) -> bool:
+        return self.ids is None
 
 
 class MarkersDetector:
     """
     Detects every marker on the frame coming from the Tello front camera,
-    then returns a single DetectedMarkersStatus class containing data for all detected markers
+    then returns a single DetectedMarkersStatus record containing data for all detected markers
+    The detector is set with configure(), its dictionary and parameters are built once, not for every frame
     """
     PARAM_DRAW_MARKERS: bool = True
+    DICTIONARY: str = 'DICT_4X4_100'  # name of the cv2.aruco predefined dictionary
+    DETECTION_SCALE: float = 1.0  # the frame is downscaled by this factor before the detection (faster, less range)
+    DETECTOR_PARAMETERS: Dict[str, Any] = {}  # cv2.aruco.DetectorParameters attributes differing from the defaults
+
+    aruco_dict = None  # built by configure(), on first use if it was not called
+    parameters = None
+
+    @classmethod
+    def configure(cls, dictionary: str = None, scale: float = None, parameters: Dict[str, Any] = None):
+        """ Sets the detector, e.g. configure(scale=0.5, parameters={'adaptiveThreshWinSizeStep': 10}).
+        Arguments left to None keep their current value, parameters replaces DETECTOR_PARAMETERS """
+        import cv2
+        dictionary = cls.DICTIONARY if dictionary is None else dictionary
+        parameters = cls.DETECTOR_PARAMETERS if parameters is None else parameters
+        detector_parameters = cv2.aruco.DetectorParameters_create()
+        for name, value in parameters.items():
+            if not hasattr(detector_parameters, name):
+                raise AttributeError('Unknown ArUco detector parameter: ' + name)
+            setattr(detector_parameters, name, value)
+        aruco_dict = cv2.aruco.Dictionary_get(getattr(cv2.aruco, dictionary))
+
+        cls.DICTIONARY, cls.DETECTOR_PARAMETERS = dictionary, parameters
+        if scale is not None:
+            cls.DETECTION_SCALE = scale
+        # the detection threads only read them: they are replaced, never modified
+        cls.aruco_dict, cls.parameters = aruco_dict, detector_parameters
 
     @classmethod
-    def run(cls, frame: numpy.ndarray) -> numpy.ndarray:
+    def run(cls, frame: numpy.ndarray) -> DetectedMarkersStatus:
         cp_frame = frame.copy()
         corners, ids = cls.__find_markers(cp_frame)
         if cls.PARAM_DRAW_MARKERS and ids is not None:
             cls.__draw_markers(cp_frame, corners, ids)
-
-        if not cls.PARAM_DRAW_MARKERS and ids is None:
-            DetectedMarkersStatus.noMarker = True
-        DetectedMarkersStatus.ids = ids
-        DetectedMarkersStatus.corners = corners
-        return cp_frame
+        return DetectedMarkersStatus(cp_frame, corners, ids)
 
     @classmethod
     def __find_markers(cls, frame: numpy.ndarray) -> (List[ScreenPosition], List[int]):
+        import cv2
+        if cls.parameters is None:
+            cls.configure()
+        scale = cls.DETECTION_SCALE
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        aruco_dict = cv2.aruco.Dictionary_get(cv2.aruco.DICT_4X4_100)
-        parameters = cv2.aruco.DetectorParameters_create()
-        corners, ids, _ = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        corners, ids, _ = cv2.aruco.detectMarkers(gray, cls.aruco_dict, parameters=cls.parameters)
+        if scale != 1.0:
+            corners = tuple(marker_corners / scale for marker_corners in corners)
         return corners, ids
 
     @classmethod
     def __draw_markers(cls, frame: numpy.ndarray, corners: List[ScreenPosition], ids: List[int]):
+        import cv2
         cv2.aruco.drawDetectedMarkers(frame, corners, ids, borderColor=(100, 0, 240))
@@ -0,0 +1,75 @@
+import time
+from typing import List
+
+from DJITelloPy.djitellopy import metrics
+
+
+class MetricsExport:
+    """
+    Serves the metrics of the library (commands, rc datagrams, state packets, battery, video decoding)
+    and of the racing pipelines on http://<host>:<port>/metrics, in the Prometheus text format.
+    The pipeline statistics are read when the metrics are scraped, only the detection latency is
+    recorded on every frame (observe_detection()).
+    """
+    DETECTION_LATENCY = metrics.Histogram('racing_detection_seconds',
+                                          'Marker detection latency, including the wait for a detector worker',
+                                          ['drone'],
+                                          buckets=(0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0))
+    STAGE_RATE = metrics.Gauge('racing_stage_rate_hz', 'Items processed per second by a pipeline stage',
+                               ['drone', 'stage'])
+    STAGE_DROPPED = metrics.Counter('racing_stage_dropped_total',
+                                    'Items overwritten before the pipeline stage could process them (frames for '
+                                    'the detect stage)', ['drone', 'stage'])
+    STAGE_ERRORS = metrics.Counter('racing_stage_errors_total', 'Exceptions raised while processing an item, by '
+                                   'pipeline stage', ['drone', 'stage'])
+    CONTROL_LOOP_RATE = metrics.Gauge('racing_control_loop_rate_hz', 'Rc commands computed and sent per second',
+                                      ['drone'])
+    STEP_DURATION = metrics.Gauge('racing_step_seconds', 'Duration of the processing calls over the last calls '
+                                  '(see Profiler), by quantile', ['drone', 'step', 'quantile'])
+    DETECTOR_SHARE = metrics.Gauge('racing_detector_cpu_share', 'Share of the detector pool CPU time', ['drone'])
+    UPTIME = metrics.Gauge('racing_uptime_seconds', 'Time since the metrics export started')
+    QUANTILES: dict = {'p50': '0.5', 'p95': '0.95', 'p99': '0.99'}  # Profiler percentile -> quantile label
+
+    server: metrics.MetricsServer = None
+    pipelines: list = []  # RacingPipeline of every drone, see main.py
+    pool = None  # shared detector WorkerPool
+    start_time: float = 0.0
+
+    @classmethod
+    def setup(cls, port: int, host: str = '127.0.0.1', pipelines: List = None, pool=None):
+        # pipelines: the list is read on every scrape, it may still be filled after setup
+        cls.pipelines = pipelines if pipelines is not None else []
+        cls.pool = pool
+        cls.start_time = time.perf_counter()
+        metrics.REGISTRY.add_update_hook(cls.update)
+        cls.server = metrics.start_http_server(port, host)
+        print('MetricsExport | Serving metrics on http://{}:{}/metrics'.format(*cls.server.address))
+
+    @classmethod
+    def observe_detection(cls, drone: str, duration: float):
+        cls.DETECTION_LATENCY.labels(drone).observe(duration)
+
+    @classmethod
+    def update(cls):
+        cls.UPTIME.set(time.perf_counter() - cls.start_time)
+        for racing_pipeline in cls.pipelines:
+            drone = racing_pipeline.name
+            if racing_pipeline.pipeline is not None:
+                for stage in racing_pipeline.pipeline.stages:
+                    cls.STAGE_RATE.labels(drone, stage.name).set(stage.rate)
+                    cls.STAGE_DROPPED.labels(drone, stage.name).set(stage.dropped)
+                    cls.STAGE_ERRORS.labels(drone, stage.name).set(stage.errors)
+                    if stage.name == 'actuate':
+                        cls.CONTROL_LOOP_RATE.labels(drone).set(stage.rate)
+            for step, percentiles in racing_pipeline.profiler.__get_dict__().items():
+                for percentile, quantile in cls.QUANTILES.items():
+                    cls.STEP_DURATION.labels(drone, step, quantile).set(percentiles[percentile] / 1000)
+        if cls.pool is not None:
+            for drone, share in cls.pool.shares.items():
+                cls.DETECTOR_SHARE.labels(drone).set(share)
+
+    @classmethod
+    def stop(cls):
+        if cls.server is not None:
+            cls.server.stop()
+            cls.server = None
@@ -1,7 +1,12 @@
-from parameters import RunStatus, RUN, MODE
+import time
+from threading import Lock
+
+from parameters import RunStatus, RUN, MODE, FPS, JOYSTICK_DEADBAND, INPUT_SAMPLE_RATE
+from subsys_display_view import Display
 from subsys_gamepad import Gamepad
-from typing import List
-import pygame
+from pipeline import LatestValue
+from typing import Dict, List, NamedTuple, Tuple
+# pygame is imported on first use, the headless mode does not need it
 
 
 class KeyStatus:
@@ -13,13 +18,14 @@ class KeyStatus:
     type_pressed: int = None  # Index of the key
 
 
-class RCStatus:
+class RCStatus(NamedTuple):
     """
     Contains the velocity commands that will be forwarded to the Tello
         a : Left / Right velocity
         b : Forward / Backward velocity
         c : Upward / Downward velocity
         d : Yaw rate
+    Immutable: the current commands are published in rc_command, by replacing the whole record
     """
 
     a: int = 0  # Left / Right velocity
@@ -27,25 +33,44 @@ class RCStatus:
     c: int = 0  # Upward / Downward velocity
     d: int = 0  # Yaw velocity
 
-    @classmethod
-    def __get_dict__(cls) -> dict:
-        rc: dict = {'a': cls.a,
-                    'b': cls.b,
-                    'c': cls.c,
-                    'd': cls.d}
+    def __get_dict__(self) -> dict:
+        rc: dict = {'a': self.a,
+                    'b': self.b,
+                    'c': self.c,
+                    'd': self.d}
         return rc
-    
-    @classmethod
-    def toStr(cls):
-        return "rc " + str(cls.a) + " " + str(cls.b) + " " + str(cls.c) + " " + str(cls.d)
-    
+
+    def toStr(self):
+        return "rc " + str(self.a) + " " + str(self.b) + " " + str(self.c) + " " + str(self.d)
+
+
+# Current velocity commands, written by the user inputs and the automatic control, read by the actuators.
+# Reads need no lock: rc_command.value is always a complete RCStatus
+rc_command: LatestValue = LatestValue(RCStatus())
+
 
 class ModeStatus:
     """
-    Contains the current flight mode status
+    Contains the last flight mode command
     (EMERGENCY, TAKEOFF, LAND, FLIGHT)
+    Every command is numbered: the drones act once on each command, a repeated one (e.g. a second Land press)
+    included. The flight mode of a drone is TelloSensors.mode, updated once the drone executed the command.
     """
     value: int = MODE.LAND
+    seq: int = 0
+    _lock: Lock = Lock()
+
+    @classmethod
+    def command(cls, mode: int):
+        with cls._lock:
+            cls.value = mode
+            cls.seq += 1
+
+    @classmethod
+    def get(cls) -> (int, int):
+        """ Number and mode of the last command """
+        with cls._lock:
+            return cls.seq, cls.value
 
     @classmethod
     def __get_dict__(cls) -> dict:
@@ -59,9 +84,19 @@ class ReadUserInput:
     The controls are defined in the subsys_gamepad.py -> Gamepad class
     """
 
-    joysticks: List[pygame.joystick.Joystick] = []
+    EVENT_WAIT_TIMEOUT: int = 100  # in ms, bounds the time needed to notice a stop request
+    STATS_WINDOW: float = 1.0  # in seconds
+    TRIGGER_AXES: tuple = ('Yaw+', 'Yaw-')
+
+    joysticks: List['pygame.joystick.Joystick'] = []
     joystick_maps: List[dict] = []
     rc_threshold: 3*[int] = [100, 100, 100]
+    # Latest value of every joystick axis moved since the last sample, by (joystick index, axis index).
+    # Sticks send hundreds of events per second: they are coalesced and applied INPUT_SAMPLE_RATE times per second
+    pending_axes: Dict[Tuple[int, int], float] = {}
+    next_sample_time: float = 0.0
+    # Main loop statistics: loop iterations and display updates per second, share of time spent working
+    loop_stats: dict = {'loop_rate': 0.0, 'update_rate': 0.0, 'busy': 0.0}
 
     @classmethod
     def setup(cls,
@@ -71,6 +106,7 @@ class ReadUserInput:
         cls.rc_threshold = [rc_roll_pitch_threshold, rc_height_threshold, rc_yaw_threshold]
         RunStatus.value = RUN.START
         ModeStatus.value = -1
+        import pygame
         pygame.joystick.init()
         cls.joysticks = [pygame.joystick.Joystick(j) for j in range(pygame.joystick.get_count())]
         print(len(cls.joysticks), 'joystick(s) found')
@@ -88,27 +124,55 @@ class ReadUserInput:
 
     @classmethod
     def run_pygame_loop(cls):
+        # Sleeps until a user input or a new frame arrives, and refreshes the display at most FPS times per second,
+        # with the frames published by Display.run(), only in the screen areas that changed
+        import pygame
+        clock = pygame.time.Clock()
+        window_start = time.perf_counter()
+        loops = updates = 0
+        busy_time = 0.0
         while True:
-            for event in pygame.event.get():
-                cls.run(event)
-            pygame.display.update()
+            timeout = cls.EVENT_WAIT_TIMEOUT
+            if cls.pending_axes:
+                # do not sleep past the next axes sample (wait(0) would block until the next event)
+                timeout = max(1, min(timeout, int(1000 * (cls.next_sample_time - time.perf_counter()))))
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+            work_start = time.perf_counter()
+            new_frame = False
+            for event in events:
+                if event.type == Display.NEW_FRAME_EVENT:
+                    new_frame = True
+                elif event.type != pygame.NOEVENT:
+                    cls.run(event)
+            if cls.pending_axes and work_start >= cls.next_sample_time:
+                cls.sample_axes()
+                cls.next_sample_time = work_start + 1 / INPUT_SAMPLE_RATE
+            if new_frame and Display.present():
+                updates += 1
             if RunStatus.value == RUN.STOP:
                 break
+
+            loops += 1
+            now = time.perf_counter()
+            busy_time += now - work_start
+            if now - window_start >= cls.STATS_WINDOW:
+                cls.loop_stats = {'loop_rate': round(loops / (now - window_start), 1),
+                                  'update_rate': round(updates / (now - window_start), 1),
+                                  'busy': round(busy_time / (now - window_start), 3)}
+                window_start, loops, updates, busy_time = now, 0, 0, 0.0
+            clock.tick(FPS)
+        print('ReadUserInput | Main loop stats:', cls.loop_stats)
         return 1
 
     @classmethod
     def run(cls, event):
+        import pygame
         try:
             if event.type == pygame.QUIT:
                 RunStatus.value = RUN.STOP
             elif event.type == pygame.JOYAXISMOTION:
-                if ModeStatus.value == MODE.AUTO_FLIGHT and abs(event.value) > 0.1:
-                    print('User input detected, automatic control module disabled')
-                    ModeStatus.value = MODE.MANUAL_FLIGHT
-                KeyStatus.is_pressed = True
-                axis = cls.joystick_maps[event.joy]['axes'][event.axis]
-                KeyStatus.type_pressed = axis
-                cls.axis_motion(axis, event.value)
+                # applied by sample_axes()
+                cls.pending_axes[(event.joy, event.axis)] = event.value
             elif event.type == pygame.JOYBUTTONDOWN:
                 KeyStatus.is_pressed = True
                 button = cls.joystick_maps[event.joy]['buttons'][event.button]
@@ -119,12 +183,12 @@ class ReadUserInput:
                 KeyStatus.type_pressed = None
             elif event.type == pygame.KEYDOWN:
                 KeyStatus.is_pressed = True
-                button = Gamepad.keyboard_map['buttons'][event.key]
+                button = Gamepad.get_keyboard_map()['buttons'][event.key]
                 KeyStatus.type_pressed = button
                 cls.buttons(button, KeyStatus)
             elif event.type == pygame.KEYUP:
                 KeyStatus.is_pressed = False
-                button = Gamepad.keyboard_map['buttons'][event.key]
+                button = Gamepad.get_keyboard_map()['buttons'][event.key]
                 KeyStatus.type_pressed = None
                 cls.buttons(button, KeyStatus)
         except KeyError as e:
@@ -133,51 +197,92 @@ class ReadUserInput:
     @classmethod
     def buttons(cls, button: str, key_status: type(KeyStatus)):
         if button == 'Stop' and key_status.is_pressed:
-            RCStatus.a = 0
-            RCStatus.b = 0
-            RCStatus.c = 0
-            RCStatus.d = 0
+            rc_command.put(RCStatus())
             RunStatus.value = RUN.STOP
         elif button == 'Emergency' and key_status.is_pressed:
-            ModeStatus.value = MODE.EMERGENCY
+            ModeStatus.command(MODE.EMERGENCY)
         elif button == 'Takeoff' and key_status.is_pressed:
-            ModeStatus.value = MODE.TAKEOFF
+            ModeStatus.command(MODE.TAKEOFF)
         elif button == 'Land' and key_status.is_pressed:
-            ModeStatus.value = MODE.LAND
+            ModeStatus.command(MODE.LAND)
         elif button == 'Automatic flight' and key_status.is_pressed:
-            ModeStatus.value = MODE.AUTO_FLIGHT
+            ModeStatus.command(MODE.AUTO_FLIGHT)
+        elif button == 'Performance overlay':
+            if key_status.is_pressed:
+                Display.show_profile = not Display.show_profile
         elif ModeStatus.value == MODE.AUTO_FLIGHT and key_status.is_pressed:
-            ModeStatus.value = MODE.MANUAL_FLIGHT
+            ModeStatus.command(MODE.MANUAL_FLIGHT)
             print('User input detected, automatic control module disabled')
 
         if button == 'Left':
-            RCStatus.a = - key_status.is_pressed * int(cls.rc_threshold[0])
+            cls.set_rc(a=- key_status.is_pressed * int(cls.rc_threshold[0]))
         elif button == 'Right':
-            RCStatus.a = key_status.is_pressed * int(cls.rc_threshold[0])
+            cls.set_rc(a=key_status.is_pressed * int(cls.rc_threshold[0]))
         elif button == 'Forward':
-            RCStatus.b = key_status.is_pressed * int(cls.rc_threshold[0])
+            cls.set_rc(b=key_status.is_pressed * int(cls.rc_threshold[0]))
         elif button == 'Backward':
-            RCStatus.b = - key_status.is_pressed * int(cls.rc_threshold[0])
+            cls.set_rc(b=- key_status.is_pressed * int(cls.rc_threshold[0]))
         elif button == 'Up':
-            RCStatus.c = key_status.is_pressed * int(cls.rc_threshold[1])
+            cls.set_rc(c=key_status.is_pressed * int(cls.rc_threshold[1]))
         elif button == 'Down':
-            RCStatus.c = - key_status.is_pressed * int(cls.rc_threshold[1])
+            cls.set_rc(c=- key_status.is_pressed * int(cls.rc_threshold[1]))
         elif button == 'Yaw+':
-            RCStatus.d = key_status.is_pressed * int(cls.rc_threshold[2])
+            cls.set_rc(d=key_status.is_pressed * int(cls.rc_threshold[2]))
         elif button == 'Yaw-':
-            RCStatus.d = - key_status.is_pressed * int(cls.rc_threshold[2])
+            cls.set_rc(d=- key_status.is_pressed * int(cls.rc_threshold[2]))
+
+    @staticmethod
+    def set_rc(**velocities: int):
+        """ Publishes a new RCStatus with the given velocities changed """
+        rc_command.update(lambda rc: rc._replace(**velocities))
+
+    @classmethod
+    def sample_axes(cls):
+        """ Applies the latest value of the axes moved since the previous sample, all at once """
+        pending_axes, cls.pending_axes = cls.pending_axes, {}
+        velocities = {}
+        for (joy, axis_index), value in pending_axes.items():
+            try:
+                axis = cls.joystick_maps[joy]['axes'][axis_index]
+            except KeyError as e:
+                print('No axis/button/key found with index', e, 'in the Gamepad map')
+                continue
+            if axis in cls.TRIGGER_AXES:
+                # triggers rest at -1 and go to 1 when fully pressed
+                deflection = cls.deadband(0.5 * (value + 1))
+                value = 2 * deflection - 1
+            else:
+                deflection = value = cls.deadband(value)
+            if ModeStatus.value == MODE.AUTO_FLIGHT and deflection != 0:
+                print('User input detected, automatic control module disabled')
+                ModeStatus.command(MODE.MANUAL_FLIGHT)
+            KeyStatus.is_pressed = True
+            KeyStatus.type_pressed = axis
+            velocities.update(cls.axis_motion(axis, value))
+        if velocities:
+            cls.set_rc(**velocities)
+
+    @staticmethod
+    def deadband(value: float) -> float:
+        """ 0 inside the deadband, the rest of the range is rescaled so that full deflection still gives 1 """
+        if abs(value) <= JOYSTICK_DEADBAND:
+            return 0.0
+        sign = 1 if value > 0 else -1
+        return sign * (abs(value) - JOYSTICK_DEADBAND) / (1 - JOYSTICK_DEADBAND)
 
     @classmethod
-    def axis_motion(cls, axis: str, value: float):
+    def axis_motion(cls, axis: str, value: float) -> dict:
+        """ Velocity commanded by an axis, as {RCStatus field: value} """
         if axis == 'Roll':
-            RCStatus.a = int(cls.rc_threshold[0] * value)
+            return {'a': int(cls.rc_threshold[0] * value)}
         elif axis == 'Pitch':
-            RCStatus.b = - int(cls.rc_threshold[0] * value)
+            return {'b': - int(cls.rc_threshold[0] * value)}
         elif axis == 'Height':
-            RCStatus.c = - int(cls.rc_threshold[1] * value)
+            return {'c': - int(cls.rc_threshold[1] * value)}
         elif axis == 'Yaw':
-            RCStatus.d = int(cls.rc_threshold[2] * value)
+            return {'d': int(cls.rc_threshold[2] * value)}
         elif axis == 'Yaw+':
-            RCStatus.d = int(cls.rc_threshold[2] * 0.5 * (value + 1))
+            return {'d': int(cls.rc_threshold[2] * 0.5 * (value + 1))}
         elif axis == 'Yaw-':
-            RCStatus.d = int(cls.rc_threshold[2] * 0.5 * (value - 1))
+            return {'d': int(cls.rc_threshold[2] * 0.5 * (value - 1))}
+        return {}
@@ -1,14 +1,14 @@
-import cv2
 import numpy
 
 from parameters import RED, BLUE, RAD2DEG, DRONE_POS, Distance, Angle, ScreenPosition
 from subsys_markers_detected import DetectedMarkersStatus
-from typing import List
+from typing import List, NamedTuple
 
 
-class MarkerStatus:
+class MarkerStatus(NamedTuple):
     """
     Contains data about the marker that is selected as the target to be reached
+    Immutable: SelectTargetMarker.run() returns a new record for every frame, MarkerStatus() when there is no target
     """
 
     id: int = -1
@@ -34,55 +34,36 @@ class MarkerStatus:
     height: Distance = Distance(0)
     width: Distance = Distance(0)
 
-    @classmethod
-    def reset(cls):
-        cls.id = -1
-        cls.corners = []
-        cls.center_pt = ScreenPosition((0, 0))
-        cls.top_pt = ScreenPosition((0, 0))
-        cls.bottom_pt = ScreenPosition((0, 0))
-        cls.left_pt = ScreenPosition((0, 0))
-        cls.right_pt = ScreenPosition((0, 0))
-        cls.h_angle = Angle(0)
-        cls.v_angle = Angle(0)
-        cls.m_angle = Angle(0)
-        cls.m_distance = Distance(0)
-        cls.height = Distance(0)
-        cls.width = Distance(0)
-
-    @classmethod
-    def __get_dict__(cls) -> dict:
-        ms: dict = {'id': cls.id,
-                    'H_angle': int(cls.h_angle * RAD2DEG),
-                    'v_angle': int(cls.v_angle * RAD2DEG),
-                    'm_angle': int(cls.m_angle * RAD2DEG),
-                    'm_distance': cls.m_distance,
-                    'm_height': cls.height,
-                    'm_width': cls.width}
+    # offset of the point aimed at from the center of the marker, and position of this point on the screen
+    offset: tuple = (0, 0)
+    marker_pos: ScreenPosition = ScreenPosition((0, 0))
+
+    def __get_dict__(self) -> dict:
+        ms: dict = {'id': self.id,
+                    'H_angle': int(self.h_angle * RAD2DEG),
+                    'v_angle': int(self.v_angle * RAD2DEG),
+                    'm_angle': int(self.m_angle * RAD2DEG),
+                    'm_distance': self.m_distance,
+                    'm_height': self.height,
+                    'm_width': self.width}
         return ms
 
 
 class SelectTargetMarker:
     """
     Selects the marker to reach first from the list of markers detected by the Tello onboard camera,
-    then returns the corresponding MarkerStatus class filled with the position of the Tello relatively
+    then returns the corresponding MarkerStatus record filled with the position of the Tello relatively
     to this marker
     """
-    marker_pos: ScreenPosition = (0.0, 0.0)
-    offset: tuple = (0, 0)
+    PARAM_DRAW_TARGET: bool = True
 
     @classmethod
-    def setup(cls):
-        MarkerStatus.reset()
-
-    @classmethod
-    def run(cls, frame: numpy.ndarray, markers: type(DetectedMarkersStatus),
-            offset: tuple = (0, 0)) -> type(MarkerStatus):
+    def run(cls, frame: numpy.ndarray, markers: DetectedMarkersStatus,
+            offset: tuple = (0, 0)) -> MarkerStatus:
 
         target_marker_id, corners = cls._get_marker_with_min_id(markers)
         if target_marker_id == -1:
-            MarkerStatus.reset()
-            return MarkerStatus
+            return MarkerStatus()
 
         br, bl, tl, tr = corners[0], corners[1], corners[2], corners[3]
         center_pt = cls._get_midpoint([br, bl, tl, tr])
@@ -98,30 +79,33 @@ class SelectTargetMarker:
         h_angle = cls._angle_between(left_pt, right_pt)
         v_angle = cls._angle_between(top_pt, bottom_pt, vertical=True)
 
-        cls.offset = (int(offset[0] * width), int(offset[1] * height))
-        cls.marker_pos = ScreenPosition((center_pt[0] + cls.offset[0],
-                                         center_pt[1] + cls.offset[1]))
+        pixel_offset = (int(offset[0] * width), int(offset[1] * height))
+        marker_pos = ScreenPosition((center_pt[0] + pixel_offset[0],
+                                     center_pt[1] + pixel_offset[1]))
         # DRONE_POS is a tuple (x, y) that represents the position of the UAV on the pygame display
-        m_angle = cls._angle_between(DRONE_POS, cls.marker_pos, vertical=True)
-        m_distance = cls._length_segment(DRONE_POS, cls.marker_pos)
-
-        cls.draw(frame)
-
-        # update output
-        MarkerStatus.id = target_marker_id
-        MarkerStatus.corners = corners
-        MarkerStatus.center_pt = center_pt
-        MarkerStatus.left_pt = left_pt
-        MarkerStatus.right_pt = right_pt
-        MarkerStatus.bottom_pt = bottom_pt
-        MarkerStatus.top_pt = top_pt
-        MarkerStatus.h_angle = h_angle
-        MarkerStatus.v_angle = v_angle
-        MarkerStatus.m_angle = m_angle
-        MarkerStatus.m_distance = m_distance
-        MarkerStatus.height = height
-        MarkerStatus.width = width
-        return MarkerStatus
+        m_angle = cls._angle_between(DRONE_POS, marker_pos, vertical=True)
+        m_distance = cls._length_segment(DRONE_POS, marker_pos)
+
+        # output
+        marker_status = MarkerStatus(id=target_marker_id,
+                                     corners=corners,
+                                     center_pt=center_pt,
+                                     top_pt=top_pt,
+                                     bottom_pt=bottom_pt,
+                                     left_pt=left_pt,
+                                     right_pt=right_pt,
+                                     h_angle=h_angle,
+                                     v_angle=v_angle,
+                                     m_angle=m_angle,
+                                     m_distance=m_distance,
+                                     height=height,
+                                     width=width,
+                                     offset=pixel_offset,
+                                     marker_pos=marker_pos)
+
+        if cls.PARAM_DRAW_TARGET:
+            cls.draw(frame, marker_status)
+        return marker_status
 
     @staticmethod
     def _get_marker_with_min_id(markers: DetectedMarkersStatus) -> (int, List[ScreenPosition]):
@@ -168,27 +152,28 @@ class SelectTargetMarker:
         length = numpy.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
         return Distance(length)
 
-    @classmethod
-    def draw(cls, frame: numpy.ndarray):
-        if MarkerStatus.id == -1:
+    @staticmethod
+    def draw(frame: numpy.ndarray, marker_status: MarkerStatus):
+        if marker_status.id == -1:
             return
+        import cv2
         cv2.aruco.drawDetectedMarkers(frame,
-                                      numpy.array([[MarkerStatus.corners]]),
-                                      numpy.array([[MarkerStatus.id]]),
+                                      numpy.array([[marker_status.corners]]),
+                                      numpy.array([[marker_status.id]]),
                                       borderColor=RED)
         cv2.line(frame,
-                 MarkerStatus.top_pt,
-                 MarkerStatus.bottom_pt,
+                 marker_status.top_pt,
+                 marker_status.bottom_pt,
                  RED, 2)
         cv2.line(frame,
-                 MarkerStatus.left_pt,
-                 MarkerStatus.right_pt,
+                 marker_status.left_pt,
+                 marker_status.right_pt,
                  RED, 2)
 
-        top_pt_with_offset = tuple(numpy.array(MarkerStatus.top_pt) + numpy.array(cls.offset))
-        bottom_pt_with_offset = tuple(numpy.array(MarkerStatus.bottom_pt) + numpy.array(cls.offset))
-        left_pt_with_offset = tuple(numpy.array(MarkerStatus.left_pt) + numpy.array(cls.offset))
-        right_pt_with_offset = tuple(numpy.array(MarkerStatus.right_pt) + numpy.array(cls.offset))
+        top_pt_with_offset = tuple(numpy.array(marker_status.top_pt) + numpy.array(marker_status.offset))
+        bottom_pt_with_offset = tuple(numpy.array(marker_status.bottom_pt) + numpy.array(marker_status.offset))
+        left_pt_with_offset = tuple(numpy.array(marker_status.left_pt) + numpy.array(marker_status.offset))
+        right_pt_with_offset = tuple(numpy.array(marker_status.right_pt) + numpy.array(marker_status.offset))
 
         cv2.line(frame,
                  top_pt_with_offset,
@@ -202,5 +187,5 @@ class SelectTargetMarker:
         if DRONE_POS[0] != 0:
             cv2.line(frame,
                      DRONE_POS,
-                     cls.marker_pos,
+                     marker_status.marker_pos,
                      BLUE, 2)
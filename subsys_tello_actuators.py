@@ -4,34 +4,29 @@ from subsys_read_user_input import RCStatus
 
 class TelloActuators:
     """
-    Sends the velocity commands to the Tello
+    Sends the velocity commands to the Tello, one instance per drone
     """
-    tello: Tello = None
-    previous_RCstate = None
-    
-    @classmethod
-    def setup(cls, tello: Tello):
-        cls.tello = tello
+    SPEED: int = 100  # cm/s, speed of the move commands, set by main.start_drone
 
-    @classmethod
-    def run(cls, rc_status: type(RCStatus)):
-        cls.update_rc_command(rc_status)
+    def __init__(self, tello: Tello):
+        self.tello = tello
+        self.previous_RCstate: RCStatus = None
 
-    @classmethod
-    def update_rc_command(cls, rc_status: RCStatus):
-        """Update routine. Send velocities to Tello.
+    def run(self, rc_status: RCStatus):
+        self.update_rc_command(rc_status)
+
+    def update_rc_command(self, rc_status: RCStatus):
+        """Update routine. Send velocities to Tello, once per control period and only if they changed.
         """
-        rc_status.c = int(rc_status.c * 0.5)
-        if rc_status.toStr() != cls.previous_RCstate:
-            cls.tello.set_speed(100)
-            cls.tello.send_rc_control(
+        rc_status = rc_status._replace(c=int(rc_status.c * 0.5))
+        if rc_status != self.previous_RCstate:
+            self.tello.send_rc_control(
                 rc_status.a,  # left_right_velocity,
                 rc_status.b,  # for_back_velocity,
                 rc_status.c,  # up_down_velocity,
                 rc_status.d,  # yaw_velocity,
             )
-            cls.previous_RCstate = rc_status.toStr()
+            self.previous_RCstate = rc_status
         
-    @classmethod
-    def stop(cls):
-        cls.tello.end()
+    def stop(self):
+        self.tello.end()
@@ -1,63 +1,78 @@
-from queue import LifoQueue
+from queue import Empty, LifoQueue
+from threading import Event
+from typing import NamedTuple
 
-import cv2
 import numpy
 
 from DJITelloPy.djitellopy.tello import Tello, BackgroundFrameRead
 from parameters import MODE, IMG_SIZE, RUN, RunStatus
 from subsys_read_user_input import ModeStatus
-from subsys_tello_actuators import TelloActuators
-from subsys_visual_control import RCStatus
 
 
-class TelloSensors:
+class SensorsStatus(NamedTuple):
     """
-    Retrieves the attitude and battery level from onboard Tello sensors
-    Calls the high-level functions from the Tello API to handle Takeoff, Landing and Emergency flight modes
+    Attitude and battery level of the Tello, immutable: TelloSensors.status is replaced at every update
     """
-
-    tello: Tello = None
     battery: int = 0
     roll: int = 0
     pitch: int = 0
     yaw: int = 0
 
-    @classmethod
-    def setup(cls, tello: Tello):
-        cls.tello = tello
-
-    @classmethod
-    def run(cls):
-        if ModeStatus.value == MODE.TAKEOFF:
-            ModeStatus.value = MODE.MANUAL_FLIGHT
-            cls.tello.takeoff()
-        elif ModeStatus.value == MODE.LAND:
-            cls.tello.land()
-            ModeStatus.value = -1
-        elif ModeStatus.value == MODE.EMERGENCY:
-            cls.tello.emergency()
-            ModeStatus.value = -1
-        cls.update_state()
-
-    @classmethod
-    def update_state(cls):
-        state = cls.tello.get_current_state()
-        cls.battery = state['bat']
-        cls.roll = state['roll']
-        cls.pitch = state['pitch']
-        cls.yaw = state['yaw']
-
-    @classmethod
-    def update_rc(cls, rc_status: RCStatus):
-        if ModeStatus.value == MODE.MANUAL_FLIGHT or ModeStatus.value == MODE.AUTO_FLIGHT:
-            TelloActuators.update_rc_command(rc_status)
-
-    @classmethod
-    def __get_dict__(cls) -> dict:
-        sensors: dict = {'Battery': cls.battery,
-                         'Roll': cls.roll,
-                         'Pitch': cls.pitch,
-                         'Yaw': cls.yaw}
+    def __get_dict__(self) -> dict:
+        sensors: dict = {'Battery': self.battery,
+                         'Roll': self.roll,
+                         'Pitch': self.pitch,
+                         'Yaw': self.yaw}
+        return sensors
+
+
+class TelloSensors:
+    """
+    Retrieves the attitude and battery level from onboard Tello sensors
+    Calls the high-level functions from the Tello API to handle Takeoff, Landing and Emergency flight modes
+    One instance per drone: the flight mode commands (ModeStatus) are shared by all the drones, each instance acts
+    once on every command and keeps the resulting flight mode of its drone in `mode`
+    """
+    FLIGHT_MODES: tuple = (MODE.MANUAL_FLIGHT, MODE.AUTO_FLIGHT)
+
+    def __init__(self, tello: Tello):
+        self.tello = tello
+        self.status: SensorsStatus = SensorsStatus()
+        self.mode: int = -1  # on the ground
+        self.last_seq: int = ModeStatus.seq
+
+    def run(self):
+        seq, command = ModeStatus.get()
+        if seq != self.last_seq:
+            self.last_seq = seq
+            self.execute(command)
+        self.update_state()
+
+    def execute(self, command: int):
+        # The mode only changes once the Tello call returned: if it fails (e.g. no response to the takeoff),
+        # the drone keeps its mode and the operator can send the command again
+        try:
+            if command == MODE.TAKEOFF:
+                self.tello.takeoff()
+                self.mode = MODE.MANUAL_FLIGHT
+            elif command == MODE.LAND:
+                self.tello.land()
+                self.mode = -1
+            elif command == MODE.EMERGENCY:
+                self.tello.emergency()
+                self.mode = -1
+            elif command in self.FLIGHT_MODES and self.mode in self.FLIGHT_MODES:
+                self.mode = command
+        except Exception as exc:
+            print('TelloSensors | {} | Command {} failed: {!r}'.format(self.tello.address[0], command, exc))
+
+    def update_state(self):
+        state = self.tello.get_current_state()
+        self.status = SensorsStatus(state['bat'], state['roll'], state['pitch'], state['yaw'])
+
+    def __get_dict__(self) -> dict:
+        sensors = self.status.__get_dict__()
+        sensors['Mode'] = self.mode
         return sensors
 
 
@@ -66,28 +81,35 @@ class FrameReader:
     # (This step is mandatory as the frames are passed from one thread to another)
     # Since only the last received frame is important to control the UAV, we can dismiss the older ones that
     # have not been processed in time.
-    frames_queue: LifoQueue = None
-    frame_reader: BackgroundFrameRead = None
+    # One instance per drone, its update_frame method is the image_received_method of the Tello object.
 
-    @classmethod
-    def setup(cls, frame_reader: BackgroundFrameRead):
-        cls.frame_reader = frame_reader
-        cls.frames_queue = LifoQueue()
+    def __init__(self):
+        self.frames_queue: LifoQueue = LifoQueue()
+        self.frame_reader: BackgroundFrameRead = None
+        self.first_frame: Event = Event()  # set when the first frame is received
 
-    @classmethod
-    def update_frame(cls):
-        if cls.frame_reader.stopped:
+    def setup(self, frame_reader: BackgroundFrameRead):
+        self.frame_reader = frame_reader
+
+    def update_frame(self):
+        if self.frame_reader is None:
+            return  # first frames, before get_frame_read() returned
+        if self.frame_reader.stopped:
             RunStatus.value = RUN.STOP
         else:
-            cls.frames_queue.put_nowait(cls.frame_reader.frame)
-
-    @classmethod
-    def flush_old_frames(cls):
-        cls.frames_queue = LifoQueue()
-
-    @classmethod
-    def get_most_recent_frame(cls) -> numpy.ndarray:
-        raw_frame = cls.frames_queue.get()
+            self.frames_queue.put_nowait(self.frame_reader.frame)
+            self.first_frame.set()
+
+    def flush_old_frames(self):
+        self.frames_queue = LifoQueue()
+
+    def get_most_recent_frame(self, timeout: float = None) -> numpy.ndarray:
+        # Returns None if no frame is received within the timeout
+        try:
+            raw_frame = self.frames_queue.get(timeout=timeout)
+        except Empty:
+            return None
+        import cv2
         frame = cv2.resize(raw_frame, IMG_SIZE)
-        cls.flush_old_frames()
+        self.flush_old_frames()
         return frame
@@ -10,61 +10,59 @@ import numpy
 class VisualControl:
     """
     Automatically controls the Tello.
-    Input: MarkerStatus class containing information about the selected ARUCO code (distance and angles between
+    Input: MarkerStatus record containing information about the selected ARUCO code (distance and angles between
     marker and UAV, etc...)
-    Output: RCStatus class containing velocity commands that will be forwarded to the UAV
+    Output: RCStatus record containing velocity commands that will be forwarded to the UAV
+    One instance per drone
     """
     KP_LR_CTRL = 0.15
     KP_YAW_CTRL = 0.3
-    cmp: int = 0  # Counts the successive frames without any detected marker
 
-    tello: Tello = None
+    def __init__(self, tello: Tello):
+        self.tello = tello
+        self.cmp: int = 0  # Counts the successive frames without any detected marker
 
-    @classmethod
-    def setup(cls, tello: Tello):
-        cls.tello = tello
-
-    @classmethod
-    def run(cls, target_marker: MarkerStatus) -> type(RCStatus):
+    def run(self, target_marker: MarkerStatus, rc_status: RCStatus) -> RCStatus:
+        a, b, c, d = rc_status  # current commands, the new ones are returned in a new RCStatus
         if target_marker.id == -1:  # quand plus de détection, on stoppe doucement le drone
-            RCStatus.c = 
-            RCStatus.d = int(0.99 * RCStatus.d)  
-            RCStatus.a = int(0.99 * RCStatus.a)  
-            if 20 < cls.cmp <= 80:        
-                RCStatus.d = int(0.99 * RCStatus.d)  # la vitesse de lacet diminue
-                RCStatus.a = int(0.99 * RCStatus.a)  # vitesse droite/gauche diminue
-                RCStatus.d = int(RCStatus.d + 15)
-            elif 80 < cls.cmp < 250:
-                RCStatus.c = int(200 * RCStatus.c)
-                #cls.tello.move_up(int(50))
+            c = int(0.99 * c)
+            d = int(0.99 * d)
+            a = int(0.99 * a)
+            if 20 < self.cmp <= 80:        
+                d = int(0.99 * d)  # la vitesse de lacet diminue
+                a = int(0.99 * a)  # vitesse droite/gauche diminue
+                d = int(d + 15)
+            elif 80 < self.cmp < 250:
+                c = int(200 * c)
+                #self.tello.move_up(int(50))
                 time.sleep(0.5)
-            elif 250 < cls.cmp < 500:
-                RCStatus.d = int(RCStatus.d + 15)
-            if cls.cmp > 501:
-                RCStatus.b = int(0.99*RCStatus.b)   # on descend
-            cls.cmp = cls.cmp + 1
-            return RCStatus
-        cls.cmp = 0
+            elif 250 < self.cmp < 500:
+                d = int(d + 15)
+            if self.cmp > 501:
+                b = int(0.99*b)   # on descend
+            self.cmp = self.cmp + 1
+            return RCStatus(a, b, c, d)
+        self.cmp = 0
 
         # Gets the angle and the distance between the marker and the drone
         phi = int(target_marker.m_angle * RAD2DEG)
         distance = target_marker.m_distance
 
         # Yaw velocity control
-        RCStatus.d = int(cls.KP_YAW_CTRL * phi)
+        d = int(self.KP_YAW_CTRL * phi)
 
         # Left/Right velocity control
         dx = distance * numpy.sin(phi*DEG2RAD)
-        RCStatus.a = int(cls.KP_LR_CTRL * dx)
+        a = int(self.KP_LR_CTRL * dx)
 
         # Forward/Backward velocity control
         rb_threshold = 100
-        RCStatus.b = rb_threshold - int(rb_threshold * abs(phi)/60)
+        b = rb_threshold - int(rb_threshold * abs(phi)/60)
 
         # Up/Down velocity control
-        RCStatus.c = 1
+        c = 1
         if target_marker.m_distance > 400:
-            RCStatus.c = int(100 * RCStatus.c)
+            c = int(100 * c)
         if 220 < target_marker.m_distance < 350:
-            RCStatus.c = int(150 * -RCStatus.c)
-
+            c = int(150 * -c)
+        return RCStatus(a, b, c, d)
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from parameters import MODE, RUN, RunStatus
+from subsys_command_input import CommandInput
+from subsys_read_user_input import ModeStatus, RCStatus, rc_command
+
+
+@pytest.fixture(autouse=True)
+def command_input():
+    RunStatus.value = RUN.START
+    rc_command.put(RCStatus())
+    CommandInput.script, CommandInput.script_line, CommandInput.wait_until = [], 0, 0
+    yield CommandInput
+    CommandInput.script = []
+
+
+def load(lines: list):
+    CommandInput.script, CommandInput.script_line, CommandInput.wait_until = lines, 0, 0
+
+
+def test_mode_commands():
+    seq = ModeStatus.seq
+    assert CommandInput.run('takeoff') == 'ok'
+    assert ModeStatus.get() == (seq + 1, MODE.TAKEOFF)
+    assert CommandInput.run('LAND') == 'ok'
+    assert CommandInput.run('land') == 'ok'
+    assert ModeStatus.get() == (seq + 3, MODE.LAND)
+
+
+def test_rc_command():
+    ModeStatus.command(MODE.AUTO_FLIGHT)
+    assert CommandInput.run('rc 10 -20 30 -40') == 'ok'
+    assert rc_command.value == RCStatus(10, -20, 30, -40)
+    assert ModeStatus.value == MODE.MANUAL_FLIGHT  # a manual command leaves the automatic flight
+
+
+@pytest.mark.parametrize('line, reply', [('rc 1 2 3', 'error unknown command'),
+                                         ('rc 1 2 x 4', 'error invalid rc values'),
+                                         ('fly', 'error unknown command'),
+                                         ('# comment', 'ok'),
+                                         ('', 'ok')])
+def test_invalid_commands(line, reply):
+    assert CommandInput.run(line) == reply
+    assert rc_command.value == RCStatus()
+
+
+def test_script_waits():
+    load(['takeoff', 'wait 10', 'land'])
+    CommandInput.run_script()
+    assert ModeStatus.value == MODE.TAKEOFF
+    assert CommandInput.script_line == 2
+    assert CommandInput.wait_until > time.time() + 9
+    CommandInput.wait_until = 0
+    CommandInput.run_script()
+    assert ModeStatus.value == MODE.LAND
+
+
+def test_script_skips_invalid_wait():
+    load(['takeoff', 'wait abc', 'rc 0 10 0 0'])
+    CommandInput.run_script()
+    assert CommandInput.script_line == 3
+    assert rc_command.value == RCStatus(0, 10, 0, 0)
+    assert RunStatus.value == RUN.START
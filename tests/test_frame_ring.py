@@ -0,0 +1,106 @@
+import subprocess
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from DJITelloPy.djitellopy.frame_ring import SharedFrameRing
+from DJITelloPy.djitellopy.tello import TelloException
+
+SHAPE = (48, 64, 3)
+# independent interpreter (with its own resource tracker) writing frames of constant value seq % 256
+PRODUCER = """
+import sys
+import numpy as np
+from DJITelloPy.djitellopy.frame_ring import SharedFrameRing
+ring = SharedFrameRing.attach(sys.argv[1])
+frame = np.empty(ring.shape, dtype=np.uint8)
+for seq in range(1, int(sys.argv[2]) + 1):
+    frame[...] = seq % 256
+    ring.put(frame)
+ring.close()
+"""
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing.create(SHAPE, slots=3)
+    yield ring
+    ring.close()
+
+
+def frame_of(value: int) -> np.ndarray:
+    return np.full(SHAPE, value % 256, dtype=np.uint8)
+
+
+def test_empty_ring(ring):
+    assert ring.write_seq == 0
+    assert ring.latest() == (0, None)
+    assert ring.get(1) is None
+    assert ring.wait(0, timeout=0.01) == 0
+
+
+def test_put_and_read(ring):
+    assert ring.put(frame_of(1)) == 1
+    assert ring.put(frame_of(2)) == 2
+    seq, frame = ring.latest()
+    assert seq == 2 and (frame == 2).all()
+    assert (ring.get(1) == 1).all()
+    seq, out = ring.read()
+    assert seq == 2 and (out == 2).all()
+    assert ring.wait(1, timeout=0.01) == 2
+
+
+def test_overwritten_frames_are_invalid(ring):
+    for seq in range(1, 5):
+        ring.put(frame_of(seq))
+    assert not ring.is_valid(1)  # slot reused by frame 4
+    assert ring.get(1) is None
+    assert all(ring.is_valid(seq) for seq in (2, 3, 4))
+
+
+def test_frame_being_written_is_invalid(ring):
+    ring.put(frame_of(1))
+    ring.slot_seqs[2 % ring.slots] = 2 * 2 - 1  # the producer started writing frame 2
+    assert not ring.is_valid(2)
+    assert ring.latest()[0] == 1
+
+
+def test_wrong_shape(ring):
+    with pytest.raises(TelloException):
+        ring.put(np.zeros((10, 10, 3), dtype=np.uint8))
+    with pytest.raises(TelloException):
+        SharedFrameRing.create(SHAPE, slots=1)
+
+
+def test_attach_reads_in_place(ring):
+    reader = SharedFrameRing.attach(ring.name)
+    ring.put(frame_of(7))
+    seq, frame = reader.latest()
+    assert seq == 1 and (frame == 7).all() and reader.shape == SHAPE
+    reader.close()
+    assert ring.is_valid(1)
+
+
+def test_no_torn_read_from_another_process(ring):
+    frames = 3000
+    producer = subprocess.Popen([sys.executable, '-c', PRODUCER, ring.name, str(frames)])
+    out = np.empty(SHAPE, dtype=np.uint8)
+    reads = 0
+    while producer.poll() is None:
+        seq, out = ring.read(out)
+        if seq:
+            reads += 1
+            assert (out == seq % 256).all(), 'torn frame {}'.format(seq)
+    assert producer.returncode == 0
+    assert ring.write_seq == frames
+    assert reads > 0
+
+
+def test_segment_survives_the_reader_process(ring):
+    # the resource tracker of an attaching process must not unlink the ring when that process exits
+    subprocess.run([sys.executable, '-c', PRODUCER, ring.name, '1'], check=True)
+    shm = shared_memory.SharedMemory(name=ring.name)
+    shm.close()
+    assert ring.write_seq == 1
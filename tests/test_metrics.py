@@ -0,0 +1,74 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from DJITelloPy.djitellopy import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_counter_and_gauge(registry):
+    packets = metrics.Counter('test_packets_total', 'Packets\nreceived', ['drone'], registry=registry)
+    battery = metrics.Gauge('test_battery_percent', 'Battery', registry=registry)
+    packets.labels('192.168.10.2').inc()
+    packets.labels('192.168.10.1').inc(2)
+    packets.labels('192.168.10.1').inc()
+    battery.set(87)
+    assert registry.exposition() == (
+        '# HELP test_packets_total Packets received\n'
+        '# TYPE test_packets_total counter\n'
+        'test_packets_total{drone="192.168.10.1"} 3\n'
+        'test_packets_total{drone="192.168.10.2"} 1\n'
+        '# HELP test_battery_percent Battery\n'
+        '# TYPE test_battery_percent gauge\n'
+        'test_battery_percent 87\n')
+
+
+def test_histogram(registry):
+    latency = metrics.Histogram('test_latency_seconds', 'Latency', ['drone'], registry=registry,
+                                buckets=(0.1, 0.01))
+    for value in (0.005, 0.05, 0.05, 2.0):
+        latency.labels('a').observe(value)
+    assert latency.exposition().splitlines()[2:] == [
+        'test_latency_seconds_bucket{drone="a",le="0.01"} 1',
+        'test_latency_seconds_bucket{drone="a",le="0.1"} 3',
+        'test_latency_seconds_bucket{drone="a",le="+Inf"} 4',
+        'test_latency_seconds_sum{drone="a"} 2.105',
+        'test_latency_seconds_count{drone="a"} 4']
+
+
+def test_labels(registry):
+    metric = metrics.Gauge('test_labels', 'Labels', ['name'], registry=registry)
+    metric.labels('say "hi"\\\n').set(0.5)
+    assert metric.exposition().splitlines()[2] == 'test_labels{name="say \\"hi\\"\\\\\\n"} 0.5'
+    with pytest.raises(ValueError):
+        metric.labels('a', 'b')
+    metric.remove('say "hi"\\\n')
+    assert len(metric.exposition().splitlines()) == 2
+    with pytest.raises(ValueError):
+        metrics.Gauge('test_labels', 'Duplicate', registry=registry)
+
+
+def test_update_hooks(registry):
+    gauge = metrics.Gauge('test_rate_hz', 'Rate', registry=registry)
+    registry.add_update_hook(lambda: gauge.set(30))
+    registry.add_update_hook(lambda: 1 / 0)  # a broken hook does not break the export
+    assert 'test_rate_hz 30\n' in registry.exposition()
+
+
+def test_http_server(registry):
+    metrics.Counter('test_scrapes_total', 'Scrapes', registry=registry).inc()
+    server = metrics.start_http_server(0, registry=registry)
+    try:
+        url = 'http://{}:{}'.format(*server.address)
+        with urllib.request.urlopen(url + '/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert 'test_scrapes_total 1\n' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + '/other', timeout=5)
+    finally:
+        server.stop()
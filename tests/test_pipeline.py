@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from pipeline import LatestValue, Pipeline, Profiler, Stage, WorkerPool
+
+
+def test_latest_value_sequence():
+    value = LatestValue(0)
+    assert value.get(0, timeout=0.01) == (0, None)  # nothing new
+    value.put(1)
+    value.put(2)
+    assert value.get(0, timeout=0.01) == (2, 2)  # only the latest value
+    value.update(lambda current: current + 1)
+    assert value.get(2, timeout=0.01) == (3, 3)
+
+
+def test_latest_value_wakes_up_the_reader():
+    value = LatestValue()
+    threading.Timer(0.05, value.put, args=('frame',)).start()
+    assert value.get(0, timeout=5) == (1, 'frame')
+
+
+def run_pipeline(source_function, function, duration: float = 0.3) -> (Stage, Stage):
+    pipeline = Pipeline()
+    source = pipeline.add_stage('source', source_function)
+    stage = pipeline.add_stage('stage', function, source=source)
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    return source, stage
+
+
+def counter(period: float):
+    items = iter(range(1, 1_000_000))
+
+    def produce():
+        time.sleep(period)
+        return next(items)
+    return produce
+
+
+def test_slow_stage_drops_items():
+    processed = []
+
+    def slow(item):
+        time.sleep(0.05)
+        processed.append(item)
+        return item
+    source, stage = run_pipeline(counter(0.005), slow)
+    assert stage.dropped > 0
+    assert processed == sorted(processed)  # always the most recent item, never an older one
+    assert stage.processed + stage.dropped <= source.processed
+
+
+def test_stage_survives_exceptions(monkeypatch, caplog):
+    monkeypatch.setattr(Stage, 'ERROR_BACKOFF', 0.01)
+
+    def odd_fails(item):
+        if item % 2:
+            raise ValueError(item)
+        return item
+    with caplog.at_level(logging.ERROR, logger='pipeline'):
+        _, stage = run_pipeline(counter(0.02), odd_fails)
+    assert stage.errors > 0 and stage.processed > 0
+    assert stage.__get_dict__()['errors'] == stage.errors
+    assert len(caplog.records) == 1  # rate limited
+    assert caplog.records[0].exc_info is not None
+
+
+def test_failing_source_backs_off(monkeypatch):
+    monkeypatch.setattr(Stage, 'ERROR_BACKOFF', 0.05)
+
+    def dead_reader():
+        raise OSError('no video')
+    source, _ = run_pipeline(dead_reader, lambda item: item)
+    assert 1 <= source.errors <= 10
+
+
+def test_profiler_counts_and_percentiles():
+    profiler = Profiler(window_size=100)
+    for duration in range(1, 201):  # the window keeps 101 to 200 ms
+        profiler.record('step', duration / 1000)
+    profile = profiler.__get_dict__()['step']
+    assert profile == {'p50': 150.0, 'p95': 195.0, 'p99': 199.0, 'calls': 200}
+    assert profiler.call('step', lambda x: x * 2, 21) == 42
+    assert profiler.__get_dict__()['step']['calls'] == 201
+
+
+def test_profiler_threads():
+    profiler = Profiler()
+    threads = [threading.Thread(target=lambda: [profiler.record('step', 0.001) for _ in range(5000)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler.__get_dict__()['step']['calls'] == 20000
+
+
+def busy(duration: float) -> float:
+    """ Uses `duration` seconds of CPU time of the calling thread """
+    end = time.thread_time() + duration
+    while time.thread_time() < end:
+        pass
+    return duration
+
+
+def test_worker_pool_runs_the_functions():
+    pool = WorkerPool(2)
+    pool.register('drone')
+    pool.start()
+    try:
+        assert pool.run('drone', sum, (1, 2, 3)) == 6
+        with pytest.raises(ZeroDivisionError):
+            pool.run('drone', lambda: 1 / 0)
+        assert pool.__get_dict__()['drone']['served'] == 2
+    finally:
+        pool.stop()
+    assert pool.run('drone', sum, (1, 2)) is None  # stopped
+
+
+def test_worker_pool_weighted_shares():
+    # one worker, three clients always waiting: the CPU is shared 2:1:1 by weight
+    pool = WorkerPool(1)
+    for client, weight in (('a', 2.0), ('b', 1.0), ('c', 1.0)):
+        pool.register(client, weight)
+    stop = threading.Event()
+
+    def client_loop(client: str):
+        while not stop.is_set():
+            pool.run(client, busy, 0.002)
+    threads = [threading.Thread(target=client_loop, args=(client,)) for client in 'abc']
+    pool.start()
+    for thread in threads:
+        thread.start()
+    time.sleep(1.0)
+    stop.set()
+    pool.stop()
+    for thread in threads:
+        thread.join()
+    cpu = {client: stats['cpu_s'] for client, stats in pool.__get_dict__().items()}
+    assert cpu['b'] > 0 and cpu['c'] > 0
+    assert 1.5 < cpu['a'] / cpu['b'] < 2.7
+    assert 0.7 < cpu['b'] / cpu['c'] < 1.4
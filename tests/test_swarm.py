@@ -0,0 +1,77 @@
+import threading
+from typing import Optional, List, Union
+
+import pytest
+
+from DJITelloPy.djitellopy.enforce_types import enforce_types
+from DJITelloPy.djitellopy.swarm import TelloSwarm
+from DJITelloPy.djitellopy.tello import Tello, TelloShard
+
+
+@pytest.fixture
+def shard():
+    shard = TelloShard(local_ip='127.0.0.1', control_port=0, state_port=0)
+    yield shard
+    shard.close()
+
+
+@enforce_types
+def annotated(required: int, optional: Optional[list] = None, union: Union[int, List[int]] = 0):
+    return required, optional, union
+
+
+def test_enforce_types_union():
+    assert annotated(1) == (1, None, 0)
+    assert annotated(1, [2], [3]) == (1, [2], [3])
+    with pytest.raises(TypeError):
+        annotated(1, (2,))
+    with pytest.raises(TypeError):
+        annotated(1, union='3')
+
+
+def test_from_ips_with_and_without_shards(shard):
+    swarm = TelloSwarm.fromIps(['127.0.0.10', '127.0.0.11'], [shard])
+    assert [tello.shard for tello in swarm] == [shard, shard]
+    swarm.end()
+    with pytest.raises(TypeError):
+        TelloSwarm.fromIps(['127.0.0.12'], shard)
+
+
+def test_end_cancels_pending_calls(shard):
+    swarm = TelloSwarm([Tello('127.0.0.13', shard=shard)])
+    release = threading.Event()
+    running = swarm.submit(lambda i, tello: release.wait(5))[0]
+    busy = swarm.submit(lambda i, tello: None)[0]
+    assert busy.exception() is not None  # one call at a time per drone
+    swarm.end()
+    release.set()
+    assert running.result(timeout=5) is True
+    assert swarm.executor._shutdown
+    with pytest.raises(RuntimeError):
+        swarm.executor.submit(print)
+
+
+def test_state_listeners_are_chained(shard):
+    tello = Tello('127.0.0.14', shard=shard)
+    first, second = TelloSwarm([tello]), TelloSwarm([tello])
+    received = []
+    tello.add_state_listener(received.append)
+    Tello.udp_state_handler(shard.drones, b'bat:55;h:10;\r\n', '127.0.0.14')
+    assert first.state.column('bat')[0] == second.state.column('bat')[0] == 55
+    tello.remove_state_listener(first.state_listeners[0])
+    Tello.udp_state_handler(shard.drones, b'bat:44;h:10;\r\n', '127.0.0.14')
+    assert first.state.column('bat')[0] == 55
+    assert second.state.column('bat')[0] == 44
+    assert [state['bat'] for state in received] == [55, 44]
+    first.end()
+    second.end()
+
+
+def test_end_stops_the_worker_threads(shard):
+    swarm = TelloSwarm([Tello('127.0.0.15', shard=shard), Tello('127.0.0.16', shard=shard)])
+    swarm.parallel(lambda i, tello: None)
+    swarm.end()
+    for thread in swarm.threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    assert shard.drones == {}
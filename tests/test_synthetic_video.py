@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_vision import match_markers
+from benchmarks.synthetic_video import RESOLUTIONS, SceneRenderer, encode, ground_truth_path, read_ground_truth
+from subsys_markers_detected import MarkersDetector
+
+FRAMES = 12
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    return SceneRenderer(RESOLUTIONS['480p'], seed=3)
+
+
+def test_rendering_is_reproducible(renderer):
+    again = SceneRenderer(RESOLUTIONS['480p'], seed=3)
+    for index in (0, 7, 95):
+        frame, placements = renderer.render(index)
+        frame_again, placements_again = again.render(index)
+        assert frame.shape == (480, 640, 3) and frame.dtype == np.uint8
+        assert (frame == frame_again).all()
+        assert [p.__get_dict__() for p in placements] == [p.__get_dict__() for p in placements_again]
+    other = SceneRenderer(RESOLUTIONS['480p'], seed=4)
+    assert not (other.render(0)[0] == renderer.render(0)[0]).all()
+
+
+def test_detector_finds_the_ground_truth(renderer):
+    # the frames are reproducible: the recall of the vision benchmark setting half_scale is stable
+    MarkersDetector.configure(scale=0.5, parameters={})
+    MarkersDetector.PARAM_DRAW_MARKERS = False
+    expected = found = 0
+    try:
+        for _, frame, placements in renderer.frames(FRAMES):
+            markers = MarkersDetector.run(frame)
+            result = match_markers([p.__get_dict__() for p in placements], markers.corners, markers.ids)
+            expected, found = expected + result['expected'], found + result['found']
+            assert result['false_positives'] == 0
+            assert all(error < 3.0 for error in result['errors'])
+    finally:
+        MarkersDetector.configure(scale=1.0)
+        MarkersDetector.PARAM_DRAW_MARKERS = True
+    assert expected > 0 and found >= 0.6 * expected
+
+
+def test_encode_writes_the_ground_truth(renderer, tmp_path):
+    pytest.importorskip('av')
+    video = str(tmp_path / 'synthetic.h264')
+    encode(renderer, FRAMES, video, ground_truth_path(video))
+    ground_truth = read_ground_truth(ground_truth_path(video))
+    assert len(ground_truth) == FRAMES
+    assert ground_truth[5] == [p.__get_dict__() for p in renderer.render(5)[1]]
+
+    import av
+    with av.open(video) as container:
+        assert sum(1 for _ in container.decode(video=0)) == FRAMES
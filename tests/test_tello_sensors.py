@@ -0,0 +1,94 @@
+from parameters import MODE
+from subsys_read_user_input import ModeStatus
+from subsys_tello_sensors import TelloSensors
+
+STATE = {'bat': 87, 'roll': 1, 'pitch': 2, 'yaw': 3}
+
+
+class FakeTello:
+    """ Records the flight commands, optionally failing them """
+
+    def __init__(self):
+        self.address = ('127.0.0.1', 8889)
+        self.commands = []
+        self.failing = set()
+
+    def _command(self, name: str):
+        self.commands.append(name)
+        if name in self.failing:
+            raise Exception('Command {} was unsuccessful'.format(name))
+
+    def takeoff(self):
+        self._command('takeoff')
+
+    def land(self):
+        self._command('land')
+
+    def emergency(self):
+        self._command('emergency')
+
+    def get_current_state(self) -> dict:
+        return STATE
+
+
+def flying_sensors() -> (TelloSensors, FakeTello):
+    tello = FakeTello()
+    sensors = TelloSensors(tello)
+    ModeStatus.command(MODE.TAKEOFF)
+    sensors.run()
+    return sensors, tello
+
+
+def test_command_executed_once():
+    sensors, tello = flying_sensors()
+    sensors.run()
+    sensors.run()
+    assert tello.commands == ['takeoff']
+    assert sensors.mode == MODE.MANUAL_FLIGHT
+
+
+def test_repeated_land_is_sent_again():
+    sensors, tello = flying_sensors()
+    tello.failing.add('land')
+    ModeStatus.command(MODE.LAND)
+    sensors.run()
+    assert sensors.mode == MODE.MANUAL_FLIGHT  # the drone did not acknowledge the landing
+    tello.failing.clear()
+    ModeStatus.command(MODE.LAND)
+    sensors.run()
+    assert tello.commands == ['takeoff', 'land', 'land']
+    assert sensors.mode == -1
+
+
+def test_repeated_emergency_is_sent_again():
+    sensors, tello = flying_sensors()
+    ModeStatus.command(MODE.EMERGENCY)
+    sensors.run()
+    ModeStatus.command(MODE.EMERGENCY)  # the first datagram may have been lost, it gets no response
+    sensors.run()
+    assert tello.commands == ['takeoff', 'emergency', 'emergency']
+    assert sensors.mode == -1
+
+
+def test_failed_takeoff_keeps_the_drone_on_the_ground():
+    tello = FakeTello()
+    tello.failing.add('takeoff')
+    sensors = TelloSensors(tello)
+    ModeStatus.command(MODE.TAKEOFF)
+    sensors.run()
+    assert sensors.mode == -1
+    ModeStatus.command(MODE.AUTO_FLIGHT)
+    sensors.run()
+    assert sensors.mode == -1
+
+
+def test_every_drone_acts_on_a_command():
+    first, second = TelloSensors(FakeTello()), TelloSensors(FakeTello())
+    ModeStatus.command(MODE.TAKEOFF)
+    first.run()
+    second.run()
+    ModeStatus.command(MODE.AUTO_FLIGHT)
+    first.run()
+    second.run()
+    assert first.mode == second.mode == MODE.AUTO_FLIGHT
+    assert first.tello.commands == second.tello.commands == ['takeoff']